@@ -0,0 +1,189 @@
+import invoice_store
+import journal
+import money
+import operations
+import pricing
+import sales_ledger
+import write
+
+
+#Function to read orders from a file
+def read_orders(file_name):
+    """
+    Read orders from a comma separated order file, one order at a time.
+
+    Each line holds one product of an order:
+        order_ref,customer_name,phone,product_id,quantity
+    Consecutive lines with the same order_ref belong to the same order. Blank lines and lines starting
+    with '#' are skipped.
+
+    Parameters:
+    'file_name' (str): The order file.
+
+    Returns:
+    generator: Yields order dictionaries with the keys 'ref', 'name', 'phone' and 'items', where 'items'
+    is a list of [product ID (str), quantity (str)] pairs exactly as written in the file.
+    """
+    order = None
+    with open(file_name, "r") as order_file:
+        for line in order_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split(",")
+            if len(fields) != 5:
+                fields = (fields + [""]*5)[:5]
+
+            #Starting a new order when the reference changes
+            if order is None or order["ref"] != fields[0]:
+                if order is not None:
+                    yield order
+                order = {"ref": fields[0], "name": fields[1], "phone": fields[2], "items": []}
+            order["items"].append([fields[3], fields[4]])
+
+    if order is not None:
+        yield order
+
+
+#Function to build the cart of one order
+def build_cart(d, order):
+    """
+    Validate the products of an order and build its cart without touching the inventory.
+
+    The same rules as the interactive sale apply: the product ID has to exist, the quantity has to be at
+    least 1, the phone number needs 10 digits and the stock has to cover the billed quantity plus the free
+    items from operations.apply_offer. Repeated products in one order are billed together.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'order' (dict): An order as returned by read_orders.
+
+    Returns:
+    tuple: (cart_dict, error) where cart_dict maps product IDs to [sell_qty, free_qty, total_sell_qty] and
+    error is None, or (None, error message) if the order is rejected.
+    """
+    phone = order["phone"].strip()
+    if len(phone) != 10 or not phone.isdigit():
+        return None, "Invalid phone number " + repr(order["phone"])
+
+    #Adding up the billed quantity of every product
+    billed = {}
+    for prod_id, qty in order["items"]:
+        try:
+            prod_id = int(prod_id)
+            qty = int(qty)
+        except ValueError:
+            return None, "Invalid product ID or quantity " + repr(prod_id) + ", " + repr(qty)
+        if prod_id not in d:
+            return None, "Product ID " + str(prod_id) + " is not in the inventory"
+        if qty < 1:
+            return None, "The quantity of product " + str(prod_id) + " must be at least 1"
+        billed[prod_id] = billed.get(prod_id, 0) + qty
+
+    #Applying the promotions and checking the stock
+    cart_dict = {}
+    for prod_id in billed:
+        cart_dict[prod_id] = operations.apply_offer(d, prod_id, billed[prod_id])
+        available_qty = d.available(prod_id)
+        if cart_dict[prod_id][2] > available_qty:
+            return None, ("Not enough stock of product " + str(prod_id) + ", maximum base quantity is "
+                          + str(operations.max_base_qty(d, prod_id, available_qty)))
+    return cart_dict, None
+
+
+#Function to sell a batch of orders without prompts
+def process_orders(d, orders, invoices=True):
+    """
+    Sell a batch of orders with the same rules as operations.sales but without any input() prompts.
+
+    Every valid order is taken out of the inventory straight away, so later orders in the batch see the
+    remaining stock. Totals are worked out for all sold carts together by pricing.price_carts,
+    which gives the same values as operations.calculate_total. The inventory journal is written once for
+    the whole batch and, if asked for, an invoice file is written for every sale.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, updated in place.
+    'orders' (iterable): Order dictionaries with the keys 'ref', 'name', 'phone' and 'items' (see read_orders).
+    'invoices' (bool): If True, an invoice file is generated for every sale.
+
+    Returns:
+    tuple: (sales, rejected) where
+        - sales (list): A [ref, cart_dict, billing_info] entry for every order sold.
+        - rejected (list): A [ref, reason] entry for every order that could not be sold.
+    """
+    sales = []
+    rejected = []
+
+    #Quantities taken out of the inventory by the whole batch
+    batch_cart = {}
+
+    for order in orders:
+        cart_dict, error = build_cart(d, order)
+        if error:
+            rejected.append([order["ref"], error])
+            continue
+
+        #Updating the inventory
+        for prod_id in cart_dict:
+            d.add_qty(prod_id, -cart_dict[prod_id][2])
+            if prod_id not in batch_cart:
+                batch_cart[prod_id] = [0, 0, 0]
+            batch_cart[prod_id][2] += cart_dict[prod_id][2]
+
+        sales.append([order["ref"], cart_dict, order])
+
+    #Pricing all the sold carts in one pass
+    carts = []
+    for sale in sales:
+        carts.append(sale[1])
+    costs = pricing.price_carts(d, carts)
+    for sale, costs_list in zip(sales, costs):
+        order = sale[2]
+        sale[2] = operations.build_billing_info(order["name"], order["phone"].strip(), costs_list)
+
+    #Journaling the batch once
+    if batch_cart:
+        journal.active.record_sale(d, batch_cart)
+
+    #Recording every sale for the reports with a single write
+    records = []
+    for ref, cart_dict, billing_info in sales:
+        records += sales_ledger.sale_records(d, cart_dict, billing_info)
+    try:
+        sales_ledger.active.append(records)
+    except OSError:
+        print("The sales ledger could not be written.")
+
+    #Rendering and writing the invoices on every core, numbered in the order of the batch
+    if invoices:
+        records = []
+        for ref, cart_dict, billing_info in sales:
+            records.append((cart_dict, billing_info))
+        write.generate_invoices(d, invoice_store.SELL, records)
+
+    return sales, rejected
+
+
+#Function to run a batch order file from the command line
+def run_batch(d, file_name):
+    """
+    Process an order file and print a short summary.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'file_name' (str): The order file.
+
+    Returns:
+    boolean: True if every order in the file was sold.
+    """
+    sales, rejected = process_orders(d, read_orders(file_name))
+
+    grand_total = money.Money()
+    for ref, cart_dict, billing_info in sales:
+        grand_total += billing_info["grand_total"]
+
+    print(str(len(sales)) + " orders sold, " + str(len(rejected)) + " rejected.")
+    print("Grand Total of the batch: " + str(grand_total))
+    for ref, reason in rejected:
+        print("Order " + ref + " rejected: " + reason)
+    return not rejected
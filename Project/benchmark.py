@@ -0,0 +1,392 @@
+import builtins
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import invoice
+import invoice_store
+import journal
+import operations
+import pricing
+import read
+import sales_ledger
+import write
+
+#Inventory sizes benchmarked when none are given
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+#Number of carts in the generated order stream
+ORDER_COUNT = 2000
+
+#Largest number of products in one generated cart
+MAX_CART_LINES = 5
+
+#Quantity every generated product starts with, enough for every order of a run
+START_QTY = 1000000
+
+#Words the synthetic product names are made of
+NAME_WORDS = ["Vitamin", "Serum", "Cleanser", "Sunscreen", "Toner", "Cream", "Lotion", "Gel", "Mask", "Oil"]
+BRANDS = ["Garnier", "Cetaphil", "Aqualogica", "Plum", "Nivea", "Dove", "Himalaya", "Lakme"]
+ORIGINS = ["France", "Switzerland", "India", "Nepal", "Korea", "Japan", "Germany"]
+
+
+#Class for answers fed to input() while a flow runs headless
+class ScriptedInput:
+    """
+    Replacement for input() that returns prepared answers in order and prints nothing.
+
+    Parameters:
+    'answers' (list): The answers, one per prompt.
+
+    Raises:
+    RuntimeError: When the flow asks more questions than there are answers, so a benchmark can never hang.
+    """
+
+    def __init__(self, answers):
+        self.answers = iter(answers)
+
+    def __call__(self, prompt=""):
+        try:
+            return next(self.answers)
+        except StopIteration:
+            raise RuntimeError("The flow asked for more input than scripted: " + repr(prompt))
+
+
+#Function to run a flow with scripted input and no output
+@contextlib.contextmanager
+def headless(answers):
+    real_input = builtins.input
+    builtins.input = ScriptedInput(answers)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        builtins.input = real_input
+
+
+#Function to write a synthetic inventory file
+def generate_inventory(file_name, size, seed=0):
+    """
+    Write an inventory file with 'size' random products in the format of inventory.txt.
+
+    Parameters:
+    'file_name' (str): The file to write.
+    'size' (int): Number of products.
+    'seed' (int): Seed of the random generator, the same seed gives the same file.
+
+    Returns:
+    None
+    """
+    generator = random.Random(seed)
+    inventory_file = open(file_name, "w")
+    lines = []
+    for number in range(1, size+1):
+        name = generator.choice(NAME_WORDS) + " " + generator.choice(NAME_WORDS) + " " + str(number)
+        lines.append(name + "," + generator.choice(BRANDS) + "," + str(START_QTY) + ","
+                     + str(generator.randint(50, 5000)) + "," + generator.choice(ORIGINS) + "\n")
+        if len(lines) == 10000:
+            inventory_file.write("".join(lines))
+            lines = []
+    inventory_file.write("".join(lines))
+    inventory_file.close()
+
+
+#Function to generate a stream of orders
+def generate_orders(d, count=ORDER_COUNT, seed=0):
+    """
+    Generate random carts over the products of an inventory.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'count' (int): Number of carts.
+    'seed' (int): Seed of the random generator.
+
+    Returns:
+    list: Cart dictionaries mapping product IDs to [sell_qty, free_qty, total_sell_qty].
+    """
+    generator = random.Random(seed)
+    size = len(d)
+    carts = []
+    for _ in range(count):
+        cart_dict = {}
+        for _ in range(generator.randint(1, MAX_CART_LINES)):
+            prod_id = generator.randint(1, size)
+            cart_dict[prod_id] = operations.apply_offer(d, prod_id, generator.randint(1, 12))
+        carts.append(cart_dict)
+    return carts
+
+
+#Function to summarize the timings of one benchmark
+def summarize(name, size, timings, peak_bytes):
+    """
+    Turn the timings of every call into throughput and latency percentiles.
+
+    Parameters:
+    'name' (str): The benchmark.
+    'size' (int): Number of products in the inventory.
+    'timings' (list): Duration of every call in nanoseconds.
+    'peak_bytes' (int): Peak memory allocated by one call, measured with tracemalloc.
+
+    Returns:
+    dict: The result as saved in the JSON file.
+    """
+    timings = sorted(timings)
+    total = sum(timings)
+
+    def percentile(share):
+        return timings[min(int(len(timings)*share), len(timings) - 1)]/1000
+
+    return {
+        "name": name,
+        "size": size,
+        "ops": len(timings),
+        "total_s": round(total/1e9, 6),
+        "ops_per_s": round(len(timings)/(total/1e9), 1) if total else None,
+        "p50_us": round(percentile(0.50), 2),
+        "p90_us": round(percentile(0.90), 2),
+        "p99_us": round(percentile(0.99), 2),
+        "max_us": round(timings[-1]/1000, 2),
+        "peak_kb": round(peak_bytes/1024, 1),
+    }
+
+
+#Function to time a benchmark
+def measure(name, size, calls, function, prepare=None):
+    """
+    Call 'function' once per item of 'calls', timing every call, then once more under tracemalloc for its
+    peak memory.
+
+    Parameters:
+    'name' (str): The benchmark.
+    'size' (int): Number of products in the inventory.
+    'calls' (list): The argument tuple of every call.
+    'function' (function): The code being measured.
+    'prepare' (function): Called with the same arguments before every call, outside of the timing.
+
+    Returns:
+    dict: The result, see summarize().
+    """
+    timings = []
+    clock = time.perf_counter_ns
+    for args in calls:
+        if prepare is not None:
+            prepare(*args)
+        start = clock()
+        function(*args)
+        timings.append(clock() - start)
+
+    if prepare is not None:
+        prepare(*calls[0])
+    tracemalloc.start()
+    try:
+        function(*calls[0])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = summarize(name, size, timings, peak)
+    print(name.ljust(24) + str(size).rjust(10) + str(result["ops_per_s"]).rjust(14) + " ops/s   p50 "
+          + str(result["p50_us"]) + " us   p99 " + str(result["p99_us"]) + " us   peak " + str(result["peak_kb"]) + " KiB")
+    return result
+
+
+#Function to benchmark every hot path on one inventory size
+def run_size(size, repeat, orders):
+    """
+    Benchmark loading, saving, pricing, invoicing and the headless sales and restock flows on one
+    synthetic inventory. Must be run inside a scratch folder, every file it writes is relative.
+
+    Parameters:
+    'size' (int): Number of products.
+    'repeat' (int): Number of calls for the whole-inventory benchmarks (load and save).
+    'orders' (int): Number of carts in the order stream.
+
+    Returns:
+    list: The results.
+    """
+    results = []
+    generate_inventory("inventory.txt", size)
+
+    #Loading and saving the whole inventory
+    results.append(measure("read_inventory", size, [()]*repeat, read.read_inventory))
+    results.append(measure("map_inventory", size, [()]*repeat, read.map_inventory))
+    d = read.read_inventory()
+    results.append(measure("update_inventory_file", size, [(d,)]*repeat, write.update_inventory_file))
+
+    #Pricing the order stream
+    carts = generate_orders(d, orders)
+    results.append(measure("calculate_total", size, [(d, cart_dict, "sell") for cart_dict in carts],
+                           operations.calculate_total))
+    results.append(measure("price_carts", size, [(d, carts)]*max(repeat, 1), pricing.price_carts))
+    results.append(measure("prod_pad", size, [(d.name(key), 20) for cart_dict in carts for key in cart_dict],
+                           operations.prod_pad))
+
+    #Invoices, rendering alone and rendering plus saving
+    infos = []
+    for cart_dict in carts:
+        costs_list = operations.calculate_total(d, cart_dict, "sell")
+        infos.append((d, cart_dict, operations.build_billing_info("Bench", "9800000000", costs_list)))
+    results.append(measure("render_sell_invoice", size, infos, invoice.render_sell_invoice))
+    results.append(measure("generate_sell_invoice", size, infos, write.generate_sell_invoice))
+    results.append(measure("generate_invoices", size, [(d, invoice_store.SELL, [info[1:] for info in infos])],
+                           write.generate_invoices))
+
+    #Journaling checkouts
+    results.append(measure("record_sale", size, [(d, cart_dict) for cart_dict in carts],
+                           journal.active.record_sale))
+
+    #Whole interactive flows driven with scripted input
+    sales_calls = []
+    for cart_dict in carts[:max(orders//10, 1)]:
+        answers = []
+        keys = list(cart_dict)
+        for key in keys:
+            answers += [str(key), str(cart_dict[key][0])]
+            answers.append("y" if key != keys[-1] else "n")
+        answers += ["y", "9800000000", "Bench"]
+        sales_calls.append((d, answers))
+    results.append(measure("sales_flow", size, sales_calls, run_sales))
+
+    restock_calls = []
+    for cart_dict in carts[:max(orders//10, 1)]:
+        answers = []
+        for key in cart_dict:
+            answers += ["2", str(key), "Bench Supplier", str(cart_dict[key][2])]
+        answers.append("3")
+        restock_calls.append((d, answers))
+    results.append(measure("restock_flow", size, restock_calls, run_restock))
+    return results
+
+
+#Function to run one headless sale
+def run_sales(d, answers):
+    with headless(answers):
+        operations.sales(d)
+
+
+#Function to run one headless restock
+def run_restock(d, answers):
+    with headless(answers):
+        operations.restock(d)
+
+
+#Function to find the commit being benchmarked
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+#Function to compare results with an earlier run
+def compare(results, baseline_file):
+    """
+    Print the change in median latency of every benchmark against the results saved in 'baseline_file'.
+
+    Returns:
+    None
+    """
+    baseline_data = open(baseline_file, "r")
+    baseline = json.load(baseline_data)
+    baseline_data.close()
+    earlier = {}
+    for result in baseline["results"]:
+        earlier[(result["name"], result["size"])] = result
+
+    print("\nCompared with " + baseline_file + " (" + str(baseline["meta"].get("commit")) + "):")
+    for result in results:
+        before = earlier.get((result["name"], result["size"]))
+        if before is None or not before["p50_us"]:
+            continue
+        change = (result["p50_us"] - before["p50_us"])/before["p50_us"]*100
+        print(result["name"].ljust(24) + str(result["size"]).rjust(10) + "   p50 "
+              + ("+" if change >= 0 else "") + str(round(change, 1)) + " %")
+
+
+#Function to run the benchmarks
+def main(arguments):
+    """
+    Run the benchmarks from the command line:
+        python benchmark.py [--sizes 1000,100000] [--repeat 5] [--orders 2000] [--output results.json]
+                            [--compare earlier.json]
+
+    Returns:
+    int: The exit code.
+    """
+    sizes = DEFAULT_SIZES
+    repeat = 5
+    orders = ORDER_COUNT
+    output = "benchmark-results.json"
+    baseline = None
+    try:
+        position = 0
+        while position < len(arguments):
+            option, value = arguments[position], arguments[position+1]
+            if option == "--sizes":
+                sizes = [int(size) for size in value.split(",")]
+            elif option == "--repeat":
+                repeat = int(value)
+            elif option == "--orders":
+                orders = int(value)
+            elif option == "--output":
+                output = value
+            elif option == "--compare":
+                baseline = os.path.abspath(value)
+            else:
+                raise ValueError(option)
+            position += 2
+    except (IndexError, ValueError):
+        print(main.__doc__)
+        return 2
+
+    output = os.path.abspath(output)
+    results = []
+    start_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for size in sizes:
+                #Every size starts from an empty journal and invoice folder
+                journal.active = journal.InventoryJournal(compact_every=10**9)
+                invoice_store.active = invoice_store.InvoiceStore(os.path.join(scratch, "invoices-" + str(size)))
+                sales_ledger.active = sales_ledger.SalesLedger(os.path.join(scratch, "sales-" + str(size) + ".ledger"))
+                if os.path.exists(journal.JOURNAL_FILE):
+                    os.remove(journal.JOURNAL_FILE)
+                results += run_size(size, repeat, orders)
+        finally:
+            os.chdir(start_folder)
+
+    report = {
+        "meta": {
+            "commit": current_commit(),
+            "time": str(datetime.datetime.now()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "orders": orders,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    report_file = open(output, "w")
+    json.dump(report, report_file, indent=2)
+    report_file.close()
+    print("\nResults saved to " + output)
+
+    if baseline is not None:
+        compare(results, baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,272 @@
+import mmap
+import os
+import struct
+import threading
+
+#Files of the customer directory: the customer records and the hash index on their phone numbers
+CUSTOMER_FILE = "customers.dat"
+INDEX_FILE = "customers.idx"
+
+#Header of the index: magic, number of slots, customers indexed, bytes of the records covered
+INDEX_MAGIC = b"WCCUS001"
+INDEX_HEADER = struct.Struct("<8sqqq")
+
+#A slot of the index: phone number + 1 (0 marks an empty slot) and the offset of the latest record
+SLOT = struct.Struct("<qq")
+
+#Slots of a new index, a power of two, doubled whenever more than half of them are used
+INITIAL_SLOTS = 1024
+
+#Invoice numbers shown by history() unless asked for more
+HISTORY_SIZE = 10
+
+#Multiplier spreading phone numbers over the slots (Fibonacci hashing)
+HASH_MULTIPLIER = 11400714819323198485
+
+
+#Class for the directory of repeat customers
+class CustomerDirectory:
+    """
+    Directory of customers keyed by phone number, with the invoices of every visit.
+
+    Every checkout appends one line to 'customers.dat':
+        '<phone>,<visits>,<invoice number>,<offset of the previous record + 1>,<name>'
+    so the latest line of a customer holds their name and number of visits and points back to their previous
+    line, and following those pointers gives the invoice numbers of all their visits, newest first, without
+    ever rewriting a line.
+
+    'customers.idx' is an open addressing hash table mapping each phone number to the offset of its latest
+    line. It is memory mapped rather than read, so finding a customer touches one or two slots whatever the
+    number of customers, and starting the program does not load the directory. The index is doubled once half
+    of its slots are used. Its header records how much of 'customers.dat' it covers, and lines appended after
+    that (for example before a crash) are indexed again when the directory is opened.
+
+    The directory expects to be used by one program at a time.
+
+    Parameters:
+    'path' (str): The customer records.
+    'index_path' (str): The index.
+    """
+
+    def __init__(self, path=CUSTOMER_FILE, index_path=INDEX_FILE):
+        self.path = path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._data = None
+        self._index_file = None
+        self._index = None
+        self._slots = 0
+        self._used = 0
+        self._covered = 0
+
+    #Function to open the files on first use
+    def _open(self):
+        if self._index is not None:
+            return
+        self._data = open(self.path, "a+b")
+        try:
+            self._index_file = open(self.index_path, "r+b")
+            self._index = mmap.mmap(self._index_file.fileno(), 0)
+            magic, self._slots, self._used, self._covered = INDEX_HEADER.unpack_from(self._index, 0)
+            if magic != INDEX_MAGIC or len(self._index) != INDEX_HEADER.size + self._slots*SLOT.size:
+                raise ValueError("Not a customer index.")
+        except (OSError, ValueError, struct.error):
+            self._close_index()
+            self._create_index(INITIAL_SLOTS)
+
+        size = os.path.getsize(self.path)
+        if self._covered > size:
+            #The records were replaced, indexing them all again
+            self._close_index()
+            self._create_index(self._slots)
+        if self._covered < size:
+            self._catch_up()
+
+    #Function to create an empty index
+    def _create_index(self, slots, path=None):
+        index_file = open(path or self.index_path, "w+b")
+        index_file.truncate(INDEX_HEADER.size + slots*SLOT.size)
+        index = mmap.mmap(index_file.fileno(), 0)
+        INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, slots, 0, 0)
+        if path is not None:
+            return index_file, index
+        self._index_file = index_file
+        self._index = index
+        self._slots = slots
+        self._used = 0
+        self._covered = 0
+
+    #Function to close the index
+    def _close_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    #Function to save the header of the index
+    def _write_header(self):
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._slots, self._used, self._covered)
+
+    #Function to find the slot of a phone number
+    @staticmethod
+    def _find_slot(index, slots, key):
+        """
+        Return (slot, offset + 1) of a phone number key, where offset + 1 is 0 and slot is the empty slot to
+        use if the phone number is not indexed.
+        """
+        mask = slots - 1
+        slot = ((key*HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> (64 - slots.bit_length() + 1)
+        while True:
+            found, offset = SLOT.unpack_from(index, INDEX_HEADER.size + slot*SLOT.size)
+            if found == key or found == 0:
+                return slot, offset
+            slot = (slot + 1) & mask
+
+    #Function to point the index at the latest record of a customer
+    def _index_record(self, key, offset):
+        slot, found = self._find_slot(self._index, self._slots, key)
+        SLOT.pack_into(self._index, INDEX_HEADER.size + slot*SLOT.size, key, offset + 1)
+        if found == 0:
+            self._used += 1
+            if self._used*2 > self._slots:
+                self._grow()
+
+    #Function to double the number of slots
+    def _grow(self):
+        """
+        Copy every slot into an index with twice as many slots, written next to the index and renamed over it.
+        """
+        slots = self._slots*2
+        index_file, index = self._create_index(slots, self.index_path + ".tmp")
+        for slot in range(self._slots):
+            key, offset = SLOT.unpack_from(self._index, INDEX_HEADER.size + slot*SLOT.size)
+            if key:
+                new_slot = self._find_slot(index, slots, key)[0]
+                SLOT.pack_into(index, INDEX_HEADER.size + new_slot*SLOT.size, key, offset)
+        INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, slots, self._used, self._covered)
+        index.flush()
+        self._close_index()
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._index_file = index_file
+        self._index = index
+        self._slots = slots
+
+    #Function to index the records written after the index was last saved
+    def _catch_up(self):
+        self._data.seek(self._covered)
+        offset = self._covered
+        for line in self._data:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                self._index_record(int(line.split(b",", 1)[0]) + 1, offset)
+            except ValueError:
+                pass
+            offset += len(line)
+        self._covered = offset
+        self._write_header()
+
+    #Function to read the record at an offset of the customer file
+    def _read_record(self, offset):
+        self._data.seek(offset)
+        fields = self._data.readline().decode().rstrip("\n").split(",", 4)
+        return {"phone": fields[0], "visits": int(fields[1]), "invoice_no": int(fields[2]),
+                "previous": int(fields[3]), "name": fields[4]}
+
+    #Function to find a customer by phone number
+    def find(self, phone):
+        """
+        Find a customer in the directory.
+
+        Parameters:
+        'phone' (str): The 10 digit phone number.
+
+        Returns:
+        dict or None: The keys 'phone', 'name', 'visits' and 'invoice_no' (of the last visit), or None if the
+        customer has never checked out.
+        """
+        with self._lock:
+            self._open()
+            offset = self._find_slot(self._index, self._slots, int(phone) + 1)[1]
+            if offset == 0:
+                return None
+            record = self._read_record(offset - 1)
+        del record["previous"]
+        return record
+
+    #Function to list the invoices of a customer
+    def history(self, phone, limit=HISTORY_SIZE):
+        """
+        Return the invoice numbers of a customer's visits, newest first, by following the pointers from their
+        latest record. Each invoice can be read with invoice_store.active.read_invoice().
+
+        Parameters:
+        'phone' (str): The 10 digit phone number.
+        'limit' (int): The most invoice numbers to return, None for all of them.
+
+        Returns:
+        list: The invoice numbers, empty if the customer has never checked out.
+        """
+        invoices = []
+        with self._lock:
+            self._open()
+            offset = self._find_slot(self._index, self._slots, int(phone) + 1)[1]
+            while offset and (limit is None or len(invoices) < limit):
+                record = self._read_record(offset - 1)
+                invoices.append(record["invoice_no"])
+                offset = record["previous"]
+        return invoices
+
+    #Function to remember the customers of checkouts
+    def remember_all(self, visits):
+        """
+        Record checkouts in the directory, adding new customers and updating the name of known ones.
+
+        Parameters:
+        'visits' (list): (phone, name, invoice number) of every checkout, in the order they happened.
+
+        Returns:
+        boolean: True if every checkout was recorded.
+        """
+        try:
+            with self._lock:
+                self._open()
+                self._data.seek(0, os.SEEK_END)
+                for phone, name, invoice_no in visits:
+                    key = int(phone) + 1
+                    previous = self._find_slot(self._index, self._slots, key)[1]
+                    visit_count = 1
+                    if previous:
+                        visit_count = self._read_record(previous - 1)["visits"] + 1
+                        self._data.seek(0, os.SEEK_END)
+                    name = str(name).replace(",", " ").replace("\n", " ").strip()
+                    line = (phone + "," + str(visit_count) + "," + str(invoice_no) + "," + str(previous) + ","
+                            + name + "\n").encode()
+                    offset = self._data.tell()
+                    self._data.write(line)
+                    self._data.flush()
+                    self._index_record(key, offset)
+                    self._covered = offset + len(line)
+                self._write_header()
+        except (OSError, ValueError):
+            return False
+        return True
+
+    #Function to remember the customer of one checkout
+    def remember(self, phone, name, invoice_no):
+        return self.remember_all([(phone, name, invoice_no)])
+
+    #Function to save the index and close the files
+    def close(self):
+        with self._lock:
+            if self._index is not None:
+                self._index.flush()
+                self._close_index()
+                self._data.close()
+                self._data = None
+
+
+#Customer directory used by the program
+active = CustomerDirectory()
@@ -0,0 +1,188 @@
+import metrics
+import promotions
+
+#Store details printed at the top of every invoice, set by stores.StoreRouter for the store being served
+STORE_NAME = "WeCare Store"
+STORE_ADDRESS = "Samakushi, Kathmandu, Nepal"
+
+#Width of the invoice
+LINE_WIDTH = 80
+RULE = "-" * LINE_WIDTH + "\n"
+
+
+#Class for a table layout compiled once into a format spec
+class InvoiceLayout:
+    """
+    Column layout of an invoice table, compiled once into a single format spec.
+
+    Cells longer than their column are cut and trailed with '...' exactly like operations.prod_pad,
+    every other cell is padded by the format spec itself.
+
+    Parameters:
+    'title' (str): The invoice title, e.g. 'CUSTOMER INVOICE'.
+    'columns' (list): (heading, width) pairs for every column.
+    """
+
+    def __init__(self, title, columns):
+        self.title = title
+        self.widths = []
+        row_format = ""
+        for position in range(len(columns)):
+            width = columns[position][1]
+            self.widths.append(width)
+            row_format += "{" + str(position) + ":<" + str(width) + "}"
+        self.row_format = row_format + "\n"
+        self.header = self.row([heading for heading, width in columns])
+
+    #Function to render one row of the table
+    def row(self, values):
+        """
+        Render the cells of one row as a single line.
+
+        Parameters:
+        'values' (list): One value per column, converted with str().
+
+        Returns:
+        str: The row followed by a newline.
+        """
+        texts = []
+        for value, width in zip(values, self.widths):
+            text = str(value)
+            if len(text) > width-1:
+                text = text[:width-4] + "..."
+            texts.append(text)
+        return self.row_format.format(*texts)
+
+
+#Layouts of the two invoices
+SELL_LAYOUT = InvoiceLayout("CUSTOMER INVOICE", [("ID", 8), ("Name", 19), ("Brand", 15), ("Price", 12),
+                                                 ("Quantity", 12), ("Free", 9), ("Total", 16)])
+STOCK_LAYOUT = InvoiceLayout("RESTOCK INVOICE", [("ID", 6), ("Name", 16), ("Brand", 15), ("Price", 12),
+                                                 ("Quantity", 12), ("Supplier", 13), ("Total", 16)])
+
+
+#Function to fix the store an invoice is printed for
+def stamp_store(info):
+    """
+    Save the current STORE_NAME and STORE_ADDRESS in billing or restock info, so the invoice keeps the header
+    of the store it was made in wherever it is rendered, e.g. in a worker process of write.generate_invoices.
+    """
+    info.setdefault("store_name", STORE_NAME)
+    info.setdefault("store_address", STORE_ADDRESS)
+
+
+#Function to render the top of an invoice
+def render_header(title, info):
+    """
+    Render the invoice title, store details and date.
+
+    Parameters:
+    'title' (str): The invoice title.
+    'info' (dict): Billing or restock info holding the 'time' of the transaction and, once it has been
+        saved, the 'invoice_no'. The 'store_name' and 'store_address' it may hold are printed instead of
+        STORE_NAME and STORE_ADDRESS.
+
+    Returns:
+    str: The header text.
+    """
+    header = ("\n"*2 + RULE + " "*32 + title + "\n" + RULE + info.get("store_name", STORE_NAME) + "\n"
+              + info.get("store_address", STORE_ADDRESS) + "\n\n")
+    if "invoice_no" in info:
+        header += "Invoice No.: " + info["invoice_no"] + "\n"
+    return header + "Date: " + str(info["time"]) + "\n"
+
+
+#Function to render the bottom of an invoice
+def render_footer(info):
+    """
+    Render the total, VAT and grand total of an invoice.
+
+    Parameters:
+    'info' (dict): Billing or restock info holding 'total', 'vat' and 'grand_total'.
+
+    Returns:
+    str: The footer text.
+    """
+    return (RULE + "Total: " + str(info["total"]) + "\n" + "VAT: " + str(info["vat"]) + "\n"
+            + "Grand Total: " + str(info["grand_total"]) + "\n" + RULE)
+
+
+#Function to render a customer invoice
+def render_sell_invoice(d, cart_dict, billing_info, offers=None):
+    """
+    Render a whole customer invoice into one string.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'cart_dict' (dict): The cart, product IDs mapped to [sell_qty, free_qty, total_sell_qty].
+    'billing_info' (dict): Customer and billing details ('time', 'name', 'phone', 'total', 'vat', 'grand_total').
+    'offers' (Promotions): The promotions the lines are priced with, promotions.active by default.
+
+    Returns:
+    str: The invoice text.
+    """
+    if offers is None:
+        offers = promotions.active
+    parts = [render_header(SELL_LAYOUT.title, billing_info),
+             "Name: " + billing_info["name"] + "\n",
+             "Phone no.: " + str(billing_info["phone"]) + "\n",
+             RULE, SELL_LAYOUT.header, RULE]
+
+    row = SELL_LAYOUT.row
+    for key in cart_dict:
+        sell_price = d.price(key)*2
+        quantities = cart_dict[key]
+        offer = offers.offer(d, key)
+        parts.append(row((key, d.name(key), d.brand(key), sell_price, quantities[2], quantities[1],
+                          promotions.format_amount(offer.amount(quantities[0], sell_price),
+                                                   offer.percent(quantities[0])))))
+
+    parts.append(render_footer(billing_info))
+    return "".join(parts)
+
+
+#Function to render a restock invoice
+def render_stock_invoice(d, stock_list, restock_info):
+    """
+    Render a whole restock invoice into one string.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'stock_list' (list): A list of [product ID, quantity, supplier] entries.
+    'restock_info' (dict): Restock details ('time', 'total', 'vat', 'grand_total').
+
+    Returns:
+    str: The invoice text.
+    """
+    parts = [render_header(STOCK_LAYOUT.title, restock_info), RULE, STOCK_LAYOUT.header, RULE]
+
+    row = STOCK_LAYOUT.row
+    for item in stock_list:
+        price = d.price(item[0])
+        parts.append(row((item[0], d.name(item[0]), d.brand(item[0]), price, item[1], item[2],
+                          int(item[1])*price)))
+
+    parts.append(render_footer(restock_info))
+    return "".join(parts)
+
+
+#Function to save a rendered invoice
+def write_invoice(file_name, text):
+    """
+    Write a rendered invoice to a file with a single write call.
+
+    Parameters:
+    'file_name' (str): The invoice file, it is created or overwritten.
+    'text' (str): The rendered invoice.
+
+    Returns:
+    None
+    """
+    data = text.encode()
+    invoice_file = open(file_name, "wb", buffering=0)
+    try:
+        invoice_file.write(data)
+    finally:
+        invoice_file.close()
+    if metrics.enabled:
+        metrics.add_bytes("invoice.write", len(data))
@@ -0,0 +1,299 @@
+import datetime
+import os
+import struct
+import threading
+import zlib
+
+import invoice
+import metrics
+
+#Folder holding all invoices
+INVOICE_DIR = "invoices"
+
+#Archive mode: size after which a new segment file is started, and the header of every record
+SEGMENT_SIZE = 64*1024*1024
+RECORD_HEADER = struct.Struct("<qI")
+
+#Kinds of invoices kept in the index
+SELL = "S"
+RESTOCK = "R"
+
+#fcntl is only available on POSIX systems, elsewhere the counter is only locked within the process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+#Function to format an invoice number
+def format_number(invoice_no):
+    """
+    Format an invoice number for display, e.g. 42 -> 'INV-00000042'.
+    """
+    return "INV-" + str(invoice_no).rjust(8, "0")
+
+
+#Function to build the index record of an invoice
+def index_record(invoice_no, kind, relative_path, info, phone=""):
+    """
+    Return the index line of an invoice as a list of fields, see InvoiceStore.
+    """
+    return [str(invoice_no), kind, relative_path, str(phone), str(info["total"].paisa), str(info["grand_total"].paisa)]
+
+
+#Class for the invoice storage
+class InvoiceStore:
+    """
+    Stores invoices under unique numbers in date-sharded folders with an append-only index.
+
+    Invoice numbers follow on from each other, even across restarts and between processes, because the last
+    number handed out is kept in a counter file that is locked while it is read and updated. An invoice is saved as '<root>/<year>/<month>/<day>/INV-<number>.txt' and a line
+    '<number>,<kind>,<location>,<phone>,<total paisa>,<grand total paisa>' is appended to '<root>/index.txt'.
+    The index is read once on the first lookup, after which finding an invoice is a dictionary lookup.
+
+    In archive mode invoices are not written as separate files. Each one is compressed and appended to a
+    rolling segment file '<root>/segments/seg-<n>.dat' and its location is indexed as
+    'segments/seg-<n>.dat@<offset>', so it can still be read back with a single seek.
+
+    Parameters:
+    'root' (str): The folder to keep invoices in.
+    'archive' (bool): If True, invoices are appended to compressed segment files.
+    'segment_size' (int): Size in bytes after which a new segment file is started.
+    """
+
+    def __init__(self, root=INVOICE_DIR, archive=False, segment_size=SEGMENT_SIZE):
+        self.root = root
+        self.archive = archive
+        self.segment_size = segment_size
+        self.counter_file = os.path.join(root, "counter")
+        self.index_file = os.path.join(root, "index.txt")
+        self.segment_dir = os.path.join(root, "segments")
+        self._lock = threading.Lock()
+        self._index = None
+        self._segment_no = 0
+
+    #Function to take numbers from the counter file
+    def _reserve(self, count):
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(self.counter_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            text = os.read(fd, 64).decode().strip()
+            last = int(text) if text else 0
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(last + count).encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return last + 1
+
+    #Function to get new invoice numbers
+    def allocate(self, count=1):
+        """
+        Take the next invoice numbers from the counter file, so no number is skipped when the program stops.
+
+        Parameters:
+        'count' (int): How many consecutive numbers to take, e.g. one per invoice of a batch, which updates the
+            counter file once for all of them.
+
+        Returns:
+        int: The first of the numbers, the others follow it.
+        """
+        with self._lock:
+            return self._reserve(count)
+
+    #Function to work out where an invoice is saved
+    def path_for(self, invoice_no, time):
+        """
+        Return the path of an invoice relative to the store root, sharded by the date of the transaction.
+
+        Parameters:
+        'invoice_no' (int): The invoice number.
+        'time' (str): The transaction time as stored in billing info, e.g. '2025-01-31 10:15:00.000000'.
+
+        Returns:
+        str: The relative path of the invoice file.
+        """
+        try:
+            date = datetime.date.fromisoformat(str(time)[:10])
+        except ValueError:
+            date = datetime.date.today()
+        return os.path.join(str(date.year), str(date.month).rjust(2, "0"), str(date.day).rjust(2, "0"),
+                            format_number(invoice_no) + ".txt")
+
+    #Function to save an invoice and index it
+    def save(self, invoice_no, kind, text, info, phone=""):
+        """
+        Save a rendered invoice and append it to the index.
+
+        Parameters:
+        'invoice_no' (int): The number from allocate().
+        'kind' (str): SELL or RESTOCK.
+        'text' (str): The rendered invoice.
+        'info' (dict): The billing or restock info with 'time', 'total' and 'grand_total'.
+        'phone' (str): The customer's phone number, empty for restock invoices.
+
+        Returns:
+        str: The path of the saved invoice file, or its segment location in archive mode.
+        """
+        if self.archive:
+            relative_path = self._append_to_segment(invoice_no, text)
+            path = os.path.join(self.root, relative_path)
+        else:
+            relative_path = self.path_for(invoice_no, info["time"])
+            path = os.path.join(self.root, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            invoice.write_invoice(path, text)
+
+        self.add_to_index([index_record(invoice_no, kind, relative_path, info, phone)])
+        return path
+
+    #Function to append records to the index
+    def add_to_index(self, records):
+        """
+        Append index records, see index_record(), with a single write.
+
+        Parameters:
+        'records' (list): The records, in the order they are written.
+
+        Returns:
+        None
+        """
+        if not records:
+            return
+        data = ""
+        for record in records:
+            data += ",".join(record) + "\n"
+        data = data.encode()
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(self.index_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        if metrics.enabled:
+            metrics.add_bytes("invoice_index.write", len(data))
+
+        with self._lock:
+            if self._index is not None:
+                for record in records:
+                    self._index[int(record[0])] = record
+
+    #Function to find the segment file new records go to
+    def _current_segment(self):
+        if self._segment_no == 0:
+            os.makedirs(self.segment_dir, exist_ok=True)
+            self._segment_no = 1
+            for name in os.listdir(self.segment_dir):
+                if name.startswith("seg-") and name.endswith(".dat"):
+                    self._segment_no = max(self._segment_no, int(name[4:-4]))
+        return "seg-" + str(self._segment_no).rjust(6, "0") + ".dat"
+
+    #Function to append a compressed invoice to the current segment
+    def _append_to_segment(self, invoice_no, text):
+        """
+        Compress an invoice and append it to the current segment file, starting a new one when it is full.
+
+        Parameters:
+        'invoice_no' (int): The invoice number, stored in the record header.
+        'text' (str): The rendered invoice.
+
+        Returns:
+        str: The location of the record, 'segments/<segment file>@<offset>'.
+        """
+        data = zlib.compress(text.encode())
+        record = RECORD_HEADER.pack(invoice_no, len(data)) + data
+        with self._lock:
+            segment_name = self._current_segment()
+            segment_path = os.path.join(self.segment_dir, segment_name)
+            fd = os.open(segment_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                offset = os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+            if metrics.enabled:
+                metrics.add_bytes("invoice_segment.write", len(record))
+            if offset + len(record) >= self.segment_size:
+                self._segment_no += 1
+        return "segments/" + segment_name + "@" + str(offset)
+
+    #Function to read a compressed invoice back from a segment
+    def _read_from_segment(self, location, invoice_no):
+        segment_path, offset = location.rsplit("@", 1)
+        segment_file = open(segment_path, "rb")
+        try:
+            segment_file.seek(int(offset))
+            stored_no, length = RECORD_HEADER.unpack(segment_file.read(RECORD_HEADER.size))
+            data = segment_file.read(length)
+        finally:
+            segment_file.close()
+        if stored_no != invoice_no or len(data) != length:
+            raise ValueError("Invoice " + format_number(invoice_no) + " is damaged in " + segment_path)
+        return zlib.decompress(data).decode()
+
+    #Function to load the index into memory
+    def _load_index(self):
+        index = {}
+        try:
+            index_file = open(self.index_file, "r")
+        except FileNotFoundError:
+            return index
+        for line in index_file:
+            record = line.rstrip("\n").split(",")
+            if len(record) == 6 and line.endswith("\n"):
+                index[int(record[0])] = record
+        index_file.close()
+        return index
+
+    #Function to find an invoice by number
+    def lookup(self, invoice_no):
+        """
+        Find an invoice in the index.
+
+        Parameters:
+        'invoice_no' (int): The invoice number.
+
+        Returns:
+        dict or None: The keys 'invoice_no', 'kind', 'path', 'phone', 'total' and 'grand_total' (paisa),
+        or None if there is no such invoice.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            record = self._index.get(invoice_no)
+        if record is None:
+            return None
+        return {
+            "invoice_no": invoice_no,
+            "kind": record[1],
+            "path": os.path.join(self.root, record[2]),
+            "phone": record[3],
+            "total": int(record[4]),
+            "grand_total": int(record[5]),
+        }
+
+    #Function to read an invoice back
+    def read_invoice(self, invoice_no):
+        """
+        Return the text of an invoice, or None if there is no such invoice.
+
+        Archived invoices are read with one seek into their segment file and decompressed.
+        """
+        record = self.lookup(invoice_no)
+        if record is None:
+            return None
+        if "@" in record["path"]:
+            return self._read_from_segment(record["path"], invoice_no)
+        invoice_file = open(record["path"], "r")
+        text = invoice_file.read()
+        invoice_file.close()
+        return text
+
+
+#Invoice store used by the program
+active = InvoiceStore()
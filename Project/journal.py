@@ -0,0 +1,287 @@
+import os
+
+import metrics
+import write
+
+#Files used by the journal
+JOURNAL_FILE = "inventory.journal"
+INVENTORY_FILE = "inventory.txt"
+SNAPSHOT_TEMP_FILE = "inventory.txt.compact"
+
+#Number of journal records after which the inventory file is rewritten
+COMPACT_EVERY = 1000
+
+
+#Class for the append-only inventory journal
+class InventoryJournal:
+    """
+    Write-ahead journal holding the inventory changes made since 'inventory.txt' was last written.
+
+    Every checkout and restock appends only the quantity changes of the products involved instead of
+    rewriting the whole inventory. Each line is one record:
+        - 'Q,<id>,<delta>': The quantity of product <id> changed by <delta>.
+        - 'N,<id>,<name>,<brand>,<price>,<origin>': A new product was added with quantity 0.
+        - 'C': A compaction started, all records before it are in the new snapshot.
+
+    On startup replay() applies the records to the inventory read from 'inventory.txt'. Once enough records
+    have piled up, compact() writes a new snapshot atomically (temp file + fsync + rename) and empties the journal.
+
+    Parameters:
+    'path' (str): The journal file.
+    'compact_every' (int): Number of records after which the journal is compacted automatically.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, compact_every=COMPACT_EVERY, inventory_file=INVENTORY_FILE,
+                 temp_file=SNAPSHOT_TEMP_FILE):
+        self.path = path
+        self.compact_every = compact_every
+        self.inventory_file = inventory_file
+        self.temp_file = temp_file
+        self.record_count = 0
+        self.max_id = 0
+
+    #Function to apply the journal to the inventory read at startup
+    def replay(self, d):
+        """
+        Apply the journal records to the inventory read from the snapshot.
+
+        Incomplete or malformed lines, for example the last line of a write cut short by a crash, are ignored.
+        If a compaction was interrupted after the new snapshot was put in place, the records before the
+        compaction marker are already part of the snapshot and are skipped.
+
+        Parameters:
+        'd' (InventoryStore): The inventory read by read.read_inventory().
+
+        Returns:
+        int: The number of records applied.
+        """
+        self.max_id = d.next_id - 1
+        self.record_count = 0
+        try:
+            journal_file = open(self.path, "r")
+            data = journal_file.read()
+            journal_file.close()
+        except FileNotFoundError:
+            return 0
+
+        records = []
+        for line in data.split("\n")[:-1]:
+            fields = line.split(",")
+            if fields[0] == "C":
+                #Records before a finished compaction are already in the snapshot
+                if not os.path.exists(self.temp_file):
+                    records = []
+            elif fields[0] in ("Q", "N"):
+                records.append(fields)
+
+        for fields in records:
+            try:
+                if fields[0] == "Q":
+                    d.add_qty(int(fields[1]), int(fields[2]))
+                else:
+                    prod_id = int(fields[1])
+                    if prod_id not in d:
+                        d[prod_id] = [fields[2], fields[3], "0", fields[4], fields[5]]
+                    if prod_id > self.max_id:
+                        self.max_id = prod_id
+            except (KeyError, IndexError, ValueError):
+                continue
+            self.record_count += 1
+        return self.record_count
+
+    #Function to append records to the journal
+    def append(self, lines):
+        """
+        Append records to the journal with a single write and flush them to disk.
+
+        Parameters:
+        'lines' (list): The record lines, without newline characters.
+
+        Returns:
+        boolean: True if the records were written.
+        """
+        if not lines:
+            return True
+        data = ("\n".join(lines) + "\n").encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if metrics.enabled:
+            metrics.add_bytes("journal.write", len(data))
+        self.record_count += len(lines)
+        return True
+
+    #Function to journal a checkout
+    def record_sale(self, d, cart_dict):
+        """
+        Journal the quantities taken out of the inventory by a checkout.
+
+        Parameters:
+        'd' (InventoryStore): The inventory, already updated with the sale.
+        'cart_dict' (dict): The cart, where index 2 of each value is the quantity deducted from inventory.
+
+        Returns:
+        boolean: True if the sale was journaled.
+        """
+        return self._commit(d, sale_lines(cart_dict))
+
+    #Function to journal a restock
+    def record_restock(self, d, stock_list):
+        """
+        Journal the products added and the quantities restocked.
+
+        Parameters:
+        'd' (InventoryStore): The inventory, already updated with the restock.
+        'stock_list' (list): A list of [product ID, quantity, supplier] entries.
+
+        Returns:
+        boolean: True if the restock was journaled.
+        """
+        lines = []
+        max_id = self.max_id
+        for item in stock_list:
+            prod_id = item[0]
+            #New products are journaled with quantity 0 and get their stock from the Q record
+            if prod_id > max_id:
+                lines.append(",".join(("N", str(prod_id), d.name(prod_id), d.brand(prod_id),
+                                       str(d.price(prod_id)), d.origin(prod_id))))
+                max_id = prod_id
+            lines.append("Q," + str(prod_id) + "," + str(int(item[1])))
+        if not self._commit(d, lines):
+            return False
+        #Products of a restock that failed are journaled as new again by the next one
+        self.max_id = max_id
+        return True
+
+    def _commit(self, d, lines):
+        try:
+            self.append(lines)
+        except OSError:
+            return False
+        if self.record_count >= self.compact_every:
+            self.compact(d)
+        return True
+
+    #Function to check if a record is in the journal
+    def contains(self, line):
+        """
+        Check if the journal holds a record, e.g. the 'T,<id>' marker written with the records of a stock
+        transfer (see stores.StoreRouter). Records before the last compaction are no longer in the journal.
+
+        Returns:
+        boolean: True if the record was found.
+        """
+        try:
+            journal_file = open(self.path, "r")
+        except FileNotFoundError:
+            return False
+        found = False
+        for record in journal_file:
+            if record.rstrip("\n") == line:
+                found = True
+                break
+        journal_file.close()
+        return found
+
+    #Function to write a new snapshot and empty the journal
+    def compact(self, d):
+        """
+        Write the whole inventory to a new snapshot atomically and empty the journal.
+
+        The snapshot is written and fsynced to a temporary file, a 'C' marker is journaled, the temporary file
+        replaces 'inventory.txt' and finally the journal is emptied. A crash at any point leaves either the old
+        snapshot with the full journal or the new snapshot with the records replay() knows to skip.
+
+        Parameters:
+        'd' (InventoryStore): The current inventory.
+
+        Returns:
+        boolean: True if the compaction finished.
+        """
+        try:
+            write.write_inventory_data(d, self.temp_file, self.inventory_file)
+            self.append(["C"])
+            os.replace(self.temp_file, self.inventory_file)
+            sync_directory(self.inventory_file)
+
+            journal_file = open(self.path, "w")
+            journal_file.close()
+            self.record_count = 0
+            self.max_id = d.next_id - 1
+            return True
+        except OSError:
+            return False
+
+
+#Class for the journal of an inventory kept in a database
+class DatabaseJournal(InventoryJournal):
+    """
+    Journal of an inventory stored in a database backend (see storage.SqliteBackend).
+
+    The records of each checkout and restock are applied to the database in one transaction instead of being
+    appended to a file, so a sale only updates the rows of the products it sold and the database is always up to
+    date. There is nothing to replay, and compacting only checkpoints the database.
+
+    Parameters:
+    'backend' (SqliteBackend): The database the records are applied to.
+    """
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def replay(self, d):
+        self.max_id = d.next_id - 1
+        return 0
+
+    def append(self, lines):
+        if not self.backend.apply(lines):
+            raise OSError("The records could not be applied to " + self.backend.path + ".")
+        return True
+
+    def _commit(self, d, lines):
+        try:
+            return self.append(lines)
+        except OSError:
+            return False
+
+    def contains(self, line):
+        return self.backend.has_record(line)
+
+    def compact(self, d):
+        return self.backend.checkpoint()
+
+
+#Function to build the journal records of a checkout
+def sale_lines(cart_dict):
+    """
+    Return the 'Q,<product ID>,<-quantity>' record of every product a cart takes out of the inventory.
+    """
+    lines = []
+    for key in cart_dict:
+        lines.append("Q," + str(key) + "," + str(-cart_dict[key][2]))
+    return lines
+
+
+#Function to make a rename durable
+def sync_directory(file_name):
+    """
+    Flush the directory entry of 'file_name' to disk where the platform allows it.
+    """
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(file_name)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+#Journal used by the program
+active = InventoryJournal()
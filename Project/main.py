@@ -1,10 +1,98 @@
 #importing necessary modules
+import sys
 import read
 import write
 import operations
+import journal
+import batch
+import invoice_store
+import service
+import pos_server
+import metrics
+import sales_ledger
+import storage
+import stores
+import customers
+import promotions
 
-#Reading inventory file
-d = read.read_inventory()
+#Command line options
+args = sys.argv[1:]
+
+#Stores listed in stores.txt, None if this is the only store
+router = None
+
+#Reading the promotion rules, so a mistake in promotions.txt is reported before any sale
+try:
+    promotions.active.load()
+except ValueError as error:
+    print(error)
+    sys.exit(2)
+
+#Timing the hot paths and counting file I/O: python main.py --metrics
+if "--metrics" in args:
+    args.remove("--metrics")
+    metrics.enable()
+
+#Working as a till of a running inventory service: python main.py --connect
+if "--connect" in args:
+    args.remove("--connect")
+    client = service.ServiceClient()
+    d = service.RemoteInventory.connect(client)
+    journal.active = service.RemoteJournal(client, d)
+elif "--store" in args[:-1]:
+    #Working for one of the stores of stores.txt: python main.py --store samakushi
+    position = args.index("--store")
+    try:
+        router = stores.load_router()
+        if router is None:
+            raise ValueError("No stores are configured in " + stores.STORES_FILE + ".")
+        d = router.activate(args[position+1])
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
+    del args[position:position+2]
+else:
+    #Picking the inventory and its storage backend: python main.py --inventory inventory.db
+    inventory_file = "inventory.txt"
+    if "--inventory" in args[:-1]:
+        position = args.index("--inventory")
+        inventory_file = args[position+1]
+        del args[position:position+2]
+    backend = storage.backend_for(inventory_file)
+    journal.active = backend.journal(inventory_file)
+    sales_ledger.active = backend.sales_ledger(inventory_file)
+
+    #Reading inventory file and applying the changes journaled since it was written. A text inventory is memory
+    #mapped and its products decoded when first used, except when it is shared by the threads of --serve and
+    #--api, which change the inventory at the same time and need every product parsed up front
+    if type(backend) is storage.TextBackend and "--serve" not in args and "--api" not in args:
+        d = read.map_inventory(inventory_file, persist_index=True)
+    else:
+        d = read.read_inventory(inventory_file)
+    journal.active.replay(d)
+
+#Sharing the inventory with several tills: python main.py --serve
+if args == ["--serve"]:
+    service.serve(d)
+    sys.exit(0)
+
+#Serving the sales and restock flows as a JSON API: python main.py --api
+if args == ["--api"]:
+    pos_server.serve(d)
+    sys.exit(0)
+
+#Keeping invoices in compressed segment files: python main.py --archive-invoices
+if "--archive-invoices" in args:
+    args.remove("--archive-invoices")
+    invoice_store.active = invoice_store.InvoiceStore(archive=True)
+
+#Selling the orders of a file without prompts: python main.py --batch orders.csv
+if len(args) == 2 and args[0] == "--batch":
+    all_sold = batch.run_batch(d, args[1])
+    journal.active.compact(d)
+    sales_ledger.active.checkpoint()
+    customers.active.close()
+    sys.exit(0 if all_sold else 1)
 
 #Main loop of the program
 main_loop = True
@@ -15,10 +103,14 @@ while main_loop == True:
     print("What action do you wish to perform?")
     print("1: Product Sales")
     print("2: Product Purchase/Restock")
-    print("3: Exit\n")
+    print("3: Exit")
+    print("4: Show metrics")
+    print("5: Sales report")
+    print("6: Stock at other stores")
+    print("7: Transfer stock to another store\n")
 
     #Taking option choice
-    action_option = operations.validate_choice("Enter a choice: ",(1,2,3))
+    action_option = operations.validate_choice("Enter a choice: ",(1,2,3,4,5,6,7))
 
     #For selling products
     if action_option == 1:  
@@ -27,7 +119,7 @@ while main_loop == True:
 
         if billing_info:
             #Generating Invoice file
-            print(write.generate_sell_invoice(d, cart_dict, billing_info, operations.prod_pad))
+            print(write.generate_sell_invoice(d, cart_dict, billing_info))
         print("Exiting to Main menu.")
             
     #For restocking or stocking new products
@@ -40,10 +132,41 @@ while main_loop == True:
             print("No retock process occured.")
         else:
             #Generating restock invoice
-            print(write.generate_stock_invoice(d, stock_list, restock_info, operations.prod_pad))
+            print(write.generate_stock_invoice(d, stock_list, restock_info))
         print("Exiting to Main  menu.")
 
     #For closing the system    
     elif action_option == 3:
+        #Writing the journaled changes back to the inventory file
+        journal.active.compact(d)
+        #Saving the report totals so the next start does not read the whole sales ledger
+        sales_ledger.active.checkpoint()
+        customers.active.close()
+        if metrics.enabled:
+            print("Metrics saved to " + metrics.export() + ".")
         print("System Closed. Thank you!")
         main_loop = False
+
+    #For showing the recorded metrics and saving them to a file
+    elif action_option == 4:
+        print(metrics.report())
+        if metrics.enabled:
+            print("Metrics saved to " + metrics.export() + ".")
+
+    #For showing the sales of today and this month
+    elif action_option == 5:
+        print(sales_ledger.report(d))
+
+    #For finding a product in every store
+    elif action_option == 6:
+        if router is None:
+            print("No other stores are configured, start with --store <code>.")
+        else:
+            stores.show_stock(router, d)
+
+    #For moving stock to another store
+    elif action_option == 7:
+        if router is None:
+            print("No other stores are configured, start with --store <code>.")
+        else:
+            stores.transfer_stock(router, d)
@@ -0,0 +1,142 @@
+import search
+
+#Number of rejected rows reported in detail, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+#Function to read the rows of a supplier manifest
+def read_manifest(file_name):
+    """
+    Read a supplier manifest one line at a time, so only the current line is ever held in memory.
+
+    Each line holds one product of the delivery, in the same order as a line of inventory.txt:
+        name,brand,quantity,price,origin
+    Price and origin are only needed for products that are not in the inventory yet. Blank lines and lines
+    starting with '#' are skipped.
+
+    Parameters:
+    'file_name' (str): The manifest file.
+
+    Returns:
+    generator: Yields (line_number, fields) for every row, the fields stripped of surrounding spaces.
+    """
+    manifest_file = open(file_name, "r")
+    try:
+        line_number = 0
+        for line in manifest_file:
+            line_number += 1
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = []
+            for field in line.split(","):
+                fields.append(field.strip())
+            yield line_number, fields
+    finally:
+        manifest_file.close()
+
+
+#Function to check one row of a manifest
+def validate_row(fields, known):
+    """
+    Check the fields of a manifest row.
+
+    Parameters:
+    'fields' (list): The fields of the row, see read_manifest.
+    'known' (bool): True if the row matches a product already in the inventory.
+
+    Returns:
+    tuple: (qty, price, error) where qty and price are integers (price is 0 for known products) and error is None,
+    or (0, 0, error message) if the row is rejected.
+    """
+    if len(fields) != 5:
+        return 0, 0, "Expected 5 fields, found " + str(len(fields))
+    name, brand, qty, price, origin = fields
+    if not name or not brand:
+        return 0, 0, "The name and brand are needed"
+    try:
+        qty = int(qty)
+    except ValueError:
+        return 0, 0, "Invalid quantity " + repr(qty)
+    if qty < 1:
+        return 0, 0, "The quantity must be positive"
+    if known:
+        return qty, 0, None
+    try:
+        price = int(price)
+    except ValueError:
+        return 0, 0, "New product " + repr(name) + " needs a valid price, found " + repr(price)
+    if price < 1:
+        return 0, 0, "The price of new product " + repr(name) + " must be positive"
+    if not origin:
+        return 0, 0, "New product " + repr(name) + " needs an origin"
+    return qty, price, None
+
+
+#Function to restock the inventory from a supplier manifest
+def import_manifest(d, file_name, supplier, stock_list):
+    """
+    Restock the inventory from a supplier manifest with the same rules as operations.restocking_product and
+    operations.add_product, without any input() prompts.
+
+    The manifest is streamed: rows are matched to existing products by name and brand through
+    search.find_product, matched rows are added to the stock on hand and unmatched rows are added as new
+    products, so a product appearing twice in the manifest is only created once. Rows of the same product are
+    added up into one stock_list entry, so memory depends on the number of different products delivered
+    and not on the length of the manifest. Invalid rows are skipped and counted.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, updated in place.
+    'file_name' (str): The manifest file.
+    'supplier' (str): The supplier of the whole delivery.
+    'stock_list' (list): Gets a [product ID, quantity added (str), supplier] entry for every product delivered,
+        ready for operations.calculate_total and write.generate_stock_invoice.
+
+    Returns:
+    tuple: (rows, added, rejected, errors) where
+        - rows (int): Number of rows imported.
+        - added (int): Number of new products created.
+        - rejected (int): Number of rows skipped.
+        - errors (list): [line number, reason] of the first MAX_REPORTED_ERRORS rows skipped.
+
+    Raises:
+    OSError: If the manifest cannot be read.
+    """
+    rows = 0
+    added = 0
+    rejected = 0
+    errors = []
+
+    #Position of the stock_list entry of every product delivered by this manifest
+    positions = {}
+
+    for line_number, fields in read_manifest(file_name):
+        prod_id = 0
+        if len(fields) == 5:
+            prod_id = search.find_product(d, fields[0], fields[1])
+
+        qty, price, error = validate_row(fields, prod_id != 0)
+        if error:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append([line_number, error])
+            continue
+
+        if prod_id:
+            d.add_qty(prod_id, qty)
+        else:
+            prod_id = d.new_id()
+            d[prod_id] = [fields[0], fields[1], str(qty), str(price), fields[4]]
+            search.add_product(d, prod_id)
+            added += 1
+
+        #Adding up the rows of the same product
+        if prod_id in positions:
+            item = stock_list[positions[prod_id]]
+            item[1] = str(int(item[1]) + qty)
+        else:
+            positions[prod_id] = len(stock_list)
+            stock_list.append([prod_id, str(qty), supplier])
+        rows += 1
+
+    return rows, added, rejected, errors
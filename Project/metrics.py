@@ -0,0 +1,235 @@
+import functools
+import importlib
+import time
+
+#Each power of two is split into 2**SUB_BUCKET_BITS buckets, so a recorded time is off by at most about 6%
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+#Enough buckets for any duration up to 2**63 nanoseconds
+BUCKET_COUNT = 64*SUB_BUCKETS
+
+#File the metrics are exported to
+METRICS_FILE = "metrics.txt"
+
+#Percentiles shown and exported
+QUANTILES = (0.5, 0.9, 0.99)
+
+#Functions timed while metrics are on, as (module, attribute path)
+INSTRUMENTED = [
+    ("operations", "id_validation"),
+    ("operations", "qty_validation"),
+    ("operations", "resolve_product"),
+    ("operations", "calculate_total"),
+    ("pricing", "price_carts"),
+    ("invoice", "render_sell_invoice"),
+    ("invoice", "render_stock_invoice"),
+    ("invoice", "write_invoice"),
+    ("invoice_store", "InvoiceStore.save"),
+    ("write", "generate_sell_invoice"),
+    ("write", "generate_stock_invoice"),
+    ("write", "update_inventory_file"),
+    ("write", "write_inventory_data"),
+    ("read", "read_inventory"),
+    ("read", "map_inventory"),
+    ("journal", "InventoryJournal.append"),
+    ("journal", "InventoryJournal.replay"),
+    ("journal", "InventoryJournal.compact"),
+    ("storage", "SqliteBackend.apply"),
+    ("storage", "SqliteBackend.save"),
+    ("customers", "CustomerDirectory.find"),
+    ("customers", "CustomerDirectory.remember_all"),
+]
+
+#True while metrics are being recorded
+enabled = False
+
+#Histograms of the timed functions and byte counts of file reads and writes, by name
+histograms = {}
+io_bytes = {}
+
+#Functions replaced by enable(), to put back on disable()
+_originals = {}
+
+
+#Class for a histogram of durations
+class Histogram:
+    """
+    HDR-style histogram of durations in nanoseconds with constant memory and constant time recording.
+
+    Values below 2*SUB_BUCKETS are counted exactly. Larger values fall into one of SUB_BUCKETS linear buckets
+    within their power of two, so every bucket is at most about 6% wide relative to its values however long
+    the durations are, and percentiles are read back with that precision.
+    """
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0]*BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    #Function to record one duration
+    def record(self, value):
+        if value < 2*SUB_BUCKETS:
+            index = max(value, 0)
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = shift*SUB_BUCKETS + (value >> shift)
+        self.counts[index] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    #Function to get the range of values of a bucket
+    @staticmethod
+    def bucket_range(index):
+        if index < 2*SUB_BUCKETS:
+            return index, index
+        shift = index//SUB_BUCKETS - 1
+        top = index - shift*SUB_BUCKETS
+        return top << shift, ((top + 1) << shift) - 1
+
+    #Function to read a percentile back
+    def percentile(self, quantile):
+        """
+        Return the duration below which 'quantile' (0 to 1) of the recorded durations lie, 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0
+        rank = max(int(self.count*quantile + 0.5), 1)
+        seen = 0
+        for index in range(BUCKET_COUNT):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self.bucket_range(index)
+                return min(max((low + high)//2, self.min), self.max)
+        return self.max
+
+
+#Function to find a function or method by its path
+def _resolve(module_name, path):
+    owner = importlib.import_module(module_name)
+    names = path.split(".")
+    for name in names[:-1]:
+        owner = getattr(owner, name)
+    return owner, names[-1]
+
+
+#Function to wrap a function so its calls are timed
+def _timed(name, function):
+    histogram = histograms.setdefault(name, Histogram())
+    clock = time.perf_counter_ns
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.record(clock() - start)
+    return timed
+
+
+#Function to start recording metrics
+def enable():
+    """
+    Start timing every function in INSTRUMENTED and counting the bytes read from and written to files.
+
+    The functions are replaced in their modules by timed wrappers, and put back by disable(). While metrics are
+    off nothing is wrapped, so the program runs exactly as without this module.
+
+    Returns:
+    None
+    """
+    global enabled
+    for module_name, path in INSTRUMENTED:
+        key = module_name + "." + path
+        if key in _originals:
+            continue
+        owner, attribute = _resolve(module_name, path)
+        function = getattr(owner, attribute)
+        _originals[key] = (owner, attribute, function)
+        setattr(owner, attribute, _timed(key, function))
+    enabled = True
+
+
+#Function to stop recording metrics
+def disable():
+    global enabled
+    enabled = False
+    for key in list(_originals):
+        owner, attribute, function = _originals.pop(key)
+        setattr(owner, attribute, function)
+
+
+#Function to forget everything recorded so far
+def reset():
+    for histogram in histograms.values():
+        histogram.__init__()
+    io_bytes.clear()
+
+
+#Function to count bytes read from or written to a file
+def add_bytes(name, count):
+    """
+    Add to the byte count of a kind of file access, e.g. 'journal.write'. Callers check 'enabled' first so
+    nothing is counted when metrics are off.
+    """
+    io_bytes[name] = io_bytes.get(name, 0) + count
+
+
+#Function to show the metrics as a table
+def report():
+    """
+    Return the call counts, total time and latency percentiles of every timed function and the bytes read and
+    written, as a table for the terminal.
+
+    Returns:
+    str: The report.
+    """
+    if not enabled:
+        return "Metrics are off. Start the program with --metrics to record them.\n"
+    lines = ["-"*100, "Operation".ljust(44) + "Calls".rjust(8) + "Total ms".rjust(12) + "p50 us".rjust(12)
+             + "p90 us".rjust(12) + "p99 us".rjust(12), "-"*100]
+    for name in sorted(histograms):
+        histogram = histograms[name]
+        if histogram.count == 0:
+            continue
+        lines.append(name.ljust(44) + str(histogram.count).rjust(8) + str(round(histogram.total/1e6, 2)).rjust(12)
+                     + "".join(str(round(histogram.percentile(quantile)/1e3, 1)).rjust(12) for quantile in QUANTILES))
+    lines.append("-"*100)
+    for name in sorted(io_bytes):
+        lines.append((name + " bytes").ljust(44) + str(io_bytes[name]).rjust(20))
+    return "\n".join(lines) + "\n"
+
+
+#Function to export the metrics as a text file
+def export(file_name=METRICS_FILE):
+    """
+    Write the metrics to 'file_name' in the Prometheus text format, durations in seconds.
+
+    Returns:
+    str: The file name.
+    """
+    lines = ["# TYPE wecare_operation_seconds summary"]
+    for name in sorted(histograms):
+        histogram = histograms[name]
+        label = '{operation="' + name + '"'
+        for quantile in QUANTILES:
+            lines.append("wecare_operation_seconds" + label + ',quantile="' + str(quantile) + '"} '
+                         + repr(histogram.percentile(quantile)/1e9))
+        lines.append("wecare_operation_seconds_sum" + label + "} " + repr(histogram.total/1e9))
+        lines.append("wecare_operation_seconds_count" + label + "} " + str(histogram.count))
+    lines.append("# TYPE wecare_io_bytes_total counter")
+    for name in sorted(io_bytes):
+        lines.append('wecare_io_bytes_total{io="' + name + '"} ' + str(io_bytes[name]))
+
+    metrics_file = open(file_name, "w")
+    metrics_file.write("\n".join(lines) + "\n")
+    metrics_file.close()
+    return file_name
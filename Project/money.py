@@ -0,0 +1,172 @@
+#VAT rate in percent
+VAT_PERCENT = 13
+
+#Number of paisa in a rupee
+PAISA_PER_RUPEE = 100
+
+
+#Class for exact amounts of money
+class Money:
+    """
+    An exact amount of money stored as a whole number of paisa.
+
+    Adding, subtracting and comparing amounts is plain integer arithmetic, so totals never drift the
+    way float totals do. Printing an amount always shows rupees with two decimals, e.g. 'Rs 91' prints as '91.00'.
+
+    Parameters:
+    'paisa' (int): The amount in paisa.
+    """
+    __slots__ = ("paisa",)
+
+    def __init__(self, paisa=0):
+        self.paisa = int(paisa)
+
+    #Function to create an amount from rupees
+    @classmethod
+    def from_rupees(cls, rupees):
+        """
+        Create an amount from a whole number of rupees or a text such as '12.50'.
+
+        Parameters:
+        'rupees' (int or str): The amount in rupees.
+
+        Returns:
+        Money: The amount.
+
+        Raises:
+        ValueError: If the text is not a valid amount or has more than two decimals.
+        """
+        if isinstance(rupees, int):
+            return cls(rupees*PAISA_PER_RUPEE)
+        text = str(rupees).strip()
+        sign = 1
+        if text.startswith("-"):
+            sign = -1
+            text = text[1:]
+        whole, dot, fraction = text.partition(".")
+        if not whole.isdigit() or (dot and not fraction.isdigit()) or len(fraction) > 2:
+            raise ValueError("Invalid amount: " + str(rupees))
+        return cls(sign*(int(whole)*PAISA_PER_RUPEE + int(fraction.ljust(2, "0") or 0)))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paisa + other.paisa)
+        if other == 0:
+            return self
+        return NotImplemented
+
+    #Allows sum() over amounts, which starts from 0
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paisa - other.paisa)
+        return NotImplemented
+
+    def __mul__(self, count):
+        if isinstance(count, int):
+            return Money(self.paisa*count)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.paisa)
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.paisa == other.paisa
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.paisa < other.paisa
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Money):
+            return self.paisa <= other.paisa
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Money):
+            return self.paisa > other.paisa
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Money):
+            return self.paisa >= other.paisa
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.paisa)
+
+    def __bool__(self):
+        return self.paisa != 0
+
+    def __str__(self):
+        return format_paisa(self.paisa)
+
+    def __repr__(self):
+        return "Money(" + str(self) + ")"
+
+
+#Function to format paisa as rupees
+def format_paisa(paisa):
+    """
+    Format an amount of paisa as rupees with two decimals, e.g. 9100 -> '91.00'.
+    """
+    sign = ""
+    if paisa < 0:
+        sign = "-"
+        paisa = -paisa
+    rupees, rest = divmod(paisa, PAISA_PER_RUPEE)
+    return sign + str(rupees) + "." + str(rest).rjust(2, "0")
+
+
+#Function to work out the VAT in paisa
+def vat_paisa(total_paisa):
+    """
+    Work out the VAT on a total with integer arithmetic only.
+
+    The VAT is charged once on the bill total, not per line, and rounded to the nearest paisa with
+    halves rounded up (away from zero for refunds).
+
+    Parameters:
+    'total_paisa' (int): The bill total in paisa.
+
+    Returns:
+    int: The VAT in paisa.
+    """
+    if total_paisa < 0:
+        return -vat_paisa(-total_paisa)
+    return (total_paisa*VAT_PERCENT + 50)//100
+
+
+#Function to work out the total, VAT and grand total of a bill
+def bill_totals(total_rupees):
+    """
+    Turn a bill total in whole rupees into exact total, VAT and grand total amounts.
+
+    The per-line arithmetic of a bill stays in plain integers (quantity times whole rupee prices) and is
+    only turned into Money once here.
+
+    Parameters:
+    'total_rupees' (int): The bill total before VAT in whole rupees.
+
+    Returns:
+    tuple: (total, vat, grand_total) as Money.
+    """
+    return paisa_totals(total_rupees*PAISA_PER_RUPEE)
+
+
+#Function to work out the total, VAT and grand total of a bill in paisa
+def paisa_totals(total_paisa):
+    """
+    Same as bill_totals for a bill total in paisa, e.g. when a percentage off leaves paisa on a line.
+
+    Returns:
+    tuple: (total, vat, grand_total) as Money.
+    """
+    vat = vat_paisa(total_paisa)
+    return Money(total_paisa), Money(vat), Money(total_paisa + vat)
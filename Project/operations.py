@@ -1,5 +1,14 @@
+import customers
 import datetime
-import write
+import invoice
+import invoice_store
+import journal
+import manifest
+import money
+import promotions
+import sales_ledger
+import search
+import view
 
 #Function to get the data with suitable spacing
 def prod_pad(text, length):
@@ -77,10 +86,50 @@ def validate_choice(input_line, valid_options):
 
     return choice
 
+#Function to turn a typed product ID or search query into a product ID
+def resolve_product(d, text):
+    """
+    Resolve what the user typed into a product ID.
+
+    A number is taken as a product ID. Anything else is searched for in the name, brand and origin of the
+    products. If exactly one product matches its ID is returned, otherwise the matches (or a note that
+    nothing matched) are printed so the user can type the ID.
+
+    Parameters:
+    d (InventoryStore): The inventory.
+    text (str): The product ID or search words typed by the user.
+
+    Returns:
+    int: The product ID, or 0 if it could not be resolved to a single product in the inventory.
+    """
+    text = text.strip()
+    if text.isdigit():
+        if int(text) in d:
+            return int(text)
+        print("Please enter a valid ID from Inventory.")
+        return 0
+
+    matches = search.find(d, text)
+    if not matches:
+        print("No product matches '" + text + "'.")
+        return 0
+    if len(matches) == 1:
+        print("Selected " + d.name(matches[0]) + " (" + d.brand(matches[0]) + ").")
+        return matches[0]
+
+    #Listing the matches so the user can pick one by ID
+    print("Several products match '" + text + "':")
+    for key in matches[:search.MAX_RESULTS]:
+        print(prod_pad(key, 8) + prod_pad(d.name(key), 20) + prod_pad(d.brand(key), 16) + d.origin(key))
+    if len(matches) > search.MAX_RESULTS:
+        print("... and " + str(len(matches) - search.MAX_RESULTS) + " more.")
+    return 0
+
 #Function to validate ID
-def id_validation(d, cart_dict):
+def id_validation(d, cart_dict, inventory_view=None):
     '''
     Prompt the user to input a product ID for selling and validate it against the inventory.
+    Instead of the ID the user can type words of the product name, brand or origin (see resolve_product).
     If the product already exists in the cart, notify the user and restore its quantity to inventory.
 
     Parameters:
@@ -98,27 +147,63 @@ def id_validation(d, cart_dict):
         - free_qty (int): The quantity given for free.
         - total_qty (int): The total quantity being deducted from inventory.
 
+    inventory_view (InventoryView): The page of the inventory on screen. If given, the user can also type
+        page and filter commands (see InventoryView.command).
+
     Returns:
     int: A valid product ID that exists in the inventory.
     '''
     #Taking product ID from user and Validating it
     sell_id = 0
-    while sell_id not in d:
-        try:
-            sell_id = int(input("\nPlease Enter the Product (ID) to Sell:"))
-            if sell_id not in d:
-                print("Please enter a valid ID from Inventory.")
-        except:
-            print("Please enter a valid number ID from Inventory.")
+    while sell_id == 0:
+        text = input("\nPlease Enter the Product (ID or name) to Sell:")
+        if inventory_view is not None and inventory_view.command(text):
+            continue
+        sell_id = resolve_product(d, text)
 
     #Notify if the product already exists in the cart
     if sell_id in cart_dict:
-        print("Note: " + d[sell_id][0] + " was already in cart. The previous quantity will be replaced.")
+        print("Note: " + d.name(sell_id) + " was already in cart. The previous quantity will be replaced.")
         previous_qty = cart_dict[sell_id][2]
-        d[sell_id][2] = str(int(d[sell_id][2]) + previous_qty)
-        print("The sellable quantity for " + d[sell_id][0] + " is still " + str(d[sell_id][2]) + ".")
+        d.release(sell_id, previous_qty)
+        print("The sellable quantity for " + d.name(sell_id) + " is still " + str(d.available(sell_id)) + ".")
     return sell_id
 
+#Function to apply the promotion on a product
+def apply_offer(d, prod_id, sell_qty):
+    """
+    Work out the free quantity for a billed quantity of a product using its promotion (see promotions.py),
+    e.g. buy 3 get 1 free.
+
+    Parameters:
+    d (InventoryStore): The inventory.
+    prod_id (int): The product being billed.
+    sell_qty (int): The quantity being billed.
+
+    Returns:
+    list: A list containing:
+        - sell_qty (int): The quantity of the product to sell (excluding free items).
+        - free_qty (int): The number of free products offered by the promotion.
+        - total_sell_qty (int): Total quantity including free products.
+    """
+    return promotions.active.offer(d, prod_id).apply(sell_qty)
+
+#Function to get the largest billed quantity the stock can cover
+def max_base_qty(d, prod_id, available_qty):
+    """
+    Return the highest quantity of a product that can be billed so that the free items of its promotion are
+    still in stock.
+
+    Parameters:
+    d (InventoryStore): The inventory.
+    prod_id (int): The product being billed.
+    available_qty (int): The quantity available in inventory.
+
+    Returns:
+    int: The maximum base quantity that can be sold including free items.
+    """
+    return promotions.active.offer(d, prod_id).max_base_qty(available_qty)
+
 #Function to validate quantity
 def qty_validation(d, sell_id):
     """
@@ -136,7 +221,7 @@ def qty_validation(d, sell_id):
     Returns:
     list: A list containing:
         - sell_qty (int): The quantity of the product to sell (excluding free items).
-        - free_qty (int): The number of free products offered (1 free per 3 sold).
+        - free_qty (int): The number of free products offered by the promotion of the product.
         - total_sell_qty (int): Total quantity including free products.
     """
 
@@ -145,27 +230,29 @@ def qty_validation(d, sell_id):
     total_sell_qty = 0
     free_qty = 0
 
+    #Reading the stock not held by any cart once as an integer
+    available_qty = d.available(sell_id)
+
     #Asking for quantity to sell
     while sell_qty == 0:
         try:
-            sell_qty = int(input("\nPlease Enter the quantity of " + d[sell_id][0] + " to Sell:"))
+            sell_qty = int(input("\nPlease Enter the quantity of " + d.name(sell_id) + " to Sell:"))
             if(sell_qty < 1):
                 print("\nThe quantity must be at least 1.")
                 sell_qty = 0
-            elif(sell_qty > int(d[sell_id][2])):
-                print("\nThe product quantity in inventory is not sufficient.\nAvailable Stock: "+d[sell_id][2])
+            elif(sell_qty > available_qty):
+                print("\nThe product quantity in inventory is not sufficient.\nAvailable Stock: "+str(available_qty))
                 sell_qty = 0
             else:
                 #Calculating number of free products and total products
-                free_qty = sell_qty//3
-                total_sell_qty = sell_qty + free_qty
+                sell_qty, free_qty, total_sell_qty = apply_offer(d, sell_id, sell_qty)
 
                 #Checking for sufficient product quantity
-                if(total_sell_qty >  int(d[sell_id][2])):
-                    print("\nThe product quantity in inventory is not sufficient for free items.\nAvailable Stock: "+d[sell_id][2])
+                if(total_sell_qty > available_qty):
+                    print("\nThe product quantity in inventory is not sufficient for free items.\nAvailable Stock: "+str(available_qty))
 
                     #Displaying the highest quantity available to sell
-                    recommanded_qty = (int(d[sell_id][2])*3)//4
+                    recommanded_qty = max_base_qty(d, sell_id, available_qty)
                     print("[Note:", recommanded_qty, " is the maximum base quantity that can be sold to include free items" + "]")
                     sell_qty = 0
         except:
@@ -173,63 +260,6 @@ def qty_validation(d, sell_id):
             sell_qty = 0
     return [sell_qty, free_qty, total_sell_qty]
 
-#Function to display the inventory
-def display_inventory(d, type):
-    """
-    Display the inventory in a tabular format.
-
-    Parameters:
-    d (dict): A dictionary containing product information with product IDs as keys. Each entry should include:
-        - 'name' (str): Name of the product.
-        - 'brand' (str): Brand of the product.
-        - 'quantity' (str): Available quantity in stock.
-        - 'price' (str): Price of the product.
-        - 'origin' (str): Country of origin.
-    type (str): A string that indicates the type of display. It can either be:
-        - "sell": Displays the product for sale with adjusted price for selling(200%).
-        - "stock": Displays the product price without changes.
-
-    Returns:
-    boolean: Always returns `True` after displaying the inventory.
-    """
-    #defining the tabular format
-    print("\n"*2," " * 32, "Inventory\n")
-    print("-" * 80)
-
-    #formatting and printing header for the table
-    print("ID"+" "*6 + "Name"+" "*16 + "Brand"+" "*8 + "Quantity"+" "*5 + "Price"+" "*5 + "Origin"+" "*5)
-    print("-" * 80)
-
-    #iterating through each key-value pair in dictionary
-    for key,value in d.items():
-        
-        #printing the index
-        print(prod_pad(key,8), end="")
-
-        #printing the product details
-        i = 0
-        for each in value:
-            if(i == 0):
-                #Calling the function prod_pad to ensure equal spacing in each row
-                print(prod_pad(each,20), end="")
-            elif(i == 1):
-                print(prod_pad(each,16), end="")
-            elif(i == 2):
-                print((prod_pad(int(each),11)), end="")
-            elif(i == 3):
-                if type == "sell":
-                    print(prod_pad(int(each)*2,9), end="")
-                elif type == "stock":
-                    print(prod_pad(int(each),9), end="")
-
-            elif(i == 4):
-                print(each)
-            i+=1
-
-    print("-" * 80)
-    print("\n\n")
-    return True
-
 #Function to display the cart
 def display_cart(d, cart_dict):
     """Display the items in the cart and their total cost, including VAT and grand total.
@@ -267,11 +297,14 @@ def display_cart(d, cart_dict):
         print(prod_pad(key, 8), end="")
         
         #Calling the function prod_pad to ensure equal spacing in each row
-        print(prod_pad(d[key][0], 21), end="")
-        print(prod_pad(int(d[key][3])*2, 15), end="")
+        sell_price = d.price(key)*2
+        offer = promotions.active.offer(d, key)
+        print(prod_pad(d.name(key), 21), end="")
+        print(prod_pad(sell_price, 15), end="")
         print(prod_pad(cart_dict[key][2], 12), end="")
         print(prod_pad(cart_dict[key][1], 9), end="")
-        print(prod_pad(cart_dict[key][0]*int(d[key][3])*2, 16), end="")
+        print(prod_pad(promotions.format_amount(offer.amount(cart_dict[key][0], sell_price),
+                                                offer.percent(cart_dict[key][0])), 16), end="")
         print()
 
     #More Formatting
@@ -297,85 +330,87 @@ def display_invoice(d, cart_dict, billing_info):
     billing_info (dict): A dictionary containing customer billing information with the following keys:
         - 'name' (str): Customer's name.
         - 'phone' (str): Customer's phone number.
-        - 'total' (float): Total amount before VAT.
-        - 'vat' (float): VAT amount.
-        - 'grand_total' (float): Total amount including VAT.
+        - 'total' (Money): Total amount before VAT.
+        - 'vat' (Money): VAT amount.
+        - 'grand_total' (Money): Total amount including VAT.
         - 'time' (str): The time of the transaction.
 
     Returns:
     boolean: True if the invoice was displayed successfully.
     """
-    #for Invoice Printing
-    display_invoice_header(billing_info, "CUSTOMER INVOICE")
-
-    #printing the table
-    print("Name: " + billing_info["name"])
-    print("Phone no.: " + str(billing_info["phone"]))
-    print("-" * 80)
-    print("ID"+" "*6 + "Name"+" "*15 + "Brand"+" "*10 + "Price"+" "*5 + "Quantity"+" "*5 + "Free"+" "*5 + "Total"+" "*5)
-    print("-" * 80)
-    #iterating through each key-value pair in dictionary
-    for key in cart_dict:
-
-        #printing the index
-        print(prod_pad(key, 8), end="")
-        
-        #Calling the function prod_pad to ensure equal spacing in each row
-        print(prod_pad(d[key][0], 19), end="")
-        print(prod_pad(d[key][1], 15), end="")
-        print(prod_pad(int(d[key][3])*2, 12), end="")
-        print(prod_pad(cart_dict[key][2], 12), end="")
-        print(prod_pad(cart_dict[key][1], 9), end="")
-        print(prod_pad(cart_dict[key][0]*int(d[key][3])*2, 16), end="")
-        print()
-
-    #Printing the footer
-    display_invoice_footer(billing_info)
+    #Rendering the invoice once and printing it with a single call
+    print(invoice.render_sell_invoice(d, cart_dict, billing_info) + "\n\n")
 
     return True
 
 #Function to get the customer details
 def get_customer_details(costs_list):
     """
-    Prompt the user to enter customer details (name and phone number) and generate a billing info dictionary.
+    Prompt the user to enter customer details (phone number and name) and generate a billing info dictionary.
+
+    The phone number is asked first and looked up in the customer directory, so the name of a repeat customer
+    is filled in and only needs to be confirmed by pressing Enter.
 
     Parameters:
     costs_list (list): A list containing the following values:
-        - total (float): Total cost of the purchase.
-        - vat (float): VAT applied to the total cost.
-        - grand_total (float): Total amount including VAT.
+        - total (Money): Total cost of the purchase.
+        - vat (Money): VAT applied to the total cost.
+        - grand_total (Money): Total amount including VAT.
 
     Returns:
     billing_info (dictionary): A dictionary containing customer and billing details with the following keys:
         - 'name' (str): Customer's name.
         - 'phone' (str): Customer's phone number.
         - 'time' (str): The current timestamp when the transaction occurs.
-        - 'total' (float): The total amount before VAT.
-        - 'vat' (float): The VAT amount.
-        - 'grand_total' (float): The total amount including VAT.
+        - 'total' (Money): The total amount before VAT.
+        - 'vat' (Money): The VAT amount.
+        - 'grand_total' (Money): The total amount including VAT.
     """
     while True:
         try:
-            customer_name = input("Enter the name: ")
             customer_phone = str(int(input("Enter the Phone number: ")))
             if len(customer_phone) != 10:
                 print("Invalid Phone number.")
                 continue
-            current_time = str(datetime.datetime.now())
-
-            #Grouping billing and customer details
-            billing_info = {
-                "name": customer_name,
-                "phone": customer_phone,
-                "time": current_time,
-                "total": costs_list[0],
-                "vat": costs_list[1],
-                "grand_total": costs_list[2]
-            }
-            return billing_info
+            customer = customers.active.find(customer_phone)
+            if customer:
+                print("Welcome back, " + customer["name"] + ". Visits: " + str(customer["visits"])
+                      + ", last invoice " + invoice_store.format_number(customer["invoice_no"]) + ".")
+                customer_name = input("Enter the name (Enter for " + customer["name"] + "): ").strip()
+                if not customer_name:
+                    customer_name = customer["name"]
+            else:
+                customer_name = input("Enter the name: ")
+            return build_billing_info(customer_name, customer_phone, costs_list)
         except:
             print("Invalid input. Please try Again.")
 
+#Function to group the billing details
+def build_billing_info(customer_name, customer_phone, costs_list):
+    """
+    Group the customer details and costs of a sale into a billing info dictionary stamped with the current time.
+
+    Parameters:
+    customer_name (str): Customer's name.
+    customer_phone (str): Customer's phone number.
+    costs_list (list): The total, VAT and grand total of the sale.
+
+    Returns:
+    billing_info (dictionary): A dictionary with the keys 'name', 'phone', 'time', 'total', 'vat' and 'grand_total'.
+    """
+    current_time = str(datetime.datetime.now())
+
+    #Grouping billing and customer details
+    billing_info = {
+        "name": customer_name,
+        "phone": customer_phone,
+        "time": current_time,
+        "total": costs_list[0],
+        "vat": costs_list[1],
+        "grand_total": costs_list[2]
+    }
+    return billing_info
+
 #Function to ask yes/no questions
 def ask_yes_no(prompt):
     """
@@ -402,6 +437,9 @@ def checkout_loop(d, cart_dict, costs_list):
     """
     Continuously ask the user if they wish to checkout, generate the invoice, and update the inventory.
 
+    The sale is journaled (committed by the inventory service on a till) before the customer details are taken,
+    so a sale that cannot be recorded is cancelled without an invoice or a sales ledger entry.
+
     Parameters:
     'd' (dict): A dictionary containing product information with product IDs as keys. Each entry should include:
         - 'name' (str): Name of the product.
@@ -426,13 +464,27 @@ def checkout_loop(d, cart_dict, costs_list):
         if ask_yes_no("Does the customer wish to checkout now? "):
 
             #Loop to generate and display invoice/Bill
+            #Taking the held stock off the stock on hand
+            if not d.commit_cart(cart_dict):
+                d.release_cart()
+                print("Part of the cart is no longer in stock, the sale was cancelled.")
+                return False, billing_info
+
+            #Journaling the sold quantities before any invoice, a till's sale is only final once the service commits it
+            if not journal.active.record_sale(d, cart_dict):
+                for key in cart_dict:
+                    d.add_qty(key, cart_dict[key][2])
+                d.release_cart()
+                print("The sale could not be recorded, it was cancelled.")
+                return False, billing_info
+            print("Inventory journal updated.\n")
+
             print("\nPlease Fill out the Customer Details:")
             billing_info = get_customer_details(costs_list)
 
             if display_invoice(d, cart_dict, billing_info):
-                #Updating the inventory file
-                if write.update_inventory_file(d):
-                    print("Inventory file updated.\n")
+                #Recording the sale for the reports
+                sales_ledger.active.record_sale(d, cart_dict, billing_info)
             return False, billing_info
             
             
@@ -447,9 +499,8 @@ def checkout_loop(d, cart_dict, costs_list):
                 return True, billing_info
             else:
 
-                #Changing back the inventory
-                for key in cart_dict:
-                    d[key][2] = str(int(d[key][2]) + cart_dict[key][2])
+                #Giving back the stock held by the cart
+                d.release_cart()
                 return False, billing_info
             
 #Function to add new product to inventory            
@@ -484,11 +535,9 @@ def add_product(d, stock_list):
         origin = input("Enter the product origin: ")
 
         #Adding product details to main dictionary
-        new_prod_id = 1
-        for key in d:
-            if key >= new_prod_id:
-                new_prod_id = key + 1
+        new_prod_id = d.new_id()
         d[new_prod_id] = [name, brand, str(qty), str(price), origin]
+        search.add_product(d, new_prod_id)
          #Adding the new product's stocked quantity to stock list
         stock_list.append([new_prod_id, str(qty), supplier])
         return True
@@ -497,7 +546,7 @@ def add_product(d, stock_list):
         return False
 
 #Function to restock existing product
-def restocking_product(d, stock_list):
+def restocking_product(d, stock_list, inventory_view=None):
     """
     Restocks an existing product in the inventory.
 
@@ -512,6 +561,8 @@ def restocking_product(d, stock_list):
         - Product ID (int)
         - Quantity added (str)
         - Supplier name (str)
+    'inventory_view' (InventoryView): The page of the inventory on screen, if given the user can also type
+        page and filter commands.
 
     Returns:
      boolean: True if the product was successfully restocked.
@@ -521,12 +572,15 @@ def restocking_product(d, stock_list):
     restock_loop = True
     while restock_loop == True:
         try:
-            #Asking for the id of the product to restock
-            restock_id = int(input("Enter the ID of product to restock: "))
+            #Asking for the id or name of the product to restock
+            text = input("Enter the ID or name of product to restock: ")
+            if inventory_view is not None and inventory_view.command(text):
+                continue
+            restock_id = resolve_product(d, text)
 
             #Validating input product ID
-            if restock_id not in d:
-                print("ID does not exist in inventory. Please try again.")
+            if restock_id == 0:
+                print("Please try again.")
                 continue
             else:
 
@@ -538,7 +592,7 @@ def restocking_product(d, stock_list):
                     continue
 
                 #Updating the quantity in main dictionary
-                d[restock_id][2] = str(int(d[restock_id][2]) + restock_qty)
+                d.add_qty(restock_id, restock_qty)
                 restock_loop = False
                 #Adding the stocked quantity to stock dictionary
                 stock_list.append([restock_id, str(restock_qty), supplier])            
@@ -547,6 +601,40 @@ def restocking_product(d, stock_list):
             print("Invalid input. Please try again.")
             return False
 
+#Function to restock from a supplier manifest file
+def import_from_manifest(d, stock_list):
+    """
+    Restocks the inventory from a supplier manifest file instead of typing every product.
+
+    Each line of the manifest is 'name,brand,quantity,price,origin'. Lines matching a product by name and
+    brand restock it, the others are added as new products (see manifest.import_manifest).
+
+    Parameters:
+    'd' (dict): Inventory dictionary. Keys are item IDs (int), values are product rows.
+    'stock_list' (list): A list of lists, where each sub-list contains:
+        - Product ID (int)
+        - Quantity added (str)
+        - Supplier name (str)
+
+    Returns:
+     boolean: True if at least one row of the manifest was imported.
+              False otherwise.
+    """
+    file_name = input("Enter the manifest file: ").strip()
+    supplier = input("Enter the supplier: ")
+    try:
+        rows, added, rejected, errors = manifest.import_manifest(d, file_name, supplier, stock_list)
+    except OSError:
+        print("The manifest " + repr(file_name) + " could not be read.")
+        return False
+
+    print(str(rows) + " rows imported, " + str(added) + " new products added, " + str(rejected) + " rows skipped.")
+    for line_number, reason in errors:
+        print("Line " + str(line_number) + " skipped: " + reason)
+    if rejected > len(errors):
+        print("... and " + str(rejected - len(errors)) + " more.")
+    return rows > 0
+
 #Function to display the stock invoice
 def display_stock_invoice(d, stock_list, restock_info):
     """
@@ -568,36 +656,16 @@ def display_stock_invoice(d, stock_list, restock_info):
 
     'restock_info' (dict): A dictionary with restocking details:
         - 'time' (str): Timestamp of restocking
-        - 'total' (int): Total cost of restocked items
-        - 'vat' (int): VAT applied
-        - 'grand_total' (int): Final amount including VAT
+        - 'total' (Money): Total cost of restocked items
+        - 'vat' (Money): VAT applied
+        - 'grand_total' (Money): Final amount including VAT
 
     Returns:
         None
     """
 
-    #Printing restock invoice
-    display_invoice_header(restock_info, "RESTOCK INVOICE")
-
-    print("ID"+" "*4 + "Name"+" "*12 + "Brand"+" "*10 + "Price"+" "*5 + "Quantity"+" "*5 + "Supplier"+" "*5 + "Total"+" "*5)
-    print("-" * 80)
-    #Iterating through each key-value pair in dictionary
-    
-    for item in stock_list:
-        #printing the index
-        print(prod_pad(str(item[0]), 6), end="")
-                            
-        #Calling the function prod_pad to ensure equal spacing in each row
-        print(prod_pad(d[item[0]][0], 16), end="")
-        print(prod_pad(d[item[0]][1], 15), end="")
-        print(prod_pad(int(d[item[0]][3]), 12), end="")
-        print(prod_pad(str(item[1]), 12), end="")
-        print(prod_pad(item[2], 13), end="")
-        print(prod_pad(int(item[1])*int(d[item[0]][3]), 16), end="")
-        print()
-    
-    #Printing the footer
-    display_invoice_footer(restock_info)
+    #Rendering the invoice once and printing it with a single call
+    print(invoice.render_stock_invoice(d, stock_list, restock_info) + "\n\n")
 
 #Function to update file, create invoice and exit to main menu
 def restock_and_exit(d, stock_list):
@@ -622,16 +690,20 @@ def restock_and_exit(d, stock_list):
     Returns:
     dict or boolean: Returns a 'restock_info' dictionary with:
         - 'time' (str)
-        - 'total' (int)
-        - 'vat' (int)
-        - 'grand_total' (int)
-        If no items were restocked, returns False.
+        - 'total' (Money)
+        - 'vat' (Money)
+        - 'grand_total' (Money)
+        If no items were restocked, or the restock could not be journaled, returns False.
     """
     if not stock_list:
         return False
     else:
-        #Updating inventory file
-        write.update_inventory_file(d)
+        #Journaling the restocked quantities before any invoice, like a sale in checkout_loop
+        if not journal.active.record_restock(d, stock_list):
+            for item in stock_list:
+                d.add_qty(item[0], -int(item[1]))
+            print("The restock could not be recorded, it was cancelled.")
+            return False
 
         current_time = str(datetime.datetime.now())
 
@@ -645,6 +717,9 @@ def restock_and_exit(d, stock_list):
             "grand_total": grand_total
         }
 
+        #Recording the restock for the reports
+        sales_ledger.active.record_restock(d, stock_list, restock_info)
+
         display_stock_invoice(d, stock_list, restock_info)
 
         return restock_info
@@ -678,76 +753,29 @@ def calculate_total(d, collection, type):
         - 'sell'
 
     Returns:
-    tuple: A tuple containing:
-        - 'total_cost' (int): The total cost before VAT.
-        - 'vat' (float): The calculated VAT (13% of total).
-        - 'grand_total' (float): The final amount including VAT.
+    tuple: A tuple of Money amounts (exact paisa) containing:
+        - 'total_cost' (Money): The total cost before VAT.
+        - 'vat' (Money): The calculated VAT (13% of total, rounded half up to the paisa).
+        - 'grand_total' (Money): The final amount including VAT.
     """
+    #Line amounts are added up in whole rupees as plain integers
     total_cost = 0
     #Calculating total costs
     if type  == "restock":
         #For restock
         for item in collection:
-            total_cost += int(item[1])*int(d[item[0]][3])
+            total_cost += int(item[1])*d.price(item[0])
     
     elif type == "sell":
-        #For sales
+        #For sales, in paisa as a percentage off can leave paisa on a line
+        offer = promotions.active.offer
         for key in collection:
-            total_cost += collection[key][0]*int(d[key][3])*2
-
-    #Calculating VAT and adding to total cost
-    vat = total_cost * 0.13
-    grand_total = total_cost + vat
-    return total_cost, vat, grand_total
-
-#Function to display invoice header
-def display_invoice_header(info, type):
-    """
-    Displays the invoice header with store details and invoice type.
-
-    Parameters:
-    'info' (dict): A dictionary containing invoice metadata:
-        - 'time' (str): The timestamp of the transaction.
-
-    'type' (str): The title to display for the invoice 
-        ('CUSTOMER INVOICE' or 'RESTOCK INVOICE').
+            total_cost += offer(d, key).amount(collection[key][0], d.price(key)*2)
+        return money.paisa_totals(total_cost)
 
-    Returns:
-        None
-    """
-
-    #formatting and printing header for the table
-    print("\n"*2 + "-" * 80)
-    print(" " * 32 + type + "\n")
-    print("-" * 80)
-    print("WeCare Store")
-    print("Samakushi, Kathmandu, Nepal\n")
-    print("Date: " + str(info["time"]))
-    print("-" * 80)
-
-#Function to display invoice footer
-def display_invoice_footer(info):
-    """
-    Displays the invoice footer with total, VAT, and grand total amounts.
+    #Calculating VAT and adding to total cost in exact paisa
+    return money.bill_totals(total_cost)
 
-    Parameters:
-    'info' (dict): A dictionary containing financial summary details:
-        - 'total' (float): The total amount before tax.
-        - 'vat' (float): The value-added tax amount.
-        - 'grand_total' (float): The final total including VAT.
-
-    Returns:
-        None
-    """
-
-    #Printing footer                        
-    print("-" * 80)
-    print("Total: " + str(info["total"]))
-    print("VAT: " + str(info["vat"]))
-    print("Grand Total: " + str(info["grand_total"]))
-    print("-" * 80)
-    print("\n\n")
-    
 #Main Function for selling products
 def sales(d):
     """
@@ -772,23 +800,34 @@ def sales(d):
     cart_dict = {}
     continue_selling = True
 
+    #Dropping stock still held by a sale that ended with an error
+    d.release_cart()
+
+    #Paged view of the inventory, only the rows on screen are rendered
+    inventory_view = view.InventoryView(d, "sell")
+
     #Loop to continue selling products
     while continue_selling:
         
-        if not display_inventory(d, "sell"):
+        if not inventory_view.show():
             print("Could not be displayed. Pleae try again.")
             break
 
-        sell_id = id_validation(d, cart_dict)
+        sell_id = id_validation(d, cart_dict, inventory_view)
 
         #Dictionary to hold the items to buy
-        cart_dict[sell_id] = qty_validation(d, sell_id)
+        quantities = qty_validation(d, sell_id)
 
-        #Updating the inventory
-        d[sell_id][2] = str(int(d[sell_id][2]) - cart_dict[sell_id][2])
+        #Taking the stock, another till may have sold it in the meantime
+        if not d.reserve(sell_id, quantities[2]):
+            cart_dict.pop(sell_id, None)
+            print("\nThe stock of " + d.name(sell_id) + " was taken by another sale. Available Stock: "
+                  + str(d.available(sell_id)))
+            continue
+        cart_dict[sell_id] = quantities
 
         #Informing user about adding the product to cart
-        print("\n\n" + str(cart_dict[sell_id][2]) + " of " + d[sell_id][0] + " added to cart.")
+        print("\n\n" + str(cart_dict[sell_id][2]) + " of " + d.name(sell_id) + " added to cart.")
         print("Quantity Billed: ",cart_dict[sell_id][0])
         print("Additional Free Quantity: ",cart_dict[sell_id][1])
         
@@ -831,11 +870,14 @@ def restock(d):
     #List to store restocked/new products
     stock_list = []
 
+    #Paged view of the inventory, only the rows on screen are rendered
+    inventory_view = view.InventoryView(d, "stock")
+
     #Loop to continue stocking
     continue_stock = True
     while continue_stock == True:
 
-        if not display_inventory(d, "stock"):
+        if not inventory_view.show():
             print("Could not be displayed. Pleae try again.")
             break
         
@@ -844,7 +886,8 @@ def restock(d):
         print("1. Add new products")
         print("2. Restock product")
         print("3. Create invoice and Exit to menu.")
-        stock_choice = int(validate_choice("\nEnter choice: ", (1,2,3)))
+        print("4. Import a supplier manifest")
+        stock_choice = int(validate_choice("\nEnter choice: ", (1,2,3,4)))
 
         #For adding new product
         if stock_choice == 1:
@@ -857,11 +900,19 @@ def restock(d):
         #For restocking old products        
         elif stock_choice == 2:
 
-            if restocking_product(d, stock_list):
+            if restocking_product(d, stock_list, inventory_view):
                 print("Product restocked.\n")
             else:
                 print("Something went wrong. Please try again.")
 
+        #For importing a whole delivery at once
+        elif stock_choice == 4:
+
+            if import_from_manifest(d, stock_list):
+                print("Manifest imported.\n")
+            else:
+                print("Nothing was imported. Please try again.")
+
         else:
             continue_stock = False
             restock_info = restock_and_exit(d, stock_list)            
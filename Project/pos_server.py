@@ -0,0 +1,470 @@
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import urllib.parse
+
+import customers
+import invoice_store
+import journal
+import money
+import operations
+import promotions
+import sales_ledger
+import search
+import service
+import write
+
+#Address the POS API listens on
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+
+#Largest request body accepted, in bytes
+MAX_BODY = 1024*1024
+
+#Number of threads doing the disk writes
+WRITER_THREADS = 4
+
+#Number of products listed per page when the client does not ask for a page size
+PAGE_SIZE = 20
+
+#Seconds between two sweeps for carts whose holds expired
+SWEEP_INTERVAL = 30
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+#Class for an error answered with an HTTP status
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+#Class for the POS API
+class PosApi:
+    """
+    The sales and restock flows of the program served as a JSON API over HTTP, for any number of clients.
+
+    Stock is held for open carts through a service.InventoryService, so carts of different clients never
+    oversell. Holds of carts nobody touched for reservations.HOLD_TTL seconds expire and their products are
+    dropped from the cart by a periodic sweep. The same rules as the interactive flows apply: the promotions
+    of operations.apply_offer, the totals of operations.calculate_total and the invoices of
+    write.generate_sell_invoice and write.generate_stock_invoice. Everything that touches the disk runs in a
+    thread pool so the event loop keeps answering other requests.
+
+    Endpoints:
+        GET    /inventory?page=<n>&size=<n>&q=<words>  One page of products, optionally matching a search.
+        GET    /products/<id>                          One product.
+        POST   /carts                                  Open an empty cart.
+        GET    /carts/<cart>                           The lines and totals of a cart.
+        PUT    /carts/<cart>/items/<id>                Put {"qty": <billed quantity>} of a product in a cart.
+        DELETE /carts/<cart>/items/<id>                Take a product out of a cart.
+        DELETE /carts/<cart>                           Drop a cart and give its stock back.
+        POST   /carts/<cart>/checkout                  Sell a cart to {"name": ..., "phone": ...}, the name of
+                                                       a known customer can be left out.
+        GET    /customers/<phone>                      A customer and the invoices of their last visits.
+        POST   /restock                                Restock {"items": [...]}, see restock().
+
+    Parameters:
+    'd' (InventoryStore): The inventory, with the journal already replayed.
+    'inventory_journal' (InventoryJournal): The journal the committed changes are written to.
+    """
+
+    def __init__(self, d, inventory_journal):
+        self.d = d
+        self.service = service.InventoryService(d, inventory_journal)
+        self.carts = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(WRITER_THREADS)
+
+    #Function to run blocking work in the writer threads
+    async def _in_executor(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    #Function to describe one product
+    def product(self, prod_id):
+        d = self.d
+        return {"id": prod_id, "name": d.name(prod_id), "brand": d.brand(prod_id),
+                "qty": self.service.available(prod_id), "price": d.price(prod_id), "sell_price": d.price(prod_id)*2,
+                "origin": d.origin(prod_id)}
+
+    def _product_id(self, text):
+        try:
+            prod_id = int(text)
+        except ValueError:
+            raise ApiError(400, "Invalid product ID " + repr(text) + ".")
+        if prod_id not in self.d:
+            raise ApiError(404, "Product " + str(prod_id) + " is not in the inventory.")
+        return prod_id
+
+    #Function to describe a customer of the customer directory
+    def customer(self, phone):
+        if len(phone) != 10 or not phone.isdigit():
+            raise ApiError(400, "Invalid phone number " + repr(phone) + ".")
+        customer = customers.active.find(phone)
+        if customer is None:
+            raise ApiError(404, "No customer with phone number " + phone + ".")
+        invoices = []
+        for invoice_no in customers.active.history(phone):
+            invoices.append(invoice_store.format_number(invoice_no))
+        return {"phone": phone, "name": customer["name"], "visits": customer["visits"], "invoices": invoices}
+
+    #Function to find an open cart, any request on a cart keeps its holds from expiring
+    def _cart(self, text):
+        try:
+            cart_dict = self.carts[int(text)]
+        except (KeyError, ValueError):
+            raise ApiError(404, "No open cart " + repr(text) + ".")
+        self.d.holds.touch(int(text))
+        return cart_dict
+
+    #Function to list a page of the inventory
+    async def inventory(self, query):
+        try:
+            page = max(int(query.get("page", "1")), 1)
+            size = min(max(int(query.get("size", str(PAGE_SIZE))), 1), 1000)
+        except ValueError:
+            raise ApiError(400, "Invalid page or size.")
+        start = (page - 1)*size
+        words = query.get("q", "").strip()
+        if words:
+            #The first search reads every product to build the index, which is left to a writer thread
+            if not search.indexed(self.d):
+                await self._in_executor(search.index_for, self.d)
+            matches = search.find(self.d, words)
+            count = len(matches)
+            prod_ids = matches[start:start+size]
+        else:
+            count = len(self.d)
+            prod_ids = self.d.page(start, size)
+        return {"page": page, "size": size, "count": count, "products": [self.product(key) for key in prod_ids]}
+
+    #Function to describe a cart with its totals
+    def cart_summary(self, cart_id, cart_dict):
+        d = self.d
+        lines = []
+        for key in cart_dict:
+            offer = promotions.active.offer(d, key)
+            lines.append({"id": key, "name": d.name(key), "sell_price": d.price(key)*2, "qty": cart_dict[key][0],
+                          "free": cart_dict[key][1], "total_qty": cart_dict[key][2],
+                          "percent_off": offer.percent(cart_dict[key][0]),
+                          "amount": str(money.Money(offer.amount(cart_dict[key][0], d.price(key)*2)))})
+        total, vat, grand_total = operations.calculate_total(d, cart_dict, "sell")
+        return {"cart_id": cart_id, "lines": lines, "total": str(total), "vat": str(vat),
+                "grand_total": str(grand_total)}
+
+    #Function to put a product in a cart
+    def put_item(self, cart_id, cart_dict, prod_id, body):
+        """
+        Put a billed quantity of a product in a cart, replacing what was there, and hold its stock.
+
+        The free items of the promotion are added and held too. If the stock does not cover them, the error names
+        the largest billed quantity that fits, like qty_validation does.
+        """
+        try:
+            sell_qty = int(body["qty"])
+        except (KeyError, TypeError, ValueError):
+            raise ApiError(400, "The body needs a whole number 'qty'.")
+        if sell_qty < 1:
+            raise ApiError(400, "The quantity must be at least 1.")
+
+        #Giving back what the cart held before
+        if prod_id in cart_dict:
+            self.service.release(prod_id, cart_dict.pop(prod_id)[2], cart_id)
+
+        quantities = operations.apply_offer(self.d, prod_id, sell_qty)
+        reserved, available = self.service.reserve(prod_id, quantities[2], cart_id)
+        if not reserved:
+            message = "Not enough stock of product " + str(prod_id) + ", available " + str(available) + "."
+            if sell_qty <= available:
+                message += (" Maximum base quantity with free items is "
+                            + str(operations.max_base_qty(self.d, prod_id, available)) + ".")
+            raise ApiError(409, message)
+        cart_dict[prod_id] = quantities
+        return self.cart_summary(cart_id, cart_dict)
+
+    #Function to give back all stock held by a cart
+    def drop_cart(self, cart_id):
+        self.service.release_cart(cart_id)
+        del self.carts[cart_id]
+
+    #Function to take the products whose holds expired out of their carts
+    def sweep(self):
+        """
+        Reclaim the stock of holds that expired and drop those products from their carts.
+
+        Returns:
+        int: The number of holds that expired.
+        """
+        expired = self.d.holds.sweep()
+        for cart_id, prod_id, qty in expired:
+            cart_dict = self.carts.get(cart_id)
+            if cart_dict is not None:
+                cart_dict.pop(prod_id, None)
+        return len(expired)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.sweep()
+
+    #Function to sell a cart
+    async def checkout(self, cart_id, body):
+        """
+        Sell a cart: commit its held stock to the journal and write its invoice, both in the writer threads.
+
+        Returns:
+        dict: The invoice number and the totals of the sale, and 'complete', False if the sale was committed but
+        its invoice or sales ledger entry could not be written. The invoice number is None if the invoice
+        could not be numbered.
+        """
+        cart_dict = self._cart(cart_id)
+
+        #Taking the cart away before anything is awaited, so no other request changes or deletes it while it is
+        #being sold, and giving it back if the sale does not go through
+        self.carts.pop(int(cart_id))
+        committed = False
+        try:
+            if not cart_dict:
+                raise ApiError(400, "The cart is empty.")
+            name = str(body.get("name", "")).strip()
+            phone = str(body.get("phone", "")).strip()
+            if len(phone) != 10 or not phone.isdigit():
+                raise ApiError(400, "Invalid phone number " + repr(phone) + ".")
+            if not name:
+                customer = await self._in_executor(customers.active.find, phone)
+                if customer:
+                    name = customer["name"]
+
+            billing_info = operations.build_billing_info(name, phone,
+                                                         operations.calculate_total(self.d, cart_dict, "sell"))
+            try:
+                committed = await self._in_executor(self.service.commit, journal.sale_lines(cart_dict), int(cart_id))
+                if not committed:
+                    raise service.ServiceError("The journal could not be written.")
+            except service.ServiceError as error:
+                raise ApiError(409, str(error))
+        finally:
+            if not committed:
+                self.carts[int(cart_id)] = cart_dict
+
+        #The sale is final once committed, so a failure to write its invoice or ledger entry is reported in the
+        #answer rather than as an error the till would retry, selling the cart twice
+        complete = True
+        try:
+            await self._in_executor(write.generate_sell_invoice, self.d, cart_dict, billing_info)
+        except Exception as error:
+            complete = False
+            print("The invoice of cart " + str(cart_id) + " could not be written: " + repr(error))
+        try:
+            if not await self._in_executor(sales_ledger.active.record_sale, self.d, cart_dict, billing_info):
+                raise OSError("The sales ledger could not be written.")
+        except Exception as error:
+            complete = False
+            print("The sale of cart " + str(cart_id) + " could not be added to the sales ledger: " + repr(error))
+        return {"invoice_no": billing_info.get("invoice_no"), "total": str(billing_info["total"]),
+                "vat": str(billing_info["vat"]), "grand_total": str(billing_info["grand_total"]),
+                "complete": complete}
+
+    #Function to restock products, run in a writer thread
+    def _restock(self, items):
+        stock_list = []
+        lines = []
+        new_ids = []
+        for item in items:
+            if "id" in item:
+                prod_id = item["id"]
+            else:
+                prod_id = self.service.new_id()
+                new_ids.append(prod_id)
+                lines.append(",".join(("N", str(prod_id), item["name"], item["brand"], str(item["price"]),
+                                       item["origin"])))
+            lines.append("Q," + str(prod_id) + "," + str(item["qty"]))
+            stock_list.append([prod_id, str(item["qty"]), item["supplier"]])
+        if not self.service.commit(lines):
+            raise service.ServiceError("The journal could not be written.")
+        for prod_id in new_ids:
+            search.add_product(self.d, prod_id)
+
+        total_cost, vat, grand_total = operations.calculate_total(self.d, stock_list, "restock")
+        restock_info = {"time": str(datetime.datetime.now()), "total": total_cost, "vat": vat,
+                        "grand_total": grand_total}
+        write.generate_stock_invoice(self.d, stock_list, restock_info)
+        sales_ledger.active.record_restock(self.d, stock_list, restock_info)
+        return {"invoice_no": restock_info["invoice_no"], "ids": [item[0] for item in stock_list],
+                "total": str(total_cost), "vat": str(vat), "grand_total": str(grand_total)}
+
+    #Function to restock products
+    async def restock(self, body):
+        """
+        Restock existing products and add new ones, then write the restock invoice.
+
+        Every item is {"id", "qty", "supplier"} for an existing product or {"name", "brand", "price", "origin",
+        "qty", "supplier"} for a new one. Quantities have to be at least 1 and prices whole rupees.
+
+        Returns:
+        dict: The invoice number, the product ID of every item and the totals of the restock.
+        """
+        items = body.get("items")
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, "The body needs a list of 'items'.")
+        for item in items:
+            try:
+                if int(item["qty"]) < 1:
+                    raise ApiError(400, "The quantity must be positive.")
+                item["qty"] = int(item["qty"])
+                item["supplier"] = str(item["supplier"])
+                if "id" in item:
+                    item["id"] = self._product_id(item["id"])
+                else:
+                    item["price"] = int(item["price"])
+                    if item["price"] < 1:
+                        raise ApiError(400, "The price must be a whole number of rupees, at least 1.")
+                    for field in ("name", "brand", "origin"):
+                        item[field] = str(item[field])
+                        if "," in item[field] or "\n" in item[field]:
+                            raise ApiError(400, "The " + field + " cannot contain commas or line breaks.")
+            except (KeyError, TypeError, ValueError):
+                raise ApiError(400, "Invalid restock item " + json.dumps(item) + ".")
+        try:
+            return await self._in_executor(self._restock, items)
+        except service.ServiceError as error:
+            raise ApiError(409, str(error))
+
+    #Function to route a request to its handler
+    async def route(self, method, path, query, body):
+        """
+        Answer one request.
+
+        Returns:
+        tuple: (status, response) where response is a dictionary sent back as JSON.
+        """
+        parts = [part for part in path.split("/") if part]
+        if parts == ["inventory"] and method == "GET":
+            return 200, await self.inventory(query)
+        if len(parts) == 2 and parts[0] == "products" and method == "GET":
+            return 200, self.product(self._product_id(parts[1]))
+        if parts == ["carts"] and method == "POST":
+            cart_id = self.d.holds.open_cart()
+            self.carts[cart_id] = {}
+            return 201, self.cart_summary(cart_id, self.carts[cart_id])
+        if len(parts) == 2 and parts[0] == "carts":
+            cart_dict = self._cart(parts[1])
+            if method == "GET":
+                return 200, self.cart_summary(int(parts[1]), cart_dict)
+            if method == "DELETE":
+                self.drop_cart(int(parts[1]))
+                return 200, {"cart_id": int(parts[1]), "dropped": True}
+        if len(parts) == 4 and parts[0] == "carts" and parts[2] == "items":
+            cart_dict = self._cart(parts[1])
+            prod_id = self._product_id(parts[3])
+            if method == "PUT":
+                return 200, self.put_item(int(parts[1]), cart_dict, prod_id, body)
+            if method == "DELETE":
+                if prod_id in cart_dict:
+                    self.service.release(prod_id, cart_dict.pop(prod_id)[2], int(parts[1]))
+                return 200, self.cart_summary(int(parts[1]), cart_dict)
+        if len(parts) == 3 and parts[0] == "carts" and parts[2] == "checkout" and method == "POST":
+            return 200, await self.checkout(parts[1], body)
+        if len(parts) == 2 and parts[0] == "customers" and method == "GET":
+            return 200, await self._in_executor(self.customer, parts[1])
+        if parts == ["restock"] and method == "POST":
+            return 200, await self.restock(body)
+        raise ApiError(404, "No endpoint " + method + " " + path + ".")
+
+    #Function to answer the requests of one connection
+    async def handle_connection(self, reader, writer):
+        """
+        Read HTTP/1.1 requests from a connection and answer each with JSON, keeping the connection open
+        between requests unless the client asks to close it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", "0"))
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "Request body too large."}, False)
+                    break
+                data = await reader.readexactly(length) if length else b""
+
+                url = urllib.parse.urlsplit(target)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                try:
+                    body = json.loads(data) if data else {}
+                    if not isinstance(body, dict):
+                        raise ValueError(body)
+                    status, response = await self.route(method.upper(), url.path, query, body)
+                except ApiError as error:
+                    status, response = error.status, {"error": str(error)}
+                except ValueError:
+                    status, response = 400, {"error": "The body must be a JSON object."}
+                except Exception as error:
+                    status, response = 500, {"error": type(error).__name__ + ": " + str(error)}
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._send(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            #The server is shutting down while the client keeps the connection open
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, response, keep_alive):
+        data = json.dumps(response).encode()
+        head = ("HTTP/1.1 " + str(status) + " " + STATUS_TEXT.get(status, "") + "\r\n"
+                + "Content-Type: application/json\r\n" + "Content-Length: " + str(len(data)) + "\r\n"
+                + "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n")
+        writer.write(head.encode() + data)
+        await writer.drain()
+
+    #Function to run the server until it is cancelled
+    async def run(self, host=API_HOST, port=API_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        sweeper = asyncio.create_task(self._sweep_forever())
+        print("POS API listening on http://" + host + ":" + str(port) + "/. Press Ctrl+C to stop.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+
+#Function to serve the POS API
+def serve(d, host=API_HOST, port=API_PORT):
+    """
+    Serve the POS API until interrupted, then write the journaled changes back to the inventory file.
+    Stock held by carts that were never checked out is only held in the reservation ledger, so nothing has to
+    be given back.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, with journal.active already replayed.
+    'host', 'port': The address to listen on.
+
+    Returns:
+    None
+    """
+    api = PosApi(d, journal.active)
+    try:
+        asyncio.run(api.run(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.executor.shutdown(wait=True)
+        journal.active.compact(d)
+        print("POS API stopped.")
@@ -0,0 +1,178 @@
+from array import array
+
+import money
+import operations
+import promotions
+
+#NumPy is optional, without it the carts are priced one by one with operations.calculate_total
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#Function to flatten many carts into parallel columns
+def cart_lines(d, carts):
+    """
+    Flatten a list of carts into parallel columns with one entry per cart line.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'carts' (list): Cart dictionaries mapping product IDs to [sell_qty, free_qty, total_sell_qty].
+
+    Returns:
+    tuple: (line_counts, rows, sell_qtys) where
+        - line_counts (array): Number of lines in every cart.
+        - rows (array): Inventory row position of every line.
+        - sell_qtys (array): Billed quantity of every line.
+    """
+    line_counts = array("q")
+    prod_ids = []
+    sell_qtys = array("q")
+    for cart_dict in carts:
+        line_counts.append(len(cart_dict))
+        for key in cart_dict:
+            prod_ids.append(key)
+            sell_qtys.append(cart_dict[key][0])
+    return line_counts, d.rows(prod_ids), sell_qtys
+
+
+#Function to gather the promotion terms of some inventory rows into columns
+def offer_columns(d, rows):
+    """
+    Describe the promotions.Offer of every row as numbers, so lines can be priced with column operations.
+
+    Each offer is looked up once per distinct row, not once per cart line. The percentage tables of the offers
+    are laid end to end in one column, a table shared by several offers being stored once.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'rows' (list): Distinct inventory row positions.
+
+    Returns:
+    tuple: (buys, frees, starts, lengths, percents) where
+        - buys, frees (array): The bundle terms of every row, 0 if it has no bundle.
+        - starts, lengths (array): Where the percentage table of every row starts in percents, and its length.
+        - percents (array): The percentage tables, see promotions.Offer.percent.
+    """
+    offer = promotions.active.offer
+    buys = array("q")
+    frees = array("q")
+    starts = array("q")
+    lengths = array("q")
+    percents = array("q")
+    tables = {}
+    for row in rows:
+        row_offer = offer(d, d.ids[row])
+        buys.append(row_offer.buy)
+        frees.append(row_offer.free)
+        table = row_offer.percents
+        if id(table) not in tables:
+            #Keeping the table itself so its id is not reused while this runs
+            tables[id(table)] = (len(percents), table)
+            percents.extend(table)
+        starts.append(tables[id(table)][0])
+        lengths.append(len(table))
+    return buys, frees, starts, lengths, percents
+
+
+#Function to price whole arrays of carts in one pass
+def price_lines(d, carts):
+    """
+    Compute the line amounts, free items and totals of many carts in one vectorized pass.
+
+    Sell price is twice the cost price. The offer terms of the distinct products are gathered by offer_columns
+    and spread over the lines with one index, after which the free items (as in operations.apply_offer) and the
+    percentage off (rounded exactly as in operations.calculate_total and promotions.Offer.amount) are column
+    operations. Only flattening the carts loops over the lines in Python.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'carts' (list): Cart dictionaries mapping product IDs to [sell_qty, free_qty, total_sell_qty].
+
+    Returns:
+    dict: NumPy int64 arrays with the keys
+        - 'sell_price', 'sell_qty', 'free_qty', 'percent': One entry per cart line, the price in rupees, in cart
+          order.
+        - 'amount': One entry per cart line in paisa, after the percentage off.
+        - 'total', 'vat', 'grand_total': One entry per cart in paisa, VAT rounded like money.vat_paisa.
+
+    Raises:
+    RuntimeError: If NumPy is not installed.
+    """
+    if numpy is None:
+        raise RuntimeError("NumPy is needed for vectorized pricing.")
+
+    line_counts, rows, sell_qtys = cart_lines(d, carts)
+    line_counts = numpy.frombuffer(line_counts, dtype=numpy.int64)
+    sell_qty = numpy.frombuffer(sell_qtys, dtype=numpy.int64)
+    rows = numpy.frombuffer(rows, dtype=numpy.int64)
+
+    #Reading the price column without copying it, the view is dropped before returning
+    price_col = numpy.frombuffer(d.price_col, dtype=numpy.int64)
+    sell_price = price_col[rows]*2
+    del price_col
+
+    #Spreading the offer terms of the distinct rows over the lines
+    distinct_rows, line_offer = numpy.unique(rows, return_inverse=True)
+    buys, frees, table_starts, lengths, percents = [numpy.frombuffer(column, dtype=numpy.int64)
+                                                    for column in offer_columns(d, distinct_rows.tolist())]
+    buy = buys[line_offer]
+    bundled = buy > 0
+    free_qty = numpy.zeros(len(sell_qty), dtype=numpy.int64)
+    free_qty[bundled] = sell_qty[bundled]//buy[bundled]*frees[line_offer][bundled]
+
+    #Quantities past the end of a percentage table take its last entry
+    percent = percents[table_starts[line_offer] + numpy.minimum(numpy.maximum(sell_qty, 0), lengths[line_offer] - 1)]
+
+    #Working in paisa with integer arithmetic only, halves of a paisa round up
+    amount = sell_qty*sell_price*money.PAISA_PER_RUPEE
+    amount -= (amount*percent + 50)//100
+
+    #Adding up the lines of each cart, empty carts keep a total of 0
+    total = numpy.zeros(len(line_counts), dtype=numpy.int64)
+    filled = line_counts > 0
+    if len(amount):
+        starts = numpy.cumsum(line_counts) - line_counts
+        total[filled] = numpy.add.reduceat(amount, starts[filled])
+
+    vat = (total*money.VAT_PERCENT + 50)//100
+    return {
+        "sell_price": sell_price,
+        "sell_qty": sell_qty,
+        "free_qty": free_qty,
+        "percent": percent,
+        "amount": amount,
+        "total": total,
+        "vat": vat,
+        "grand_total": total + vat,
+    }
+
+
+#Function to price many carts at once
+def price_carts(d, carts):
+    """
+    Return the costs of many carts, the same values operations.calculate_total gives for each of them.
+
+    Uses price_lines when NumPy is installed and falls back to calling calculate_total for every cart otherwise.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'carts' (list): Cart dictionaries mapping product IDs to [sell_qty, free_qty, total_sell_qty].
+
+    Returns:
+    list: A [total, vat, grand_total] list of Money amounts for every cart.
+    """
+    if numpy is None or not carts:
+        costs = []
+        for cart_dict in carts:
+            costs.append(list(operations.calculate_total(d, cart_dict, "sell")))
+        return costs
+
+    priced = price_lines(d, carts)
+    Money = money.Money
+    costs = []
+    for total, vat, grand_total in zip(priced["total"].tolist(), priced["vat"].tolist(),
+                                       priced["grand_total"].tolist()):
+        costs.append([Money(total), Money(vat), Money(grand_total)])
+    return costs
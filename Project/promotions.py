@@ -0,0 +1,304 @@
+import datetime
+import threading
+import weakref
+
+import money
+import search
+
+#File holding the promotion rules
+PROMOTIONS_FILE = "promotions.txt"
+
+#Kinds of rules
+BUNDLE = "bundle"
+PERCENT = "percent"
+TIERED = "tiered"
+
+#Scopes of a rule, a product takes the rule of its most specific scope
+SCOPES = ("all", "brand", "sku")
+
+#Rules used when there is no promotions file: the buy 3 get 1 free offer on every product
+DEFAULT_RULES = ["bundle,all,*,,,3:1"]
+
+#Largest quantity a tier may start at, tiers are compiled into a table with one entry per quantity
+MAX_TIER_QTY = 10000
+
+
+#Class for one promotion rule
+class Rule:
+    """
+    One line of the promotions file:
+        kind,scope,target,start,end,terms
+    where
+        - kind is BUNDLE (buy some, get some free), PERCENT (a percentage off) or TIERED (a percentage off that
+          grows with the quantity billed).
+        - scope is 'all' (target '*'), 'brand' (target is a brand) or 'sku' (target is a product ID).
+        - start and end are the first and last day of the promotion as YYYY-MM-DD, either can be left empty.
+        - terms are 'buy:free' for a bundle, e.g. '3:1', the percentage for PERCENT, e.g. '10', and
+          'quantity:percentage' pairs separated by ';' for TIERED, e.g. '10:5;20:10' for 5% off from 10 units
+          billed and 10% off from 20.
+
+    Raises:
+    ValueError: If the line is not a valid rule.
+    """
+
+    def __init__(self, line):
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) != 6:
+            raise ValueError("Expected 6 fields, found " + str(len(fields)))
+        self.kind, self.scope, target, start, end, terms = fields
+        if self.scope not in SCOPES:
+            raise ValueError("Unknown scope " + repr(self.scope))
+        if self.scope == "sku":
+            self.target = int(target)
+        elif self.scope == "brand":
+            self.target = " ".join(search.tokenize(target))
+        else:
+            self.target = "*"
+        self.start = datetime.date.fromisoformat(start) if start else None
+        self.end = datetime.date.fromisoformat(end) if end else None
+
+        self.buy = 0
+        self.free = 0
+        self.percents = [0]
+        if self.kind == BUNDLE:
+            self.buy, self.free = [int(term) for term in terms.split(":")]
+            if self.buy < 1 or self.free < 1:
+                raise ValueError("A bundle needs at least 1 bought and 1 free unit")
+        elif self.kind == PERCENT:
+            self.percents = [check_percent(int(terms))]
+        elif self.kind == TIERED:
+            #Table of the percentage off for every quantity up to the last tier, which covers everything above
+            for tier in terms.split(";"):
+                qty, percent = [int(term) for term in tier.split(":")]
+                if qty < len(self.percents) or qty > MAX_TIER_QTY:
+                    raise ValueError("Tier quantities must increase and be at most " + str(MAX_TIER_QTY))
+                self.percents += [self.percents[-1]]*(qty - len(self.percents))
+                self.percents.append(check_percent(percent))
+        else:
+            raise ValueError("Unknown kind of rule " + repr(self.kind))
+
+    #Function to check if the rule runs on a day
+    def runs_on(self, day):
+        return (self.start is None or self.start <= day) and (self.end is None or day <= self.end)
+
+
+#Function to check a percentage off
+def check_percent(percent):
+    if percent < 1 or percent > 99:
+        raise ValueError("A percentage off must be from 1 to 99")
+    return percent
+
+
+#Class for the offer on one product
+class Offer:
+    """
+    The promotions of one product on one day, compiled from at most one bundle rule and one percentage or
+    tiered rule. Every question is answered in constant time, without looking at any rule.
+
+    Parameters:
+    'bundle' (Rule): The bundle rule, None if there is none.
+    'discount' (Rule): The percentage or tiered rule, None if there is none.
+    """
+    __slots__ = ("buy", "free", "percents")
+
+    def __init__(self, bundle=None, discount=None):
+        self.buy = bundle.buy if bundle else 0
+        self.free = bundle.free if bundle else 0
+        self.percents = discount.percents if discount else [0]
+
+    #Function to add the free units to a billed quantity
+    def apply(self, sell_qty):
+        """
+        Return [sell_qty, free_qty, total_sell_qty] for a billed quantity, e.g. [6, 2, 8] for 6 units under
+        buy 3 get 1 free.
+        """
+        free_qty = 0
+        if self.buy:
+            free_qty = (sell_qty//self.buy)*self.free
+        return [sell_qty, free_qty, sell_qty + free_qty]
+
+    #Function to get the largest billed quantity the stock can cover
+    def max_base_qty(self, available_qty):
+        """
+        Return the highest quantity that can be billed so that it and its free units are in stock.
+
+        Every 'buy + free' units of stock cover 'buy' billed units, and what is left over can cover up to
+        'buy - 1' more billed units, which earn no free units.
+        """
+        if not self.buy:
+            return max(available_qty, 0)
+        blocks, left = divmod(max(available_qty, 0), self.buy + self.free)
+        return blocks*self.buy + min(left, self.buy - 1)
+
+    #Function to get the percentage off a billed quantity
+    def percent(self, sell_qty):
+        percents = self.percents
+        if sell_qty < len(percents):
+            return percents[sell_qty]
+        return percents[-1]
+
+    #Function to price a cart line
+    def amount(self, sell_qty, sell_price):
+        """
+        Return the amount of a cart line in paisa: the billed quantity at the sell price in rupees, less the
+        percentage off rounded to the nearest paisa with halves rounded up.
+        """
+        paisa = sell_qty*sell_price*money.PAISA_PER_RUPEE
+        percent = self.percent(sell_qty)
+        if percent:
+            paisa -= (paisa*percent + 50)//100
+        return paisa
+
+
+#Class for the promotion rules of the store
+class Promotions:
+    """
+    Promotion rules compiled into lookup tables, so pricing a cart takes one dictionary lookup per line and
+    never scans the rules.
+
+    The rules running on the day are compiled into one table per scope, mapping a product ID, a brand or '*'
+    to its bundle and discount rules; a later rule of the same scope and kind replaces an earlier one. The
+    Offer of a product combines the bundle and discount of its most specific scopes, e.g. a brand discount
+    with the bundle of every product, and is kept in a per-product table the first time it is asked for. The
+    tables are compiled again when the day changes, so promotions start and end on their own.
+
+    Parameters:
+    'path' (str): The promotions file, DEFAULT_RULES are used if it does not exist.
+    'clock' (function): Returns the current day.
+    """
+
+    def __init__(self, path=PROMOTIONS_FILE, clock=datetime.date.today):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._rules = None
+        self._day = None
+        self._tables = None
+        self._offers = weakref.WeakKeyDictionary()
+
+    #Function to read the rules
+    def load(self):
+        """
+        Read the rules of the promotions file, skipping blank lines and lines starting with '#'.
+
+        Returns:
+        int: The number of rules.
+
+        Raises:
+        ValueError: If a line is not a valid rule, naming the line.
+        """
+        try:
+            rules_file = open(self.path, "r")
+            lines = rules_file.readlines()
+            rules_file.close()
+        except FileNotFoundError:
+            lines = DEFAULT_RULES
+        rules = []
+        for line_number in range(len(lines)):
+            line = lines[line_number].strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                rules.append(Rule(line))
+            except ValueError as error:
+                raise ValueError(self.path + " line " + str(line_number + 1) + ": " + str(error))
+        with self._lock:
+            self._rules = rules
+            self._day = None
+        return len(rules)
+
+    #Function to compile the rules running on a day
+    def _compile(self, day):
+        tables = {}
+        for scope in SCOPES:
+            tables[scope] = {}
+        for rule in self._rules:
+            if rule.runs_on(day):
+                entry = tables[rule.scope].setdefault(rule.target, [None, None])
+                entry[0 if rule.kind == BUNDLE else 1] = rule
+        self._tables = tables
+        self._offers = weakref.WeakKeyDictionary()
+        self._day = day
+
+    #Function to find the offer on a product
+    def offer(self, d, prod_id):
+        """
+        Return the Offer on a product today.
+
+        Parameters:
+        'd' (InventoryStore): The inventory, for the brand of the product.
+        'prod_id' (int): The product.
+
+        Returns:
+        Offer: The offer, one without free units or discount if no promotion covers the product.
+        """
+        day = self.clock()
+        if day != self._day:
+            if self._rules is None:
+                self.load()
+            with self._lock:
+                if day != self._day:
+                    self._compile(day)
+        offers = self._offers.get(d)
+        if offers is None:
+            offers = self._offers.setdefault(d, {})
+        offer = offers.get(prod_id)
+        if offer is None:
+            tables = self._tables
+            rules = [None, None]
+            for entry in (tables["sku"].get(prod_id), tables["brand"].get(" ".join(search.tokenize(d.brand(prod_id)))),
+                          tables["all"].get("*")):
+                if entry:
+                    rules[0] = rules[0] or entry[0]
+                    rules[1] = rules[1] or entry[1]
+            offer = offers[prod_id] = Offer(rules[0], rules[1])
+        return offer
+
+    #Function to describe the offers on some products for another process
+    def offers_for(self, d, prod_ids):
+        """
+        Return the Offer on each of the products, to price them where this object is not available, e.g. in
+        the worker processes of write.generate_invoices.
+
+        Returns:
+        dict: Product IDs mapped to their Offer.
+        """
+        offers = {}
+        for prod_id in prod_ids:
+            offers[prod_id] = self.offer(d, prod_id)
+        return offers
+
+
+#Class for offers worked out in advance
+class FixedOffers:
+    """
+    Stands in for Promotions with the offers of a known set of products, see Promotions.offers_for.
+
+    Parameters:
+    'offers' (dict): Product IDs mapped to their Offer.
+    """
+
+    def __init__(self, offers):
+        self.offers = offers
+
+    def offer(self, d, prod_id):
+        return self.offers[prod_id]
+
+
+#Function to show a line amount
+def format_amount(paisa, percent=0):
+    """
+    Return a line amount for a table, in whole rupees when there are no paisa and followed by the percentage
+    off if there is one, e.g. 2000 -> '20', 165050 with 5% -> '1650.50 (-5%)'.
+    """
+    if paisa % money.PAISA_PER_RUPEE:
+        text = str(money.Money(paisa))
+    else:
+        text = str(paisa//money.PAISA_PER_RUPEE)
+    if percent:
+        text += " (-" + str(percent) + "%)"
+    return text
+
+
+#Promotion rules used by the program
+active = Promotions()
@@ -1,32 +1,224 @@
+import mmap
+import os
+import struct
+from array import array
+
+import metrics
+import storage
+import store
+
+#Header of the saved line index: magic, file size, file mtime, number of offsets and number of line IDs
+INDEX_MAGIC = b"WCIDX002"
+INDEX_HEADER = struct.Struct("<8sqqqq")
+
 #Function to read data from the inventory file
-def read_inventory():
+def read_inventory(file_name="inventory.txt"):
     """
-    Read inventory data from a text file and store it in a dictionary.
+    Read the inventory from its storage backend into an InventoryStore.
+
+    The backend is picked from the file name (see storage.backend_for): comma separated text lines by default
+    (read_inventory_lines), binary columnar snapshots for '.bin' files and an SQLite database for '.db' files.
+
+    Parameters:
+    'file_name' (str): The inventory file, 'inventory.txt' by default.
+
+    Returns:
+    InventoryStore: A dictionary-like store where each key is an integer product ID and the value is a product row
+    containing the name, brand, quantity, price and origin of the product.
+    """
+    return storage.backend_for(file_name).load(file_name)
+
+
+#Function to read the products of a text inventory file
+def read_inventory_lines(file_name="inventory.txt"):
+    """
+    Read inventory data from a text file and store it in an InventoryStore, see storage.TextBackend.
 
     This function opens the 'inventory.txt' file, reads each line, and processes the data to remove newline characters
-    and split values by commas. It stores the data in a dictionary with integer keys representing product IDs.
+    and split values by commas. Quantity and price are converted to integers once here and kept in typed columns,
+    so the rest of the program does not need to re-parse them on every access.
+    Lines starting with a product ID keep that ID wherever they are in the file, so reordering or deleting lines
+    does not renumber the other products. Older lines without an ID get their line number, as they always did.
 
     Parameters:
-    -None
+    'file_name' (str): The inventory file, 'inventory.txt' by default.
 
     Returns:
-    dict: A dictionary where each key is an integer product ID and the value is a list of product attributes
-    It contains the ID of the product as the key and a list containing, name, brand, quantity, price and origin of the product.
+    InventoryStore: A dictionary-like store where each key is an integer product ID and the value is a product row
+    containing the name, brand, quantity, price and origin of the product.
+
+    Raises:
+    ValueError: If two lines have the same product ID.
     """
-    #creating empty dictionary to store whole inventory
-    d = {}
-    prod_id = 1
+    #creating empty store to hold whole inventory
+    d = store.InventoryStore()
+    line_number = 0
 
     #opening the text file in read mode
-    file = open("inventory.txt","r")
-    data = file.readlines()
+    file = open(file_name,"r")
 
-    #formatting the data from text file and adding to dictionary with indexes
-    for product in data:
+    #formatting the data from text file and adding to the store with indexes
+    for product in file:
         product = product.replace("\n","").split(",")
-        d[prod_id] = product
-        prod_id = prod_id+1
+        #skipping blank lines, like build_line_index
+        if product == [""]:
+            continue
+        line_number = line_number+1
+        if len(product) == store.ID_FIELD_COUNT:
+            prod_id = int(product.pop(0))
+        else:
+            prod_id = line_number
+        if prod_id in d:
+            file.close()
+            raise ValueError("Product ID " + str(prod_id) + " is used twice in " + file_name + ".")
+        d.append(prod_id, product[0], product[1], product[2], product[3], product[4])
+
+    #counting the bytes read when metrics are on
+    if metrics.enabled:
+        metrics.add_bytes("inventory.read", file.buffer.tell())
 
     #closing the file
     file.close()
-    return d
\ No newline at end of file
+    return d
+
+
+#Function to find where each line of the inventory file starts
+def build_line_index(buffer):
+    """
+    Scan the inventory file contents once and record the start offset and product ID of every line.
+
+    Parameters:
+    'buffer' (mmap or bytes): The contents of the inventory file.
+
+    Returns:
+    tuple: (offsets, line_ids) where offsets is the start offset of every non-empty line followed by the end
+    offset of the last line, and line_ids the product ID of every line, or None if no line starts with an ID.
+    """
+    offsets = array("q")
+    line_ids = array("q")
+    has_ids = False
+    size = len(buffer)
+    start = 0
+    while start < size:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = size
+        else:
+            end += 1
+        #skipping blank lines
+        if buffer[start] not in (10, 13):
+            offsets.append(start)
+            line = buffer[start:end]
+            if line.count(b",") == store.ID_FIELD_COUNT - 1:
+                line_ids.append(int(line[:line.find(b",")]))
+                has_ids = True
+            else:
+                line_ids.append(len(offsets))
+        start = end
+    offsets.append(size)
+    if not has_ids:
+        return offsets, None
+    return offsets, line_ids
+
+
+#Function to load a saved line index if it still matches the file
+def load_line_index(file_name, index_name):
+    """
+    Load the line offsets and line IDs saved next to the inventory file.
+
+    The saved index is only used if the size and modification time of the inventory file are the same
+    as when the index was written.
+
+    Parameters:
+    'file_name' (str): The inventory file.
+    'index_name' (str): The file the index was saved to.
+
+    Returns:
+    tuple or None: (offsets, line_ids) as returned by build_line_index, or None if there is no usable index.
+    """
+    try:
+        stat = os.stat(file_name)
+        index_file = open(index_name, "rb")
+        data = index_file.read()
+        index_file.close()
+        magic, size, mtime, count, id_count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or size != stat.st_size or mtime != stat.st_mtime_ns:
+            return None
+        columns = array("q")
+        columns.frombytes(data[INDEX_HEADER.size:])
+        if len(columns) != count + id_count:
+            return None
+        offsets = columns[:count]
+        if id_count == 0:
+            return offsets, None
+        return offsets, columns[count:]
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+#Function to save the line index next to the inventory file
+def save_line_index(file_name, index_name, offsets, line_ids=None):
+    """
+    Save the line offsets and line IDs next to the inventory file so the next start does not need to scan it.
+
+    Parameters:
+    'file_name' (str): The inventory file.
+    'index_name' (str): The file to save the index to.
+    'offsets' (array): The line offsets returned by build_line_index.
+    'line_ids' (array): The line IDs returned by build_line_index, None if the IDs are the line numbers.
+
+    Returns:
+    boolean: True if the index was saved, False otherwise.
+    """
+    try:
+        stat = os.stat(file_name)
+        index_file = open(index_name, "wb")
+        id_count = 0 if line_ids is None else len(line_ids)
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(offsets), id_count))
+        index_file.write(offsets.tobytes())
+        if line_ids is not None:
+            index_file.write(line_ids.tobytes())
+        index_file.close()
+        return True
+    except OSError:
+        return False
+
+
+#Function to read the inventory lazily through a memory map
+def map_inventory(file_name="inventory.txt", persist_index=False):
+    """
+    Memory-map the inventory file and return a store that decodes products only when they are used.
+
+    At startup only the offset and product ID of every line are worked out, so the time and memory needed before the
+    main menu appears no longer depend on parsing the whole catalogue.
+
+    Parameters:
+    'file_name' (str): The inventory file to map.
+    'persist_index' (bool): If True, the line offsets and IDs are saved to '<file_name>.idx' and reused on the
+        next start while the inventory file is unchanged.
+
+    Returns:
+    MappedInventoryStore: A dictionary-like store with the same product IDs as read_inventory().
+
+    Raises:
+    ValueError: If two lines have the same product ID.
+    """
+    index_name = file_name + ".idx"
+    file = open(file_name, "rb")
+    try:
+        if os.fstat(file.fileno()).st_size == 0:
+            return store.InventoryStore()
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        #the mapping stays valid after the file is closed
+        file.close()
+
+    index = None
+    if persist_index:
+        index = load_line_index(file_name, index_name)
+    if index is None:
+        index = build_line_index(buffer)
+        if persist_index:
+            save_line_index(file_name, index_name, index[0], index[1])
+
+    return store.MappedInventoryStore(buffer, index[0], index[1])
@@ -0,0 +1,264 @@
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+#Seconds a hold lasts after the last change to it
+HOLD_TTL = 15*60
+
+#Cart used by the interactive sale, there is only one at a time
+LOCAL_CART = 0
+
+
+#Number of locks the products are spread over, products whose IDs differ by a multiple of it share a lock
+LOCK_STRIPES = 64
+
+
+#Class for the stock held by open carts
+class ReservationLedger:
+    """
+    Ledger of the stock held by open carts, kept apart from the stock on hand.
+
+    Putting a product in a cart holds its quantity instead of taking it out of the inventory, so the stock
+    available to other carts is on hand minus held, and the total held of every product is kept up to date
+    with each change. Checkout consumes the holds of a cart while the sold quantity is taken off the stock on
+    hand. A hold that is not touched for 'ttl' seconds expires: sweep() pops the expired holds from a heap
+    ordered by expiry time, so reclaiming stale carts costs only the number of expired holds. Heap entries of
+    holds that were changed or released since are skipped when they come up.
+
+    The holds of a product are guarded by the lock of its stripe, so carts holding different products never
+    wait for each other. Only adding or removing a product from a cart's list and pushing or popping the
+    expiry heap take a shared lock, each for a single dictionary or heap operation. Holding stock does not
+    sweep: expired holds are reclaimed by whoever calls sweep() periodically (see pos_server.PosApi and
+    service.serve), or by hold() itself when the stock it asks for is only missing because of them.
+
+    Parameters:
+    'ttl' (float): Seconds a hold lasts after it was last changed.
+    'clock' (function): Returns the current time in seconds, time.monotonic by default.
+    """
+
+    def __init__(self, ttl=HOLD_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.held = {}
+        self.carts = {}
+        self._heap = []
+        self._cart_ids = itertools.count(LOCAL_CART + 1)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._carts_lock = threading.Lock()
+        self._heap_lock = threading.Lock()
+
+    def _lock_for(self, prod_id):
+        return self._locks[prod_id % LOCK_STRIPES]
+
+    #Function to lock some products while their stock on hand is checked and changed
+    @contextlib.contextmanager
+    def locked(self, prod_ids):
+        """
+        Take the locks of the stripes of some products for the body of a 'with' block, in a fixed order so two
+        callers can never deadlock. Stock on hand checked and changed inside the block cannot be held by another
+        cart meanwhile, see commit(). Only methods documented as called inside locked() may be used in the block.
+        """
+        locks = [self._locks[stripe] for stripe in sorted(set(prod_id % LOCK_STRIPES for prod_id in prod_ids))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in locks:
+                lock.release()
+
+    #Function to get a new cart ID
+    def open_cart(self):
+        with self._carts_lock:
+            return next(self._cart_ids)
+
+    #Function to get the total quantity of a product held by all carts
+    def held_qty(self, prod_id):
+        return self.held.get(prod_id, 0)
+
+    #Function to get the quantity of a product held by one cart
+    def cart_qty(self, cart_id, prod_id):
+        entry = self.carts.get(cart_id, {}).get(prod_id)
+        if entry is None:
+            return 0
+        return entry[0]
+
+    #Function to get everything a cart holds
+    def cart_holds(self, cart_id):
+        """
+        Return the quantities held by a cart as a dictionary of product ID to quantity.
+        """
+        with self._carts_lock:
+            entries = list(self.carts.get(cart_id, {}).items())
+        holds = {}
+        for prod_id, entry in entries:
+            if entry[0] > 0:
+                holds[prod_id] = entry[0]
+        return holds
+
+    #Function to change a hold, called with the lock of the product's stripe held
+    def _change(self, cart_id, prod_id, delta):
+        entry = self.carts.get(cart_id, {}).get(prod_id)
+        if entry is None:
+            with self._carts_lock:
+                entry = self.carts.setdefault(cart_id, {}).setdefault(prod_id, [0, 0])
+        entry[0] += delta
+        held = self.held.get(prod_id, 0) + delta
+        if held > 0:
+            self.held[prod_id] = held
+        else:
+            self.held.pop(prod_id, None)
+
+        if entry[0] > 0:
+            entry[1] = self.clock() + self.ttl
+            with self._heap_lock:
+                heapq.heappush(self._heap, (entry[1], cart_id, prod_id))
+        else:
+            with self._carts_lock:
+                holds = self.carts.get(cart_id)
+                if holds is not None:
+                    holds.pop(prod_id, None)
+                    if not holds:
+                        del self.carts[cart_id]
+
+    #Function to give back held stock, called with the lock of the product's stripe held
+    def _release(self, cart_id, prod_id, qty):
+        held = self.cart_qty(cart_id, prod_id)
+        if qty is None or qty > held:
+            qty = held
+        if qty > 0:
+            self._change(cart_id, prod_id, -qty)
+        return qty
+
+    #Function to check if some holds have expired
+    def _expired(self, now):
+        heap = self._heap
+        return bool(heap) and heap[0][0] <= now
+
+    #Function to hold stock for a cart
+    def hold(self, cart_id, prod_id, qty, on_hand):
+        """
+        Hold 'qty' of a product for a cart if that much of it is not on hold already.
+
+        If the stock is short while some holds have expired, they are swept and the hold is tried once more.
+
+        Parameters:
+        'cart_id' (int): The cart, see open_cart().
+        'prod_id' (int): The product.
+        'qty' (int): The quantity to hold, added to what the cart already holds.
+        'on_hand' (function): Returns the stock on hand of a product, called with the product's lock held.
+
+        Returns:
+        boolean: True if the stock was held, False if less than 'qty' is available.
+        """
+        if qty < 1:
+            return False
+        for attempt in range(2):
+            with self._lock_for(prod_id):
+                if on_hand(prod_id) - self.held_qty(prod_id) >= qty:
+                    self._change(cart_id, prod_id, qty)
+                    return True
+            if attempt or not self._expired(self.clock()):
+                return False
+            self.sweep()
+        return False
+
+    #Function to give back held stock
+    def release(self, cart_id, prod_id, qty=None):
+        """
+        Give back 'qty' of the stock a cart holds of a product, or all of it if 'qty' is None.
+
+        Returns:
+        int: The quantity given back.
+        """
+        with self._lock_for(prod_id):
+            return self._release(cart_id, prod_id, qty)
+
+    #Function to give back everything a cart holds
+    def release_cart(self, cart_id):
+        released = {}
+        for prod_id in self.cart_holds(cart_id):
+            qty = self.release(cart_id, prod_id)
+            if qty:
+                released[prod_id] = qty
+        return released
+
+    #Function to use up held stock at checkout
+    def consume(self, cart_id, prod_id, qty):
+        """
+        Use up to 'qty' of the stock a cart holds of a product because it was sold.
+
+        Returns:
+        int: The quantity taken from the hold, less than 'qty' if part of the hold had expired.
+        """
+        return self.release(cart_id, prod_id, qty)
+
+    #Function to use up the holds of a cart at checkout
+    def commit(self, cart_id, quantities, on_hand):
+        """
+        Use up the holds of a cart for a sale, all or nothing.
+
+        A sale may take more than the cart holds, for example after a hold expired, as long as it does not
+        touch stock held by other carts. Called inside locked() for the products, so the caller can take the
+        sold quantities off the stock on hand before any other cart can hold them.
+
+        Parameters:
+        'cart_id' (int): The cart being sold.
+        'quantities' (dict): Product IDs mapped to the quantity sold.
+        'on_hand' (dict): Product IDs mapped to their stock on hand.
+
+        Returns:
+        boolean: True if the holds were used up, False if the stock is not enough for the sale.
+        """
+        for prod_id in quantities:
+            others = self.held_qty(prod_id) - self.cart_qty(cart_id, prod_id)
+            if on_hand[prod_id] - others < quantities[prod_id]:
+                return False
+        for prod_id in quantities:
+            self._release(cart_id, prod_id, quantities[prod_id])
+        return True
+
+    #Function to keep the holds of an active cart from expiring
+    def touch(self, cart_id):
+        expires = self.clock() + self.ttl
+        for prod_id in self.cart_holds(cart_id):
+            with self._lock_for(prod_id):
+                entry = self.carts.get(cart_id, {}).get(prod_id)
+                if entry is not None:
+                    entry[1] = expires
+                    with self._heap_lock:
+                        heapq.heappush(self._heap, (expires, cart_id, prod_id))
+
+    #Function to reclaim the stock of expired holds
+    def sweep(self, now=None):
+        """
+        Release every hold whose time is up.
+
+        The expired heap entries are popped first, then each hold is checked and released under the lock of
+        its product's stripe only.
+
+        Parameters:
+        'now' (float): The current time, the clock is read if None.
+
+        Returns:
+        list: (cart_id, prod_id, qty) of every hold that expired.
+        """
+        if now is None:
+            now = self.clock()
+        due = []
+        with self._heap_lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap))
+        expired = []
+        for expires, cart_id, prod_id in due:
+            with self._lock_for(prod_id):
+                entry = self.carts.get(cart_id, {}).get(prod_id)
+                #The hold was changed or released after this entry was pushed
+                if entry is None or entry[1] != expires:
+                    continue
+                expired.append((cart_id, prod_id, entry[0]))
+                self._change(cart_id, prod_id, -entry[0])
+        return expired
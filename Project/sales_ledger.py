@@ -0,0 +1,336 @@
+import datetime
+import json
+import os
+import threading
+
+import metrics
+import money
+import promotions
+
+#Files used by the sales ledger
+LEDGER_FILE = "sales.ledger"
+ROLLUP_FILE = "sales.rollup"
+
+#Kinds of ledger records
+SALE = "S"
+RESTOCK = "R"
+
+#Rollups kept up to date with every record, each maps a key to [units, free units, amount in paisa, lines]
+ROLLUPS = ("day", "product", "product_day", "phone")
+
+#Number of products listed in the report
+TOP_PRODUCTS = 5
+
+
+#Class for the ledger of every sale and restock
+class SalesLedger:
+    """
+    Append-only ledger of every product sold or restocked, with rollups maintained as records arrive.
+
+    Each line of the ledger is one product of a checkout or restock:
+        '<kind>,<time>,<party>,<product id>,<units>,<free units>,<amount in paisa>'
+    where kind is SALE or RESTOCK, party is the customer's phone number or the supplier, units counts free
+    units too and amount is the line total before VAT, after any percentage off.
+
+    Next to the ledger, totals per day, per product, per product and day and per phone number are kept in
+    memory, so a question like 'units of a product sold last month' adds up at most one entry per day of the
+    month instead of reading the ledger or the invoices. The rollups are saved to 'sales.rollup' together with
+    the size of the ledger they cover by checkpoint(); loading them only reads the ledger written after that.
+    Like the invoice index, the rollups are loaded on the first query and records appended before that are
+    only written to the file.
+
+    Parameters:
+    'path' (str): The ledger file.
+    'rollup_path' (str): The file the rollups are checkpointed to.
+    """
+
+    def __init__(self, path=LEDGER_FILE, rollup_path=ROLLUP_FILE):
+        self.path = path
+        self.rollup_path = rollup_path
+        self._lock = threading.Lock()
+        self._rollups = None
+        self._offset = 0
+
+    #Function to add one record to the rollups
+    def _apply(self, record):
+        kind, time, party, prod_id, units, free, amount = record
+        date = time[:10]
+        keys = {
+            "day": kind + "|" + date,
+            "product": kind + "|" + prod_id,
+            "product_day": kind + "|" + prod_id + "|" + date,
+            "phone": kind + "|" + party,
+        }
+        for name in ROLLUPS:
+            totals = self._rollups[name].get(keys[name])
+            if totals is None:
+                totals = self._rollups[name][keys[name]] = [0, 0, 0, 0]
+            totals[0] += int(units)
+            totals[1] += int(free)
+            totals[2] += int(amount)
+            totals[3] += 1
+
+    #Function to load the rollups and catch up with the ledger
+    def _load(self):
+        """
+        Load the last checkpoint of the rollups and apply the ledger records written after it.
+        Incomplete lines at the end of the ledger, for example from a crash, are left for later.
+        """
+        self._rollups = {}
+        for name in ROLLUPS:
+            self._rollups[name] = {}
+        self._offset = 0
+        try:
+            rollup_file = open(self.rollup_path, "r")
+            saved = json.load(rollup_file)
+            rollup_file.close()
+            if saved["offset"] <= os.path.getsize(self.path):
+                for name in ROLLUPS:
+                    self._rollups[name] = saved["rollups"][name]
+                self._offset = saved["offset"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        try:
+            ledger_file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        ledger_file.seek(self._offset)
+        data = ledger_file.read()
+        ledger_file.close()
+        if metrics.enabled:
+            metrics.add_bytes("sales_ledger.read", len(data))
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode().split("\n")[:-1]:
+            record = line.split(",")
+            if len(record) == 7:
+                self._apply(record)
+        self._offset += end
+
+    #Function to append records to the ledger
+    def append(self, records):
+        """
+        Append records to the ledger with a single write and add them to the rollups if they are loaded.
+
+        Parameters:
+        'records' (list): Lists of the seven record fields as strings.
+
+        Returns:
+        None
+        """
+        if not records:
+            return
+        data = ""
+        for record in records:
+            data += ",".join(record) + "\n"
+        data = data.encode()
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            if metrics.enabled:
+                metrics.add_bytes("sales_ledger.write", len(data))
+            if self._rollups is not None:
+                for record in records:
+                    self._apply(record)
+                self._offset += len(data)
+
+    #Function to record a checkout
+    def record_sale(self, d, cart_dict, billing_info):
+        """
+        Record every product of a checked out cart.
+
+        Parameters:
+        'd' (InventoryStore): The inventory, for the prices.
+        'cart_dict' (dict): Product IDs mapped to [billed quantity, free quantity, total quantity].
+        'billing_info' (dict): The billing info with 'time' and 'phone'.
+
+        Returns:
+        boolean: True if the sale was recorded.
+        """
+        try:
+            self.append(sale_records(d, cart_dict, billing_info))
+        except OSError:
+            return False
+        return True
+
+    #Function to record a restock
+    def record_restock(self, d, stock_list, restock_info):
+        """
+        Record every product of a restock.
+
+        Parameters:
+        'd' (InventoryStore): The inventory, for the prices.
+        'stock_list' (list): [product ID, quantity added, supplier] entries.
+        'restock_info' (dict): The restock info with 'time'.
+
+        Returns:
+        boolean: True if the restock was recorded.
+        """
+        time = str(restock_info["time"])
+        records = []
+        for item in stock_list:
+            amount = int(item[1])*d.price(item[0])*money.PAISA_PER_RUPEE
+            records.append([RESTOCK, time, clean(item[2]), str(item[0]), str(int(item[1])), "0", str(amount)])
+        try:
+            self.append(records)
+        except OSError:
+            return False
+        return True
+
+    #Function to read one rollup entry
+    def totals(self, rollup, key):
+        """
+        Return a copy of the totals of one rollup entry, e.g. totals('day', 'S|2025-01-31').
+
+        Returns:
+        list: [units, free units, amount in paisa, lines], all 0 if nothing was recorded for the key.
+        """
+        with self._lock:
+            if self._rollups is None:
+                self._load()
+            return list(self._rollups[rollup].get(key, (0, 0, 0, 0)))
+
+    #Function to get the totals of a product over a range of days
+    def product_totals(self, prod_id, start=None, end=None, kind=SALE):
+        """
+        Return the totals of a product, over every day from 'start' to 'end' (inclusive) if given.
+
+        Parameters:
+        'prod_id' (int): The product.
+        'start', 'end' (datetime.date): The first and last day, both None for all time.
+        'kind' (str): SALE or RESTOCK.
+
+        Returns:
+        list: [units, free units, amount in paisa, lines].
+        """
+        if start is None and end is None:
+            return self.totals("product", kind + "|" + str(prod_id))
+        if start is None or end is None:
+            raise ValueError("Both the first and the last day are needed.")
+        result = [0, 0, 0, 0]
+        day = start
+        while day <= end:
+            day_totals = self.totals("product_day", kind + "|" + str(prod_id) + "|" + day.isoformat())
+            for field in range(4):
+                result[field] += day_totals[field]
+            day += datetime.timedelta(days=1)
+        return result
+
+    #Function to get the totals of a day
+    def day_totals(self, day, kind=SALE):
+        return self.totals("day", kind + "|" + day.isoformat())
+
+    #Function to get the totals of a customer
+    def customer_totals(self, phone):
+        return self.totals("phone", SALE + "|" + clean(phone))
+
+    #Function to find the products with the most units
+    def top_products(self, count=TOP_PRODUCTS, kind=SALE):
+        """
+        Return the 'count' products with the most units sold (or restocked) of all time.
+
+        Returns:
+        list: (product ID, totals) pairs, most units first.
+        """
+        with self._lock:
+            if self._rollups is None:
+                self._load()
+            entries = []
+            for key, totals in self._rollups["product"].items():
+                if key.startswith(kind + "|"):
+                    entries.append((int(key[2:]), list(totals)))
+        entries.sort(key=lambda entry: (-entry[1][0], entry[0]))
+        return entries[:count]
+
+    #Function to save the rollups so they do not have to be rebuilt
+    def checkpoint(self):
+        """
+        Save the rollups and the size of the ledger they cover to the rollup file atomically.
+
+        Returns:
+        boolean: True if the rollups were saved.
+        """
+        with self._lock:
+            if self._rollups is None:
+                self._load()
+            try:
+                rollup_file = open(self.rollup_path + ".tmp", "w")
+                json.dump({"offset": self._offset, "rollups": self._rollups}, rollup_file)
+                rollup_file.flush()
+                os.fsync(rollup_file.fileno())
+                rollup_file.close()
+                os.replace(self.rollup_path + ".tmp", self.rollup_path)
+                return True
+            except OSError:
+                return False
+
+
+#Function to turn a checked out cart into ledger records
+def sale_records(d, cart_dict, billing_info):
+    """
+    Return the ledger records of a checked out cart, see SalesLedger.record_sale.
+    """
+    time = str(billing_info["time"])
+    phone = clean(billing_info["phone"])
+    records = []
+    for key in cart_dict:
+        amount = promotions.active.offer(d, key).amount(cart_dict[key][0], d.price(key)*2)
+        records.append([SALE, time, phone, str(key), str(cart_dict[key][2]), str(cart_dict[key][1]), str(amount)])
+    return records
+
+
+#Function to keep commas and new lines out of a ledger field
+def clean(text):
+    return str(text).replace(",", " ").replace("\n", " ").strip()
+
+
+#Function to show the sales report
+def report(d, ledger=None, today=None):
+    """
+    Return today's and this month's sales with the best selling products and their units this month,
+    read from the rollups of the ledger.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, for the product names.
+    'ledger' (SalesLedger): The ledger, the active one by default.
+    'today' (datetime.date): The day of the report, today by default.
+
+    Returns:
+    str: The report.
+    """
+    if ledger is None:
+        ledger = active
+    if today is None:
+        today = datetime.date.today()
+    month_start = today.replace(day=1)
+
+    today_totals = ledger.day_totals(today)
+    month_totals = [0, 0, 0, 0]
+    day = month_start
+    while day <= today:
+        day_totals = ledger.day_totals(day)
+        for field in range(4):
+            month_totals[field] += day_totals[field]
+        day += datetime.timedelta(days=1)
+
+    lines = ["-"*80, "Sales report".center(80), "-"*80,
+             "Today: " + str(today_totals[0]) + " units, " + str(money.Money(today_totals[2])),
+             "This month: " + str(month_totals[0]) + " units, " + str(money.Money(month_totals[2])),
+             "-"*80,
+             "Best selling products".ljust(40) + "All time".rjust(20) + "This month".rjust(20)]
+    for prod_id, totals in ledger.top_products():
+        if prod_id in d:
+            name = str(prod_id) + " " + d.name(prod_id)
+        else:
+            name = str(prod_id)
+        month_units = ledger.product_totals(prod_id, month_start, today)[0]
+        lines.append(name[:38].ljust(40) + str(totals[0]).rjust(20) + str(month_units).rjust(20))
+    lines.append("-"*80)
+    return "\n".join(lines) + "\n"
+
+
+#Sales ledger used by the program
+active = SalesLedger()
@@ -0,0 +1,231 @@
+import bisect
+import re
+import threading
+import weakref
+
+#Smallest share of trigrams a misspelt word has to have in common with a known word
+TRIGRAM_THRESHOLD = 0.3
+
+#Number of matches listed when a query is ambiguous
+MAX_RESULTS = 10
+
+#Pattern of a search word: letters and digits
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+#Search indexes already built, one per inventory
+_indexes = weakref.WeakKeyDictionary()
+
+#Name and brand indexes already built, one per inventory
+_product_keys = weakref.WeakKeyDictionary()
+
+#Lock guarding the indexes, so a product added from another thread while an index is built is not lost
+_lock = threading.RLock()
+
+
+#Function to split text into search tokens
+def tokenize(text):
+    """
+    Split text into lower case words, e.g. 'Vitamin C-Serum' -> ['vitamin', 'c', 'serum'].
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+#Function to split a word into trigrams
+def trigrams(word):
+    """
+    Return the set of three letter pieces of a word, padded so short words still have some.
+    """
+    padded = "  " + word + " "
+    pieces = set()
+    for i in range(len(padded) - 2):
+        pieces.add(padded[i:i+3])
+    return pieces
+
+
+#Class for the product search index
+class SearchIndex:
+    """
+    Inverted index over the name, brand and origin of every product.
+
+    Each word maps to the set of product IDs containing it. A sorted word list answers prefix queries
+    ('sun' finds 'sunscreen') and a trigram index finds words that are spelt slightly differently
+    ('sunscren' finds 'sunscreen'). Products can be added one at a time as they are created.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.words = []
+        self.word_trigrams = {}
+
+    #Function to index one product
+    def add(self, prod_id, name, brand, origin, sort_words=True):
+        """
+        Add a product to the index.
+
+        Parameters:
+        'prod_id' (int): The ID of the product.
+        'name', 'brand', 'origin' (str): The text fields to index.
+        'sort_words' (bool): Keep the word list sorted. When many products are added at once this can be
+            False, as long as sort_words() is called afterwards.
+
+        Returns:
+        None
+        """
+        for word in tokenize(name + " " + brand + " " + origin):
+            if word not in self.postings:
+                self.postings[word] = set()
+                if sort_words:
+                    bisect.insort(self.words, word)
+                else:
+                    self.words.append(word)
+                for piece in trigrams(word):
+                    if piece not in self.word_trigrams:
+                        self.word_trigrams[piece] = set()
+                    self.word_trigrams[piece].add(word)
+            self.postings[word].add(prod_id)
+
+    #Function to sort the word list after adding products in bulk
+    def sort_words(self):
+        self.words.sort()
+
+    #Function to find the words a query word can stand for
+    def _expand(self, word):
+        if word in self.postings:
+            return [word]
+
+        #Words starting with the query word
+        matches = []
+        position = bisect.bisect_left(self.words, word)
+        while position < len(self.words) and self.words[position].startswith(word):
+            matches.append(self.words[position])
+            position += 1
+        if matches:
+            return matches
+
+        #Words sharing enough trigrams with the query word
+        pieces = trigrams(word)
+        shared = {}
+        for piece in pieces:
+            for candidate in self.word_trigrams.get(piece, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        for candidate in shared:
+            similarity = shared[candidate]/(len(pieces) + len(trigrams(candidate)) - shared[candidate])
+            if similarity >= TRIGRAM_THRESHOLD:
+                matches.append(candidate)
+        return matches
+
+    #Function to search the index
+    def find(self, query):
+        """
+        Find the products matching every word of a query.
+
+        Parameters:
+        'query' (str): Words of the name, brand or origin, whole, started or slightly misspelt.
+
+        Returns:
+        list: The matching product IDs in ascending order.
+        """
+        result = None
+        for word in tokenize(query):
+            ids = set()
+            for match in self._expand(word):
+                ids |= self.postings[match]
+            if result is None:
+                result = ids
+            else:
+                result &= ids
+            if not result:
+                return []
+        if result is None:
+            return []
+        return sorted(result)
+
+
+#Function to get the search index of an inventory
+def index_for(d):
+    """
+    Return the search index of an inventory, building it the first time it is needed from
+    InventoryStore.text_fields, which leaves the rows of a memory-mapped inventory undecoded.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+
+    Returns:
+    SearchIndex: The index, kept up to date by add_product().
+    """
+    with _lock:
+        index = _indexes.get(d)
+        if index is None:
+            index = SearchIndex()
+            for prod_id, name, brand, origin in d.text_fields():
+                index.add(prod_id, name, brand, origin, sort_words=False)
+            index.sort_words()
+            _indexes[d] = index
+        return index
+
+
+#Function to check if the search index of an inventory has been built
+def indexed(d):
+    return d in _indexes
+
+
+#Function to get the key a product is matched on by name and brand
+def product_key(name, brand):
+    """
+    Return the name and brand as a key that ignores case, spacing and punctuation,
+    e.g. ('Vitamin C-Serum', 'GARNIER') -> ('vitamin c serum', 'garnier').
+    """
+    return " ".join(tokenize(name)), " ".join(tokenize(brand))
+
+
+#Function to get the name and brand index of an inventory
+def product_keys_for(d):
+    """
+    Return a dictionary mapping the product_key() of every product of 'd' to its ID, building it the first time
+    it is needed. If two products have the same name and brand the lowest ID is kept.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+
+    Returns:
+    dict: The index, kept up to date by add_product().
+    """
+    with _lock:
+        keys = _product_keys.get(d)
+        if keys is None:
+            keys = {}
+            for prod_id, name, brand, origin in d.text_fields():
+                keys.setdefault(product_key(name, brand), prod_id)
+            _product_keys[d] = keys
+        return keys
+
+
+#Function to find a product by its name and brand
+def find_product(d, name, brand):
+    """
+    Return the ID of the product of 'd' with this name and brand, or 0 if there is none.
+    """
+    return product_keys_for(d).get(product_key(name, brand), 0)
+
+
+#Function to index a product added to an inventory
+def add_product(d, prod_id):
+    """
+    Add a new product to the search and name and brand indexes of its inventory, if they have been built already.
+    """
+    with _lock:
+        index = _indexes.get(d)
+        if index is not None:
+            index.add(prod_id, d.name(prod_id), d.brand(prod_id), d.origin(prod_id))
+        keys = _product_keys.get(d)
+        if keys is not None:
+            keys.setdefault(product_key(d.name(prod_id), d.brand(prod_id)), prod_id)
+
+
+#Function to search the products of an inventory
+def find(d, query):
+    """
+    Return the IDs of the products of 'd' matching 'query', see SearchIndex.find.
+    """
+    with _lock:
+        return index_for(d).find(query)
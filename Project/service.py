@@ -0,0 +1,434 @@
+import json
+import socket
+import socketserver
+import threading
+
+import journal
+import reservations
+import store
+
+#Address the inventory service listens on
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+
+#Seconds between two sweeps for holds that expired
+SWEEP_INTERVAL = 30
+
+
+#Class for an error reported by the inventory service
+class ServiceError(Exception):
+    pass
+
+
+#Class for the inventory shared by several tills
+class InventoryService:
+    """
+    Owns the inventory and the journal while several sales and restock tills work on them at once.
+
+    The quantity kept in the inventory is the committed stock on hand. Stock a till has put in a cart is held
+    in the inventory's reservation ledger under the cart of its connection, so the stock available to other
+    tills is on hand minus held, and the holds of a till that disconnects or goes quiet are given back.
+    Holding and giving back stock only takes the reservation ledger's lock of the product involved, so tills
+    selling different products never wait for each other. Committing a checkout or restock turns the holds
+    into journal records under the journal lock, inside the ledger's locks of all products in it (see
+    ReservationLedger.locked), so no till can hold stock that is being sold.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, with the journal already replayed.
+    'inventory_journal' (InventoryJournal): The journal the committed changes are written to.
+    """
+
+    def __init__(self, d, inventory_journal):
+        self.d = d
+        self.journal = inventory_journal
+        self.next_id = d.next_id
+        self._journal_lock = threading.Lock()
+
+    #Function to work out the stock other tills can still take
+    def available(self, prod_id):
+        return self.d.available(prod_id)
+
+    #Function to list one product as sent to the tills
+    def product(self, prod_id):
+        d = self.d
+        return [prod_id, d.name(prod_id), d.brand(prod_id), d.qty(prod_id), d.price(prod_id), d.origin(prod_id)]
+
+    #Function to hold stock for a cart
+    def reserve(self, prod_id, qty, cart_id):
+        """
+        Hold 'qty' of a product for a cart if that much is available.
+
+        Returns:
+        tuple: (reserved, available) where 'available' is the stock left for other carts afterwards.
+        """
+        reserved = self.d.reserve(prod_id, qty, cart_id)
+        return reserved, self.available(prod_id)
+
+    #Function to give back held stock
+    def release(self, prod_id, qty, cart_id):
+        self.d.release(prod_id, qty, cart_id)
+        return self.available(prod_id)
+
+    #Function to give back everything a cart holds
+    def release_cart(self, cart_id):
+        self.d.release_cart(cart_id)
+
+    #Function to hand out the ID of a new product
+    def new_id(self):
+        with self._journal_lock:
+            prod_id = self.next_id
+            self.next_id += 1
+            return prod_id
+
+    #Function to commit the journal records of a till
+    def commit(self, lines, cart_id=reservations.LOCAL_CART):
+        """
+        Apply and journal the records of a checkout or restock made by a till, all or nothing.
+
+        'N' records add products the till created, 'Q' records change quantities. A negative quantity change
+        is a sale and uses up the stock the cart held for it, it may never take stock held by other carts.
+
+        Parameters:
+        'lines' (list): Journal record lines as built by InventoryJournal.record_sale and record_restock.
+        'cart_id' (int): The cart the records were made for.
+
+        Returns:
+        boolean: True if the records were committed.
+
+        Raises:
+        ServiceError: If a record is malformed or would leave a product with negative stock.
+        """
+        records = []
+        prod_ids = set()
+        try:
+            for line in lines:
+                fields = line.split(",")
+                if fields[0] == "Q":
+                    records.append(("Q", int(fields[1]), int(fields[2])))
+                elif fields[0] == "N" and len(fields) == 6:
+                    int(fields[4])
+                    records.append(("N", int(fields[1]), fields))
+                else:
+                    raise ValueError(line)
+                prod_ids.add(records[-1][1])
+        except (IndexError, ValueError):
+            raise ServiceError("Malformed journal record.")
+
+        d = self.d
+        holds = d.holds
+        with holds.locked(prod_ids):
+            with self._journal_lock:
+                #Checking every record before changing anything
+                new_ids = set()
+                changes = {}
+                for kind, prod_id, value in records:
+                    if kind == "N":
+                        if prod_id not in d:
+                            new_ids.add(prod_id)
+                    elif prod_id not in d and prod_id not in new_ids:
+                        raise ServiceError("Unknown product " + str(prod_id) + ".")
+                    else:
+                        changes[prod_id] = changes.get(prod_id, 0) + value
+                sold = {}
+                on_hand = {}
+                for prod_id in changes:
+                    if changes[prod_id] < 0:
+                        sold[prod_id] = -changes[prod_id]
+                        on_hand[prod_id] = d.qty(prod_id)
+                #Using up the cart's holds, a sale may not take stock other carts hold
+                if not holds.commit(cart_id, sold, on_hand):
+                    raise ServiceError("Not enough stock for the sale.")
+
+                #Products created by another till are already known, their N records are not journaled again
+                journal_lines = []
+                for record, line in zip(records, lines):
+                    kind, prod_id, value = record
+                    if kind == "N":
+                        if prod_id not in new_ids or prod_id in d:
+                            continue
+                        d.append(prod_id, value[2], value[3], 0, value[4], value[5])
+                        self.next_id = max(self.next_id, prod_id + 1)
+                    else:
+                        d.add_qty(prod_id, value)
+                    journal_lines.append(line)
+                return self.journal._commit(d, journal_lines)
+
+    #Function to answer one request of a till
+    def handle(self, request, cart_id=reservations.LOCAL_CART):
+        """
+        Carry out one request for a cart and return the response, both as dictionaries.
+
+        Requests have an 'op' of 'catalogue', 'product', 'qty' (the stock on hand), 'available' (the stock not
+        held by any cart), 'reserve', 'release', 'release_cart', 'new_id' or 'commit'. Responses have 'ok' set
+        to True, or to False with an 'error' message.
+        """
+        op = request.get("op")
+        try:
+            if op == "catalogue":
+                return {"ok": True, "products": [self.product(prod_id) for prod_id in list(self.d)]}
+            elif op == "product":
+                prod_id = request["id"]
+                if prod_id not in self.d:
+                    return {"ok": False, "error": "Unknown product " + str(prod_id) + "."}
+                return {"ok": True, "product": self.product(prod_id)}
+            elif op == "qty" or op == "available":
+                if request["id"] not in self.d:
+                    return {"ok": False, "error": "Unknown product " + str(request["id"]) + "."}
+                if op == "qty":
+                    return {"ok": True, "qty": self.d.qty(request["id"])}
+                return {"ok": True, "qty": self.available(request["id"])}
+            elif op == "reserve":
+                reserved, available = self.reserve(request["id"], int(request["qty"]), cart_id)
+                return {"ok": True, "reserved": reserved, "qty": available}
+            elif op == "release":
+                return {"ok": True, "qty": self.release(request["id"], int(request["qty"]), cart_id)}
+            elif op == "release_cart":
+                self.release_cart(cart_id)
+                return {"ok": True}
+            elif op == "new_id":
+                return {"ok": True, "id": self.new_id()}
+            elif op == "commit":
+                if not self.commit(request["lines"], cart_id):
+                    return {"ok": False, "error": "The journal could not be written."}
+                return {"ok": True}
+            return {"ok": False, "error": "Unknown operation " + str(op) + "."}
+        except ServiceError as error:
+            return {"ok": False, "error": str(error)}
+        except (KeyError, TypeError, ValueError):
+            return {"ok": False, "error": "Invalid request."}
+
+
+#Class for the connection of one till
+class ServiceHandler(socketserver.StreamRequestHandler):
+    """
+    Reads JSON requests from a till, one per line, and writes one JSON response line for each.
+    The connection has its own cart, whatever it still holds is given back when the till disconnects.
+    """
+
+    def handle(self):
+        service = self.server.service
+        cart_id = service.d.holds.open_cart()
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    response = service.handle(request, cart_id)
+                else:
+                    response = {"ok": False, "error": "Invalid request."}
+                self.wfile.write((json.dumps(response) + "\n").encode())
+        finally:
+            service.release_cart(cart_id)
+
+
+#Class for the server every till connects to
+class ServiceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, service, address=(SERVICE_HOST, SERVICE_PORT)):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+
+#Function to reclaim expired holds until stopped
+def sweep_holds(d, stop, interval=SWEEP_INTERVAL):
+    while not stop.wait(interval):
+        d.holds.sweep()
+
+
+#Function to run the inventory service
+def serve(d, address=(SERVICE_HOST, SERVICE_PORT)):
+    """
+    Serve the inventory to tills until interrupted, then write the journaled changes back to the inventory file.
+
+    Parameters:
+    'd' (InventoryStore): The inventory, with journal.active already replayed.
+    'address' (tuple): The (host, port) to listen on.
+
+    Returns:
+    None
+    """
+    service = InventoryService(d, journal.active)
+    server = ServiceServer(service, address)
+    #Expired holds are reclaimed in the background, not while a till waits for a reservation
+    stop = threading.Event()
+    threading.Thread(target=sweep_holds, args=(d, stop), daemon=True).start()
+    print("Inventory service listening on " + address[0] + ":" + str(address[1]) + ". Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        with service._journal_lock:
+            journal.active.compact(d)
+        print("Inventory service stopped.")
+
+
+#Class for the connection from a till to the service
+class ServiceClient:
+    """
+    A till's connection to the inventory service, one request at a time.
+
+    Parameters:
+    'address' (tuple): The (host, port) of the service.
+    """
+
+    def __init__(self, address=(SERVICE_HOST, SERVICE_PORT)):
+        self._socket = socket.create_connection(address)
+        self._file = self._socket.makefile("rwb")
+        self._lock = threading.Lock()
+
+    #Function to send a request and wait for its response
+    def call(self, op, **fields):
+        """
+        Send one request to the service.
+
+        Returns:
+        dict: The response.
+
+        Raises:
+        ServiceError: If the service answered with an error or closed the connection.
+        """
+        fields["op"] = op
+        with self._lock:
+            self._file.write((json.dumps(fields) + "\n").encode())
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ServiceError("The inventory service closed the connection.")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise ServiceError(response.get("error", "Request failed."))
+        return response
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+#Class for the inventory as seen by a till
+class RemoteInventory(store.InventoryStore):
+    """
+    Local copy of the service's inventory used by a till in place of the inventory read from file.
+
+    Names and prices are read from the copy. Quantities are always asked from the service, so a till sees the
+    stock other tills have taken: qty() is the stock on hand, like in a local InventoryStore, and available()
+    the stock no cart holds. reserve() and release() hold and give back stock on the service atomically, in
+    the cart of the till's connection, and commit_cart() has the service sell the cart. Products added by
+    other tills are fetched the first time their ID is used.
+
+    Parameters:
+    'client' (ServiceClient): The connection to the service.
+    """
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    #Function to load the whole catalogue from the service
+    @classmethod
+    def connect(cls, client):
+        d = cls(client)
+        for product in client.call("catalogue")["products"]:
+            d.append(*product)
+        return d
+
+    def _row(self, prod_id):
+        try:
+            return self._rows[prod_id]
+        except KeyError:
+            if type(prod_id) is not int:
+                raise
+        try:
+            product = self.client.call("product", id=prod_id)["product"]
+        except ServiceError:
+            raise KeyError(prod_id)
+        return store.InventoryStore.append(self, *product)
+
+    def __contains__(self, prod_id):
+        try:
+            self._row(prod_id)
+        except KeyError:
+            return False
+        return True
+
+    #The stock on hand, products a till added are known to the service once committed
+    def qty(self, prod_id):
+        row = self._row(prod_id)
+        try:
+            self.qty_col[row] = self.client.call("qty", id=prod_id)["qty"]
+        except ServiceError:
+            pass
+        return self.qty_col[row]
+
+    #The stock no cart holds, what a till can still put in its cart
+    def available(self, prod_id):
+        self._row(prod_id)
+        return self.client.call("available", id=prod_id)["qty"]
+
+    #The connection is the cart, so 'cart_id' is not sent
+    def reserve(self, prod_id, qty, cart_id=reservations.LOCAL_CART):
+        self._row(prod_id)
+        return self.client.call("reserve", id=prod_id, qty=qty)["reserved"]
+
+    def release(self, prod_id, qty, cart_id=reservations.LOCAL_CART):
+        self._row(prod_id)
+        self.client.call("release", id=prod_id, qty=qty)
+
+    def release_cart(self, cart_id=reservations.LOCAL_CART):
+        self.client.call("release_cart")
+
+    #The service uses up the holds of the connection and journals the sale, all or nothing
+    def commit_cart(self, cart_dict, cart_id=reservations.LOCAL_CART):
+        try:
+            self.client.call("commit", lines=journal.sale_lines(cart_dict))
+        except (OSError, ServiceError) as error:
+            print("The inventory service could not record the sale: " + str(error))
+            return False
+        return True
+
+    #New IDs come from the service so two tills never add products under the same ID
+    def new_id(self):
+        return self.client.call("new_id")["id"]
+
+
+#Class for the journal of a till
+class RemoteJournal(journal.InventoryJournal):
+    """
+    Journal of a till: the records of each restock are committed by the service instead of being written to
+    a local file, and sales are already committed with the cart by RemoteInventory.commit_cart. The service
+    owns replay and compaction, so both do nothing here.
+
+    Parameters:
+    'client' (ServiceClient): The connection to the service.
+    'd' (RemoteInventory): The till's inventory, products above its highest ID are new.
+    """
+
+    def __init__(self, client, d):
+        super().__init__()
+        self.client = client
+        self.max_id = d.next_id - 1
+
+    def replay(self, d):
+        return 0
+
+    def record_sale(self, d, cart_dict):
+        return True
+
+    def _commit(self, d, lines):
+        if not lines:
+            return True
+        try:
+            self.client.call("commit", lines=lines)
+        except (OSError, ServiceError) as error:
+            print("The inventory service could not record the change: " + str(error))
+            return False
+        return True
+
+    def compact(self, d):
+        return True
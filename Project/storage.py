@@ -0,0 +1,341 @@
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+
+import journal
+import read
+import sales_ledger
+import snapshot
+import store
+import write
+
+#Inventory files with these extensions are kept in an SQLite database
+DATABASE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+#Tables and indexes of the database, created when it is first opened
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    qty INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    origin TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_name_brand ON products (name, brand);
+CREATE TABLE IF NOT EXISTS sales (
+    kind TEXT NOT NULL,
+    time TEXT NOT NULL,
+    day TEXT NOT NULL,
+    party TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    free INTEGER NOT NULL,
+    amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sales_day ON sales (kind, day);
+CREATE INDEX IF NOT EXISTS sales_product ON sales (kind, product_id, day);
+CREATE INDEX IF NOT EXISTS sales_party ON sales (kind, party);
+CREATE TABLE IF NOT EXISTS markers (
+    record TEXT PRIMARY KEY
+);
+"""
+
+#Statements run for every checkout and restock, sqlite3 keeps them prepared in its statement cache
+SELECT_PRODUCTS = "SELECT id, name, brand, qty, price, origin FROM products ORDER BY id"
+INSERT_PRODUCT = "INSERT INTO products (id, name, brand, qty, price, origin) VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_NEW_PRODUCT = "INSERT OR IGNORE INTO products (id, name, brand, qty, price, origin) VALUES (?, ?, ?, 0, ?, ?)"
+UPDATE_QTY = "UPDATE products SET qty = qty + ? WHERE id = ?"
+INSERT_MARKER = "INSERT OR IGNORE INTO markers (record) VALUES (?)"
+SELECT_MARKER = "SELECT 1 FROM markers WHERE record = ?"
+INSERT_SALE = ("INSERT INTO sales (kind, time, day, party, product_id, units, free, amount) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+#Queries building each rollup of the sales ledger, grouped by its key
+ROLLUP_QUERIES = {
+    "day": "SELECT kind || '|' || day, SUM(units), SUM(free), SUM(amount), COUNT(*) FROM sales GROUP BY kind, day",
+    "product": ("SELECT kind || '|' || product_id, SUM(units), SUM(free), SUM(amount), COUNT(*) FROM sales "
+                "GROUP BY kind, product_id"),
+    "product_day": ("SELECT kind || '|' || product_id || '|' || day, SUM(units), SUM(free), SUM(amount), COUNT(*) "
+                    "FROM sales GROUP BY kind, product_id, day"),
+    "phone": ("SELECT kind || '|' || party, SUM(units), SUM(free), SUM(amount), COUNT(*) FROM sales "
+              "GROUP BY kind, party"),
+}
+
+#Databases already opened, one backend per file
+_databases = {}
+
+
+#Class for the inventory kept as lines of text
+class TextBackend:
+    """
+    Storage backend keeping the inventory as comma separated lines, one product per line (see
+    read.read_inventory_lines and write.write_inventory_lines).
+
+    Saving rewrites the whole file, so checkouts and restocks are journaled (see journal.InventoryJournal) and
+    the file is only rewritten when the journal is compacted.
+    """
+
+    #Function to read the whole inventory
+    def load(self, file_name):
+        return read.read_inventory_lines(file_name)
+
+    #Function to write the whole inventory to a file
+    def write(self, d, file_name):
+        write.write_inventory_lines(d, file_name)
+
+    #Function to replace the saved inventory with the current one
+    def save(self, d, file_name):
+        """
+        Write the inventory to a temporary file, fsync it and rename it over 'file_name', so a crash never
+        leaves a half written inventory.
+
+        Returns:
+        None
+        """
+        self.write(d, file_name + ".tmp")
+        os.replace(file_name + ".tmp", file_name)
+
+    #Function to get the journal of an inventory file
+    def journal(self, file_name):
+        return journal.InventoryJournal(path=os.path.splitext(file_name)[0] + ".journal", inventory_file=file_name,
+                                        temp_file=file_name + ".compact")
+
+    #Function to get the sales ledger kept in the folder of an inventory file
+    def sales_ledger(self, file_name):
+        folder = os.path.dirname(file_name)
+        return sales_ledger.SalesLedger(os.path.join(folder, sales_ledger.LEDGER_FILE),
+                                        os.path.join(folder, sales_ledger.ROLLUP_FILE))
+
+
+#Class for the inventory kept as a binary columnar snapshot
+class SnapshotBackend(TextBackend):
+    """
+    Storage backend keeping the inventory as a binary columnar snapshot (see snapshot.py), saved and journaled
+    like a text file.
+    """
+
+    def load(self, file_name):
+        return snapshot.load_snapshot(file_name)
+
+    def write(self, d, file_name):
+        snapshot.save_snapshot(d, file_name)
+
+
+#Class for the inventory kept in an SQLite database
+class SqliteBackend(TextBackend):
+    """
+    Storage backend keeping the inventory and the sales ledger in an embedded SQLite database.
+
+    The database runs in WAL mode, so readers never wait for a checkout being written. Products are rows of
+    the 'products' table indexed by ID and by name and brand, and every record of the sales ledger is a row of
+    the 'sales' table indexed by day, product and customer. A checkout or restock is applied by apply() in a
+    single transaction that only updates the rows of the products involved, instead of journaling it to a file
+    that has to be compacted into a rewrite of the whole catalogue.
+
+    Parameters:
+    'path' (str): The database file, created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(DATABASE_SCHEMA)
+
+    #Function to read the whole inventory
+    def load(self, file_name=None):
+        ids = array("q")
+        names = []
+        brands = []
+        qty_col = array("q")
+        price_col = array("q")
+        origins = []
+        with self._lock:
+            for prod_id, name, brand, qty, price, origin in self.connection.execute(SELECT_PRODUCTS):
+                ids.append(prod_id)
+                names.append(name)
+                brands.append(brand)
+                qty_col.append(qty)
+                price_col.append(price)
+                origins.append(origin)
+        return store.InventoryStore.from_columns(ids, names, brands, qty_col, price_col, origins)
+
+    #Function to write the whole inventory to a database file
+    def write(self, d, file_name):
+        database(file_name).save(d, file_name)
+
+    #Function to replace the saved inventory with the current one
+    def save(self, d, file_name=None):
+        """
+        Replace every product row with the current inventory in a single transaction, so readers see either
+        the old or the new inventory.
+
+        Returns:
+        None
+        """
+        ids, names, brands, qty_col, price_col, origins = d.columns()
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM products")
+                self.connection.executemany(INSERT_PRODUCT, zip(ids, names, brands, qty_col, price_col, origins))
+
+    #Function to apply the journal records of a checkout or restock
+    def apply(self, lines):
+        """
+        Apply journal records (see journal.InventoryJournal) to the product rows, all in one transaction.
+        Any other record, such as the 'T,<id>' marker of a stock transfer, is kept in the 'markers' table for
+        has_record().
+
+        Parameters:
+        'lines' (list): 'Q,<id>,<delta>' and 'N,<id>,<name>,<brand>,<price>,<origin>' records.
+
+        Returns:
+        boolean: True if the records were committed, False if nothing was changed.
+        """
+        try:
+            with self._lock:
+                with self.connection:
+                    for line in lines:
+                        fields = line.split(",")
+                        if fields[0] == "Q":
+                            self.connection.execute(UPDATE_QTY, (int(fields[2]), int(fields[1])))
+                        elif fields[0] == "N":
+                            self.connection.execute(INSERT_NEW_PRODUCT, (int(fields[1]), fields[2], fields[3],
+                                                                         int(fields[4]), fields[5]))
+                        else:
+                            self.connection.execute(INSERT_MARKER, (line,))
+            return True
+        except (sqlite3.Error, IndexError, ValueError):
+            return False
+
+    #Function to check if a record was applied
+    def has_record(self, line):
+        with self._lock:
+            return self.connection.execute(SELECT_MARKER, (line,)).fetchone() is not None
+
+    #Function to add sales ledger records to the sales table
+    def insert_sales(self, records):
+        """
+        Insert records of the sales ledger (see sales_ledger.SalesLedger) in one transaction.
+
+        Raises:
+        OSError: If the records could not be written.
+        """
+        rows = []
+        for kind, time, party, prod_id, units, free, amount in records:
+            rows.append((kind, time, time[:10], party, int(prod_id), int(units), int(free), int(amount)))
+        try:
+            with self._lock:
+                with self.connection:
+                    self.connection.executemany(INSERT_SALE, rows)
+        except sqlite3.Error as error:
+            raise OSError(str(error))
+
+    #Function to total up the sales table by the keys of the sales ledger rollups
+    def sales_rollups(self):
+        rollups = {}
+        with self._lock:
+            for name in sales_ledger.ROLLUPS:
+                rollups[name] = {}
+                for key, units, free, amount, lines in self.connection.execute(ROLLUP_QUERIES[name]):
+                    rollups[name][key] = [units, free, amount, lines]
+        return rollups
+
+    #Function to move the write-ahead log into the database file
+    def checkpoint(self):
+        try:
+            with self._lock:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def journal(self, file_name=None):
+        return journal.DatabaseJournal(self)
+
+    def sales_ledger(self, file_name=None):
+        return DatabaseSalesLedger(self)
+
+
+#Class for the sales ledger kept in the database
+class DatabaseSalesLedger(sales_ledger.SalesLedger):
+    """
+    Sales ledger whose records are rows of the 'sales' table of an SQLite backend. The rollups are built with
+    one indexed GROUP BY query each when they are first needed and kept up to date as records arrive, so there
+    is nothing to checkpoint.
+
+    Parameters:
+    'backend' (SqliteBackend): The database.
+    """
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def _load(self):
+        self._rollups = self.backend.sales_rollups()
+
+    def append(self, records):
+        if not records:
+            return
+        with self._lock:
+            self.backend.insert_sales(records)
+            if self._rollups is not None:
+                for record in records:
+                    self._apply(record)
+
+    def checkpoint(self):
+        return True
+
+
+#Function to open a database once per file
+def database(file_name):
+    path = os.path.abspath(file_name)
+    if path not in _databases:
+        _databases[path] = SqliteBackend(path)
+    return _databases[path]
+
+
+#Function to pick the storage backend of an inventory file
+def backend_for(file_name):
+    """
+    Return the storage backend of an inventory file from its name: SqliteBackend for '.db', '.sqlite' and
+    '.sqlite3' files, SnapshotBackend for '.bin' files and TextBackend for anything else.
+
+    Parameters:
+    'file_name' (str): The inventory file.
+
+    Returns:
+    TextBackend: The backend, which loads, saves and journals the inventory.
+    """
+    if file_name.endswith(DATABASE_EXTENSIONS):
+        return database(file_name)
+    if snapshot.is_binary_name(file_name):
+        return SnapshotBackend()
+    return TextBackend()
+
+
+#Function to move an inventory from one backend to another
+def convert(source, target):
+    """
+    Copy the inventory in 'source' to 'target', e.g. from 'inventory.txt' to 'inventory.db'.
+
+    Returns:
+    int: The number of products copied.
+    """
+    d = read.read_inventory(source)
+    backend_for(target).save(d, target)
+    return len(d)
+
+
+#Converting from the command line, e.g. python storage.py inventory.txt inventory.db
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python storage.py <source inventory> <target inventory>")
+        sys.exit(2)
+    print(str(convert(sys.argv[1], sys.argv[2])) + " products copied to " + sys.argv[2] + ".")
@@ -0,0 +1,508 @@
+import bisect
+import itertools
+import operator
+from array import array
+
+import reservations
+
+#Positions of the product fields, same order as a line of inventory.txt
+NAME = 0
+BRAND = 1
+QTY = 2
+PRICE = 3
+ORIGIN = 4
+FIELD_COUNT = 5
+
+#Lines of inventory.txt with one more field start with the product ID, lines without it use their line number
+ID_FIELD_COUNT = FIELD_COUNT + 1
+
+
+#Class for the dict-compatible view of a single product
+class ProductRow:
+    """
+    A light view over one product stored in an InventoryStore.
+
+    It behaves like the old inventory list [name, brand, quantity, price, origin] so code written
+    as d[key][0] or d[key][2] = str(qty) keeps working. Quantity and price are read from and written to
+    the integer columns of the store, so they are only converted to text when asked for.
+
+    Parameters:
+    'store' (InventoryStore): The store holding the product.
+    'row' (int): The row position of the product inside the store columns.
+    """
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field):
+        if isinstance(field, slice):
+            return list(self)[field]
+        return self._store._get_field(self._row, field)
+
+    def __setitem__(self, field, value):
+        self._store._set_field(self._row, field, value)
+
+    def __iter__(self):
+        for field in range(FIELD_COUNT):
+            yield self._store._get_field(self._row, field)
+
+    def __len__(self):
+        return FIELD_COUNT
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+#Class to hold the whole inventory in typed columns
+class InventoryStore:
+    """
+    Array backed inventory where every product is parsed once when it is added.
+
+    Names, brands and origins are kept in plain lists while quantity and price are kept in
+    parallel array('q') columns. The store can be used like the old inventory dictionary
+    (d[prod_id], d.items(), prod_id in d, ...) and also exposes typed accessors such as qty() and price()
+    so the hot paths can work with integers instead of re-parsing strings.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self.ids = array("q")
+        self.names = []
+        self.brands = []
+        self.origins = []
+        self.qty_col = array("q")
+        self.price_col = array("q")
+        self.next_id = 1
+        self.holds = reservations.ReservationLedger()
+
+    #Function to build a store directly from its columns
+    @classmethod
+    def from_columns(cls, ids, names, brands, qty_col, price_col, origins):
+        """
+        Build a store from ready made columns without going through append() for every product.
+
+        Parameters:
+        'ids', 'qty_col', 'price_col' (array): array('q') columns of product ID, quantity and price.
+        'names', 'brands', 'origins' (list): The text columns, in the same row order.
+
+        Returns:
+        InventoryStore: The store owning the given columns.
+        """
+        d = cls()
+        d.ids = ids
+        d.names = names
+        d.brands = brands
+        d.qty_col = qty_col
+        d.price_col = price_col
+        d.origins = origins
+        d._rows = dict(zip(ids, range(len(ids))))
+        d.next_id = max(ids, default=0) + 1
+        return d
+
+    #Function to add a product from its field values
+    def append(self, prod_id, name, brand, qty, price, origin):
+        """
+        Add a new product at the end of the store.
+
+        Parameters:
+        'prod_id' (int): The ID of the product.
+        'name', 'brand', 'origin' (str): Text fields of the product.
+        'qty', 'price' (int or str): Quantity and price, converted to int once here.
+
+        Returns:
+        int: The row position of the product.
+        """
+        row = len(self.ids)
+        self.ids.append(prod_id)
+        self.names.append(name)
+        self.brands.append(brand)
+        self.qty_col.append(int(qty))
+        self.price_col.append(int(price))
+        self.origins.append(origin)
+        self._rows[prod_id] = row
+        if prod_id >= self.next_id:
+            self.next_id = prod_id + 1
+        return row
+
+    #Function to get the row position of a product
+    def _row(self, prod_id):
+        return self._rows[prod_id]
+
+    def _get_field(self, row, field):
+        if field == NAME:
+            return self.names[row]
+        elif field == BRAND:
+            return self.brands[row]
+        elif field == QTY:
+            return str(self.qty_col[row])
+        elif field == PRICE:
+            return str(self.price_col[row])
+        elif field == ORIGIN:
+            return self.origins[row]
+        raise IndexError("product field index out of range")
+
+    def _set_field(self, row, field, value):
+        if field == NAME:
+            self.names[row] = value
+        elif field == BRAND:
+            self.brands[row] = value
+        elif field == QTY:
+            self.qty_col[row] = int(value)
+        elif field == PRICE:
+            self.price_col[row] = int(value)
+        elif field == ORIGIN:
+            self.origins[row] = value
+        else:
+            raise IndexError("product field index out of range")
+
+    #Function to get the row positions of many products at once
+    def rows(self, prod_ids):
+        """
+        Return the row positions of the given products, e.g. to index the columns in bulk.
+
+        Parameters:
+        'prod_ids' (iterable): Product IDs.
+
+        Returns:
+        array: array('q') of row positions in the same order.
+        """
+        return array("q", map(self._row, prod_ids))
+
+    #Typed accessors used by the hot paths
+    def qty(self, prod_id):
+        return self.qty_col[self._row(prod_id)]
+
+    def price(self, prod_id):
+        return self.price_col[self._row(prod_id)]
+
+    def name(self, prod_id):
+        return self.names[self._row(prod_id)]
+
+    def brand(self, prod_id):
+        return self.brands[self._row(prod_id)]
+
+    def origin(self, prod_id):
+        return self.origins[self._row(prod_id)]
+
+    def set_qty(self, prod_id, qty):
+        self.qty_col[self._row(prod_id)] = qty
+
+    def add_qty(self, prod_id, delta):
+        """
+        Change the quantity of a product by 'delta' and return the new quantity.
+        """
+        row = self._row(prod_id)
+        self.qty_col[row] += delta
+        return self.qty_col[row]
+
+    #Function to get the stock not held by any cart
+    def available(self, prod_id):
+        return self.qty_col[self._row(prod_id)] - self.holds.held_qty(prod_id)
+
+    #Function to hold stock for a cart
+    def reserve(self, prod_id, qty, cart_id=reservations.LOCAL_CART):
+        """
+        Hold 'qty' of a product for a cart if that much of it is available. The stock on hand only changes when
+        the cart is checked out with commit_cart().
+
+        Returns:
+        boolean: True if the stock was held, False if less than 'qty' is available.
+        """
+        return self.holds.hold(cart_id, prod_id, qty, self.qty)
+
+    #Function to give back stock held by reserve()
+    def release(self, prod_id, qty, cart_id=reservations.LOCAL_CART):
+        self.holds.release(cart_id, prod_id, qty)
+
+    #Function to give back everything a cart holds
+    def release_cart(self, cart_id=reservations.LOCAL_CART):
+        self.holds.release_cart(cart_id)
+
+    #Function to take the stock of a checked out cart off the stock on hand
+    def commit_cart(self, cart_dict, cart_id=reservations.LOCAL_CART):
+        """
+        Use up the holds of a cart and take the sold quantities off the stock on hand, all or nothing.
+
+        Parameters:
+        'cart_dict' (dict): The cart, where index 2 of each value is the quantity leaving the inventory.
+        'cart_id' (int): The cart holding the stock.
+
+        Returns:
+        boolean: True if the stock was taken, False if a hold had expired and the stock was taken by another cart.
+        """
+        quantities = {}
+        for key in cart_dict:
+            quantities[key] = cart_dict[key][2]
+
+        #Checking and taking the stock under the products' locks, so no other cart holds it in between
+        with self.holds.locked(quantities):
+            on_hand = {}
+            for key in quantities:
+                on_hand[key] = self.qty(key)
+            if not self.holds.commit(cart_id, quantities, on_hand):
+                return False
+            for key in quantities:
+                self.add_qty(key, -quantities[key])
+        return True
+
+    #Function to pick the ID of a new product
+    def new_id(self):
+        """
+        Return an ID no product has, one after the highest ID the store has seen.
+
+        The high-water mark is kept up to date by append(), so no product is looked at here.
+        """
+        return self.next_id
+
+    #Dictionary compatible interface
+    def __getitem__(self, prod_id):
+        return ProductRow(self, self._row(prod_id))
+
+    def __setitem__(self, prod_id, product):
+        if prod_id in self:
+            row = self._row(prod_id)
+            for field in range(FIELD_COUNT):
+                self._set_field(row, field, product[field])
+        else:
+            self.append(prod_id, product[NAME], product[BRAND], product[QTY], product[PRICE], product[ORIGIN])
+
+    def __contains__(self, prod_id):
+        return prod_id in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def keys(self):
+        return self._rows.keys()
+
+    def values(self):
+        for prod_id in self._rows:
+            yield self[prod_id]
+
+    def items(self):
+        for prod_id in self._rows:
+            yield prod_id, self[prod_id]
+
+    def get(self, prod_id, default=None):
+        if prod_id in self:
+            return self[prod_id]
+        return default
+
+    #Function to get the IDs of one page of products
+    def page(self, start, count):
+        """
+        Return the IDs of 'count' products starting at position 'start' in iteration order,
+        without walking the products before them.
+
+        Returns:
+        list: Up to 'count' product IDs.
+        """
+        return list(self.ids[start:start+count])
+
+    #Function to get every column in iteration order
+    def columns(self):
+        """
+        Return the columns of the store in the same order as iterating over it.
+
+        Returns:
+        tuple: (ids, names, brands, qty_col, price_col, origins)
+        """
+        return self.ids, self.names, self.brands, self.qty_col, self.price_col, self.origins
+
+    #Function to list the text fields of every product
+    def text_fields(self):
+        """
+        Yield (prod_id, name, brand, origin) for every product, for building the search indexes (see search.py).
+        Products added while this runs may be left out, they are indexed by search.add_product.
+        """
+        for row in range(len(self.ids)):
+            yield self.ids[row], self.names[row], self.brands[row], self.origins[row]
+
+    #Function to turn a product back into an inventory.txt line, starting with its ID
+    def line(self, prod_id):
+        row = self._row(prod_id)
+        return ",".join((str(prod_id), self.names[row], self.brands[row], str(self.qty_col[row]),
+                         str(self.price_col[row]), self.origins[row])) + "\n"
+
+
+#Class for an inventory that is decoded lazily from a memory-mapped file
+class MappedInventoryStore(InventoryStore):
+    """
+    InventoryStore over a memory-mapped inventory file where rows are decoded on first use.
+
+    Only the start offset and the ID of every line are known up front. A product is split and parsed the first
+    time its ID is touched (id_validation, the inventory view, the invoice writers, ...), after which it
+    lives in the typed columns like in a normal InventoryStore. Products added later get IDs after the
+    highest ID of the file.
+
+    Parameters:
+    'buffer' (mmap or bytes): The contents of the inventory file.
+    'offsets' (array): Start offset of every line, followed by the end offset of the last line.
+    'line_ids' (array): The product ID of every line, or None if no line has one and the IDs are the line numbers.
+
+    Raises:
+    ValueError: If two lines have the same product ID, like read.read_inventory_lines.
+    """
+
+    def __init__(self, buffer, offsets, line_ids=None):
+        super().__init__()
+        self._buffer = buffer
+        self._offsets = offsets
+        self._line_count = len(offsets) - 1
+        self._line_ids = line_ids
+        self._line_of = None
+        self._added = []
+        if line_ids is None:
+            self.next_id = self._line_count + 1
+        else:
+            self.next_id = max(line_ids, default=0) + 1
+            #IDs written by update_inventory_file are in ascending order and found by bisection, others need a map
+            if not all(map(operator.lt, line_ids, itertools.islice(line_ids, 1, None))):
+                self._line_of = dict(zip(line_ids, range(self._line_count)))
+                if len(self._line_of) != self._line_count:
+                    seen = set()
+                    for prod_id in line_ids:
+                        if prod_id in seen:
+                            raise ValueError("Product ID " + str(prod_id) + " is used twice.")
+                        seen.add(prod_id)
+
+    #Function to find the line of the file holding a product
+    def _line(self, prod_id):
+        """
+        Return the position of the line of a product in the file, -1 if the product is not in the file.
+        """
+        if type(prod_id) is not int:
+            return -1
+        if self._line_ids is None:
+            if 1 <= prod_id <= self._line_count:
+                return prod_id - 1
+            return -1
+        if self._line_of is not None:
+            return self._line_of.get(prod_id, -1)
+        position = bisect.bisect_left(self._line_ids, prod_id)
+        if position < self._line_count and self._line_ids[position] == prod_id:
+            return position
+        return -1
+
+    #Function to decode a line of the file the first time it is needed
+    def _row(self, prod_id):
+        try:
+            return self._rows[prod_id]
+        except KeyError:
+            position = self._line(prod_id)
+            if position < 0:
+                raise
+        product = self._raw_line(position).rstrip("\r\n").split(",")
+        if len(product) == ID_FIELD_COUNT:
+            del product[0]
+        return self.append(prod_id, product[0], product[1], product[2], product[3], product[4])
+
+    def _raw_line(self, position):
+        return self._buffer[self._offsets[position]:self._offsets[position+1]].decode()
+
+    #Products that are not lines of the file are remembered in the order they were added
+    def append(self, prod_id, name, brand, qty, price, origin):
+        row = super().append(prod_id, name, brand, qty, price, origin)
+        if self._line(prod_id) < 0:
+            self._added.append(prod_id)
+        return row
+
+    #Function to check how many rows were decoded so far
+    def decoded_count(self):
+        return len(self._rows)
+
+    def __contains__(self, prod_id):
+        if prod_id in self._rows:
+            return True
+        return self._line(prod_id) >= 0
+
+    def __iter__(self):
+        if self._line_ids is None:
+            yield from range(1, self._line_count+1)
+        else:
+            yield from self._line_ids
+        yield from self._added
+
+    def __len__(self):
+        return self._line_count + len(self._added)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for prod_id in self:
+            yield self[prod_id]
+
+    def items(self):
+        for prod_id in self:
+            yield prod_id, self[prod_id]
+
+    #Lines of the file come first, then the products added after loading
+    def page(self, start, count):
+        if self._line_ids is None:
+            prod_ids = list(range(start+1, min(start+count, self._line_count)+1))
+        else:
+            prod_ids = list(self._line_ids[start:start+count])
+        if len(prod_ids) < count:
+            skip = max(start - self._line_count, 0)
+            prod_ids += self._added[skip:skip + count - len(prod_ids)]
+        return prod_ids
+
+    #Every row has to be decoded to hand out complete columns
+    def columns(self):
+        ids = array("q")
+        names = []
+        brands = []
+        qty_col = array("q")
+        price_col = array("q")
+        origins = []
+        for prod_id in self:
+            row = self._row(prod_id)
+            ids.append(prod_id)
+            names.append(self.names[row])
+            brands.append(self.brands[row])
+            qty_col.append(self.qty_col[row])
+            price_col.append(self.price_col[row])
+            origins.append(self.origins[row])
+        return ids, names, brands, qty_col, price_col, origins
+
+    #Lines that were not decoded are split on the spot without adding them to the columns, so building the
+    #search indexes does not decode the whole file
+    def text_fields(self):
+        for position in range(self._line_count):
+            prod_id = position + 1 if self._line_ids is None else self._line_ids[position]
+            row = self._rows.get(prod_id)
+            if row is not None:
+                yield prod_id, self.names[row], self.brands[row], self.origins[row]
+                continue
+            product = self._raw_line(position).rstrip("\r\n").split(",")
+            if len(product) == ID_FIELD_COUNT:
+                del product[0]
+            yield prod_id, product[0], product[1], product[4]
+        for prod_id in self._added[:]:
+            row = self._rows[prod_id]
+            yield prod_id, self.names[row], self.brands[row], self.origins[row]
+
+    #Untouched rows are written back as they were read without decoding them, lines without an ID get it added
+    def line(self, prod_id):
+        if prod_id not in self._rows:
+            position = self._line(prod_id)
+            if position >= 0:
+                text = self._raw_line(position)
+                if text.count(",") < ID_FIELD_COUNT - 1:
+                    text = str(prod_id) + "," + text
+                if text.endswith("\n"):
+                    return text
+                return text + "\n"
+        return super().line(prod_id)
@@ -0,0 +1,414 @@
+import concurrent.futures
+import os
+import threading
+
+import invoice
+import journal
+import operations
+import read
+import sales_ledger
+import search
+import storage
+
+#File listing the stores, one 'code,inventory file,store name,address' line each
+STORES_FILE = "stores.txt"
+
+#Log of the stock transfers between stores
+TRANSFER_LOG = "transfers.log"
+
+#Largest number of stores queried at the same time
+QUERY_WORKERS = 8
+
+
+#Class for one store and its share of the inventory
+class StoreShard:
+    """
+    One store with its own inventory file, journal and sales ledger, opened the first time it is used.
+
+    Parameters:
+    'code' (str): Short name of the store used on the command line, e.g. 'samakushi'.
+    'inventory_file' (str): The inventory of the store, any file storage.backend_for understands. Every store
+        needs a folder of its own, where its journal and sales ledger are kept too.
+    'name', 'address' (str): Printed at the top of the invoices of the store.
+    """
+
+    def __init__(self, code, inventory_file, name, address):
+        self.code = code
+        self.inventory_file = inventory_file
+        self.name = name
+        self.address = address
+        self.d = None
+        self.journal = None
+        self.ledger = None
+        self._lock = threading.Lock()
+
+    #Function to load the inventory of the store
+    def open(self):
+        """
+        Read the inventory of the store and replay its journal, once.
+
+        Returns:
+        InventoryStore: The inventory of the store.
+        """
+        with self._lock:
+            if self.d is None:
+                backend = storage.backend_for(self.inventory_file)
+                self.journal = backend.journal(self.inventory_file)
+                self.ledger = backend.sales_ledger(self.inventory_file)
+                d = read.read_inventory(self.inventory_file)
+                self.journal.replay(d)
+                self.d = d
+            return self.d
+
+
+#Function to read the list of stores
+def read_stores(file_name=STORES_FILE):
+    """
+    Read the stores from a file with one store per line:
+        code,inventory file,store name,address
+    The address is the rest of the line and may hold commas. Blank lines and lines starting with '#' are skipped.
+
+    Parameters:
+    'file_name' (str): The store list.
+
+    Returns:
+    list: A StoreShard for every store.
+
+    Raises:
+    ValueError: If a line is incomplete, a code is used twice or two stores share a folder.
+    """
+    shards = []
+    codes = set()
+    folders = set()
+    stores_file = open(file_name, "r")
+    for line in stores_file:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(",")
+        if len(fields) < 4:
+            stores_file.close()
+            raise ValueError("Incomplete store line " + repr(line) + " in " + file_name + ".")
+        shard = StoreShard(fields[0].strip(), fields[1].strip(), fields[2].strip(), ",".join(fields[3:]).strip())
+        folder = os.path.dirname(os.path.abspath(shard.inventory_file))
+        if shard.code in codes or folder in folders:
+            stores_file.close()
+            raise ValueError("Every store needs its own code and folder, see " + repr(line) + " in " + file_name + ".")
+        codes.add(shard.code)
+        folders.add(folder)
+        shards.append(shard)
+    stores_file.close()
+    return shards
+
+
+#Class for the routing layer over the stores
+class StoreRouter:
+    """
+    Routes the program to the inventory of one store and works across all of them.
+
+    The inventory is partitioned by store, each store keeping its own inventory file, journal and sales ledger
+    (see StoreShard). activate() points the sales and restock flows, the journal, the sales ledger and the
+    invoice header at one store. find_stock() asks every store for a product at the same time, and transfer()
+    moves stock between two stores atomically with a two-phase commit:
+        1. Prepare: the stock is held in the source store (see reservations.ReservationLedger) so nothing can
+           sell it, the product is found or given an ID in the target store, and a 'P' record is logged.
+        2. Commit: a 'C' record is logged, then each store journals its side of the transfer together with a
+           'T,<transfer>' marker and a 'D' record is logged for it.
+    Every record is fsynced to the transfer log first. At startup recover() aborts transfers that were never
+    decided and finishes decided ones in the stores that have no 'D' record and no marker, so a crash never
+    leaves stock taken from one store and missing from the other, or counted twice.
+
+    The router expects to be the only program changing the stores it opens.
+
+    Parameters:
+    'shards' (list): The stores, see read_stores.
+    'log_path' (str): The transfer log.
+    """
+
+    def __init__(self, shards, log_path=TRANSFER_LOG):
+        self.shards = {}
+        for shard in shards:
+            self.shards[shard.code] = shard
+        self.log_path = log_path
+        self.current = None
+        self._lock = threading.Lock()
+        self._next_transfer = 1
+
+    #Function to find a store by its code
+    def shard(self, code):
+        if code not in self.shards:
+            raise ValueError("Unknown store " + repr(code) + ".")
+        return self.shards[code]
+
+    #Function to serve one store
+    def activate(self, code):
+        """
+        Make one store the store the program works for: its inventory is returned for the sales and restock
+        flows, and the active journal, sales ledger and invoice header become those of the store.
+
+        Returns:
+        InventoryStore: The inventory of the store.
+        """
+        shard = self.shard(code)
+        d = shard.open()
+        journal.active = shard.journal
+        sales_ledger.active = shard.ledger
+        invoice.STORE_NAME = shard.name
+        invoice.STORE_ADDRESS = shard.address
+        self.current = shard
+        return d
+
+    #Function to find the stock of a product in one store
+    def _stock_at(self, shard, name, brand):
+        d = shard.open()
+        prod_id = search.find_product(d, name, brand)
+        if prod_id == 0:
+            return None
+        return shard, prod_id, d.available(prod_id)
+
+    #Function to find the stock of a product in every store
+    def find_stock(self, name, brand):
+        """
+        Ask every store for the available stock of a product, all stores at the same time.
+
+        Parameters:
+        'name', 'brand' (str): The product, matched like search.find_product.
+
+        Returns:
+        list: (StoreShard, product ID, available quantity) for every store that has the product, in the order of
+        the store list.
+        """
+        shards = list(self.shards.values())
+        with concurrent.futures.ThreadPoolExecutor(min(len(shards), QUERY_WORKERS)) as pool:
+            results = list(pool.map(lambda shard: self._stock_at(shard, name, brand), shards))
+        found = []
+        for result in results:
+            if result is not None:
+                found.append(result)
+        return found
+
+    #Function to write a record to the transfer log
+    def _log(self, fields):
+        data = (",".join(str(field) for field in fields) + "\n").encode()
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    #Function to apply the committed transfer in each store
+    def _apply(self, record, done=(), cart_id=None):
+        """
+        Journal both sides of a committed transfer and log a 'D' record for each store.
+
+        Parameters:
+        'record' (list): The 'P' record: P, transfer, source, target, source ID, target ID, quantity, name, brand,
+            price, origin.
+        'done' (set): Codes of the stores that already logged their 'D' record.
+        'cart_id' (int): The cart holding the stock in the source store, None when recovering after a restart.
+
+        Returns:
+        None
+
+        Raises:
+        OSError: If a journal or the log could not be written, the transfer is then finished by recover().
+        """
+        transfer, source, target = record[1], record[2], record[3]
+        source_id, target_id, qty = int(record[4]), int(record[5]), int(record[6])
+        marker = "T," + transfer
+
+        for code in (source, target):
+            shard = self.shard(code)
+            d = shard.open()
+            if code in done:
+                continue
+            #The store journaled its side before a crash but the 'D' record was not logged
+            if shard.journal.contains(marker):
+                self._log(["D", transfer, code])
+                continue
+
+            if code == source:
+                if cart_id is None or not d.commit_cart({source_id: [qty, 0, qty]}, cart_id):
+                    d.add_qty(source_id, -qty)
+                lines = ["Q," + str(source_id) + "," + str(-qty), marker]
+            else:
+                lines = []
+                if target_id not in d:
+                    d.append(target_id, record[7], record[8], 0, record[9], record[10])
+                    search.add_product(d, target_id)
+                    lines.append(",".join(("N", str(target_id), record[7], record[8], record[9], record[10])))
+                    shard.journal.max_id = max(shard.journal.max_id, target_id)
+                d.add_qty(target_id, qty)
+                lines += ["Q," + str(target_id) + "," + str(qty), marker]
+            shard.journal.append(lines)
+            self._log(["D", transfer, code])
+            #Compacting only once the 'D' record is safe
+            shard.journal._commit(d, [])
+
+    #Function to move stock from one store to another
+    def transfer(self, source, target, prod_id, qty):
+        """
+        Move 'qty' of a product from the source store to the target store, all or nothing.
+
+        The product is matched in the target store by name and brand and added to it if it is not there yet.
+
+        Parameters:
+        'source', 'target' (str): Codes of the stores.
+        'prod_id' (int): The product ID in the source store.
+        'qty' (int): The quantity to move.
+
+        Returns:
+        tuple: (moved, message) where moved is True if the transfer was committed.
+        """
+        if source == target:
+            return False, "The stores must be different."
+        source_shard = self.shard(source)
+        target_shard = self.shard(target)
+        source_d = source_shard.open()
+        target_d = target_shard.open()
+        if prod_id not in source_d:
+            return False, "Product ID " + str(prod_id) + " is not in " + source_shard.name + "."
+        if qty < 1:
+            return False, "The quantity must be positive."
+
+        with self._lock:
+            #Phase one: holding the stock and finding the product in the target store
+            cart_id = source_d.holds.open_cart()
+            if not source_d.reserve(prod_id, qty, cart_id):
+                return False, "Only " + str(source_d.available(prod_id)) + " available in " + source_shard.name + "."
+            name = source_d.name(prod_id)
+            brand = source_d.brand(prod_id)
+            target_id = search.find_product(target_d, name, brand)
+            if target_id == 0:
+                target_id = target_d.new_id()
+            transfer = str(self._next_transfer)
+            self._next_transfer += 1
+            record = ["P", transfer, source, target, prod_id, target_id, qty, name, brand, source_d.price(prod_id),
+                      source_d.origin(prod_id)]
+            try:
+                self._log(record)
+            except OSError:
+                source_d.release_cart(cart_id)
+                return False, "The transfer log could not be written."
+
+            #Phase two: deciding, then applying the transfer in both stores
+            try:
+                self._log(["C", transfer])
+            except OSError:
+                source_d.release_cart(cart_id)
+                return False, "The transfer log could not be written."
+            try:
+                self._apply([str(field) for field in record], cart_id=cart_id)
+            except OSError:
+                return True, "Transfer " + transfer + " was committed and will be finished on the next start."
+        return True, (str(qty) + " of " + name + " moved from " + source_shard.name + " to " + target_shard.name
+                      + " (ID " + str(target_id) + ").")
+
+    #Function to finish or abort the transfers cut short by a crash
+    def recover(self):
+        """
+        Read the transfer log, abort the transfers that were prepared but never committed and finish the
+        committed ones in every store that did not apply them yet.
+
+        Returns:
+        int: The number of transfers finished.
+        """
+        prepared = {}
+        committed = set()
+        aborted = set()
+        done = {}
+        try:
+            log_file = open(self.log_path, "r")
+        except FileNotFoundError:
+            return 0
+        for line in log_file:
+            if not line.endswith("\n"):
+                continue
+            fields = line.rstrip("\n").split(",")
+            if fields[0] == "P" and len(fields) == 11:
+                prepared[fields[1]] = fields
+            elif fields[0] == "C":
+                committed.add(fields[1])
+            elif fields[0] == "A":
+                aborted.add(fields[1])
+            elif fields[0] == "D":
+                done.setdefault(fields[1], set()).add(fields[2])
+        log_file.close()
+
+        finished = 0
+        for transfer in prepared:
+            self._next_transfer = max(self._next_transfer, int(transfer) + 1)
+            record = prepared[transfer]
+            if transfer not in committed:
+                if transfer not in aborted:
+                    self._log(["A", transfer])
+            elif len(done.get(transfer, ())) < 2:
+                self._apply(record, done.get(transfer, set()))
+                finished += 1
+        return finished
+
+
+#Function to load the stores if there is a store list
+def load_router(file_name=STORES_FILE):
+    """
+    Read the store list and finish the transfers cut short by a crash.
+
+    Returns:
+    StoreRouter or None: The router, None if there is no store list.
+    """
+    if not os.path.exists(file_name):
+        return None
+    router = StoreRouter(read_stores(file_name))
+    router.recover()
+    return router
+
+
+#Function to show the stock of a product in every store
+def show_stock(router, d):
+    """
+    Ask for a product of the current store and print its available stock in every store.
+
+    Parameters:
+    'router' (StoreRouter): The stores.
+    'd' (InventoryStore): The inventory of the current store.
+
+    Returns:
+    None
+    """
+    prod_id = operations.resolve_product(d, input("Enter the ID or name of the product: "))
+    if prod_id == 0:
+        return
+    print("\n" + operations.prod_pad("Store", 30) + operations.prod_pad("ID", 8) + "Available")
+    print("-"*50)
+    for shard, store_id, available in router.find_stock(d.name(prod_id), d.brand(prod_id)):
+        print(operations.prod_pad(shard.name + " (" + shard.code + ")", 30) + operations.prod_pad(str(store_id), 8)
+              + str(available))
+
+
+#Function to move stock of the current store to another store
+def transfer_stock(router, d):
+    """
+    Ask for a product, a target store and a quantity, and move the stock from the current store to it.
+
+    Parameters:
+    'router' (StoreRouter): The stores, with the current store activated.
+    'd' (InventoryStore): The inventory of the current store.
+
+    Returns:
+    boolean: True if the stock was moved.
+    """
+    prod_id = operations.resolve_product(d, input("Enter the ID or name of the product to transfer: "))
+    if prod_id == 0:
+        return False
+    for code in router.shards:
+        if code != router.current.code:
+            print(code + ": " + router.shards[code].name + ", " + router.shards[code].address)
+    target = input("Enter the code of the store to transfer to: ").strip()
+    try:
+        qty = int(input("Enter the quantity to transfer: "))
+        moved, message = router.transfer(router.current.code, target, prod_id, qty)
+    except ValueError as error:
+        moved, message = False, str(error) if str(error).startswith("Unknown") else "Invalid quantity."
+    print(message)
+    return moved
@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+import batch
+import journal
+import operations
+import promotions
+import sales_ledger
+import store
+
+
+@pytest.fixture
+def d(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "active", journal.InventoryJournal(str(tmp_path / "inventory.journal")))
+    monkeypatch.setattr(sales_ledger, "active", sales_ledger.SalesLedger(str(tmp_path / "sales.ledger"),
+                                                                         str(tmp_path / "sales.rollup")))
+    active = promotions.Promotions(str(tmp_path / "promotions.txt"), clock=lambda: datetime.date(2026, 10, 18))
+    monkeypatch.setattr(promotions, "active", active)
+
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 333, "Switzerland")
+    d.append(3, "Sunscreen", "Nivea", 3, 700, "Germany")
+    return d
+
+
+ORDERS = """# ref,name,phone,product,quantity
+A1,Sita,9800000001,1,2
+A1,Sita,9800000001,2,3
+
+A2,Ram,98000,1,1
+A3,Hari,9800000003,9,1
+A4,Gita,9800000004,1,3
+A4,Gita,9800000004,1,3
+A5,Maya,9800000005,3,1
+A5,Maya,9800000005,1,1
+A6,Asha,9800000006,2,0
+A7,Binod,9800000007,2,x
+"""
+
+
+def test_read_orders_groups_lines(tmp_path):
+    file_name = tmp_path / "orders.csv"
+    file_name.write_text(ORDERS)
+    orders = list(batch.read_orders(str(file_name)))
+
+    assert [order["ref"] for order in orders] == ["A1", "A2", "A3", "A4", "A5", "A6", "A7"]
+    assert orders[0]["items"] == [["1", "2"], ["2", "3"]]
+    assert orders[0]["phone"] == "9800000001"
+
+
+def test_process_orders_totals_match_calculate_total(tmp_path, d):
+    file_name = tmp_path / "orders.csv"
+    file_name.write_text(ORDERS)
+    sales, rejected = batch.process_orders(d, batch.read_orders(str(file_name)), invoices=False)
+
+    assert [sale[0] for sale in sales] == ["A1", "A4"]
+    #A4 buys 6 of product 1 and gets 2 free, A5 then finds too little of it left
+    assert sales[1][1] == {1: [6, 2, 8]}
+    assert [reject[0] for reject in rejected] == ["A2", "A3", "A5", "A6", "A7"]
+    assert d.qty(1) == 0
+    assert d.qty(2) == 16
+    assert d.qty(3) == 3
+
+    for ref, cart_dict, billing_info in sales:
+        expected = operations.calculate_total(d, cart_dict, "sell")
+        assert [billing_info["total"], billing_info["vat"], billing_info["grand_total"]] == list(expected)
+
+
+def test_process_orders_journals_and_records_the_batch(tmp_path, d):
+    orders = [{"ref": "B1", "name": "Sita", "phone": "9800000001", "items": [["1", "1"], ["2", "2"]]},
+              {"ref": "B2", "name": "Ram", "phone": "9800000002", "items": [["2", "1"]]}]
+    sales, rejected = batch.process_orders(d, orders, invoices=False)
+    assert len(sales) == 2 and not rejected
+
+    restarted = store.InventoryStore()
+    restarted.append(1, "Serum", "Garnier", 10, 500, "France")
+    restarted.append(2, "Cleanser", "Cetaphil", 20, 333, "Switzerland")
+    restarted.append(3, "Sunscreen", "Nivea", 3, 700, "Germany")
+    journal.active.replay(restarted)
+    assert [restarted.qty(prod_id) for prod_id in (1, 2, 3)] == [d.qty(1), d.qty(2), d.qty(3)]
+
+    with open(sales_ledger.active.path) as ledger_file:
+        assert len(ledger_file.readlines()) == 3
+
+
+def test_process_orders_with_nothing_sold(d):
+    sales, rejected = batch.process_orders(d, [{"ref": "C1", "name": "Sita", "phone": "1", "items": []}],
+                                           invoices=False)
+    assert sales == []
+    assert rejected[0][0] == "C1"
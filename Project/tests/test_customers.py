@@ -0,0 +1,101 @@
+import os
+import random
+
+import pytest
+
+import customers
+
+
+@pytest.fixture
+def small_index(monkeypatch):
+    monkeypatch.setattr(customers, "INITIAL_SLOTS", 16)
+
+
+#Function to open a directory in a folder
+def open_directory(tmp_path):
+    return customers.CustomerDirectory(str(tmp_path / "customers.dat"), str(tmp_path / "customers.idx"))
+
+
+#Function to make up distinct phone numbers
+def random_phones(generator, count):
+    return ["98" + str(number).rjust(8, "0") for number in generator.sample(range(10**8), count)]
+
+
+def test_find_after_the_index_grows(tmp_path, small_index):
+    phones = random_phones(random.Random(1), 2000)
+    directory = open_directory(tmp_path)
+    assert directory.find(phones[0]) is None
+    assert directory.remember_all([(phone, "Customer " + phone, number + 1) for number, phone in enumerate(phones)])
+    assert directory._slots >= 4096
+    assert directory._used == 2000
+
+    for number, phone in enumerate(phones):
+        assert directory.find(phone) == {"phone": phone, "visits": 1, "invoice_no": number + 1,
+                                         "name": "Customer " + phone}
+    assert directory.find("9700000000") is None
+    directory.close()
+
+    reopened = open_directory(tmp_path)
+    for number, phone in enumerate(phones):
+        assert reopened.find(phone)["invoice_no"] == number + 1
+    reopened.close()
+
+
+def test_history_follows_every_visit(tmp_path, small_index):
+    generator = random.Random(2)
+    phones = random_phones(generator, 40)
+    directory = open_directory(tmp_path)
+    expected = {}
+    for invoice_no in range(1, 401):
+        phone = generator.choice(phones)
+        assert directory.remember(phone, "Name, " + str(invoice_no), invoice_no)
+        expected.setdefault(phone, []).insert(0, invoice_no)
+
+    for phone in expected:
+        assert directory.history(phone, None) == expected[phone]
+        assert directory.history(phone) == expected[phone][:customers.HISTORY_SIZE]
+        record = directory.find(phone)
+        assert record["visits"] == len(expected[phone])
+        assert record["name"] == "Name  " + str(expected[phone][0])
+    assert directory.history("9700000000") == []
+    directory.close()
+
+
+def test_records_written_after_the_index_are_caught_up(tmp_path, small_index):
+    phones = random_phones(random.Random(3), 30)
+    directory = open_directory(tmp_path)
+    directory.remember_all([(phone, "Early", 1) for phone in phones[:20]])
+    directory.close()
+
+    #The program stopped after writing records the index does not cover yet, the last one cut short
+    with open(str(tmp_path / "customers.dat"), "ab") as data_file:
+        for phone in phones[20:]:
+            data_file.write((phone + ",1,2,0,Late\n").encode())
+        data_file.write(b"9800000000,1,3,0,To")
+
+    reopened = open_directory(tmp_path)
+    for phone in phones:
+        assert reopened.find(phone) is not None
+    assert reopened.find(phones[25])["name"] == "Late"
+    assert reopened.find("9800000000") is None
+    reopened.close()
+
+
+def test_missing_or_damaged_index_is_rebuilt(tmp_path, small_index):
+    phones = random_phones(random.Random(4), 100)
+    directory = open_directory(tmp_path)
+    directory.remember_all([(phone, "Customer", number) for number, phone in enumerate(phones)])
+    directory.remember(phones[0], "Customer", 500)
+    directory.close()
+
+    os.remove(str(tmp_path / "customers.idx"))
+    reopened = open_directory(tmp_path)
+    assert reopened.history(phones[0]) == [500, 0]
+    assert reopened.find(phones[99])["invoice_no"] == 99
+    reopened.close()
+
+    with open(str(tmp_path / "customers.idx"), "r+b") as index_file:
+        index_file.write(b"garbage!")
+    reopened = open_directory(tmp_path)
+    assert reopened.find(phones[50])["invoice_no"] == 50
+    reopened.close()
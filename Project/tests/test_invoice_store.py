@@ -0,0 +1,120 @@
+import os
+import threading
+
+import pytest
+
+import invoice_store
+import money
+
+
+#Function to build the billing info of an invoice
+def billing_info(total, time="2026-10-18 10:15:00.000000"):
+    return {"time": time, "total": money.Money(total), "grand_total": money.Money(total + (total*13 + 50)//100)}
+
+
+def test_numbers_follow_on_across_restarts(tmp_path):
+    root = str(tmp_path / "invoices")
+    assert invoice_store.InvoiceStore(root).allocate() == 1
+    assert invoice_store.InvoiceStore(root).allocate() == 2
+
+    #A batch takes a block of numbers, the next restart carries on after it
+    assert invoice_store.InvoiceStore(root).allocate(5) == 3
+    assert invoice_store.InvoiceStore(root).allocate() == 8
+
+
+def test_numbers_are_unique_between_threads_and_stores(tmp_path):
+    root = str(tmp_path / "invoices")
+    stores = [invoice_store.InvoiceStore(root) for _ in range(4)]
+    numbers = []
+    numbers_lock = threading.Lock()
+
+    #Function to take numbers one at a time and in blocks
+    def take(active):
+        taken = []
+        for count in (1, 3, 1, 2)*10:
+            first = active.allocate(count)
+            taken.extend(range(first, first + count))
+        with numbers_lock:
+            numbers.extend(taken)
+
+    threads = [threading.Thread(target=take, args=(stores[number % 4],)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(numbers) == list(range(1, 8*70 + 1))
+
+
+def test_saved_invoices_are_sharded_and_indexed(tmp_path):
+    root = str(tmp_path / "invoices")
+    active = invoice_store.InvoiceStore(root)
+    first = active.allocate(2)
+    path = active.save(first, invoice_store.SELL, "Invoice one\n", billing_info(1000), "9800000001")
+    active.save(first + 1, invoice_store.RESTOCK, "Invoice two\n", billing_info(2500, "2026-01-02 08:00:00"))
+
+    assert path == os.path.join(root, "2026", "10", "18", "INV-00000001.txt")
+    assert active.read_invoice(first) == "Invoice one\n"
+
+    #A restarted store reads the index back
+    restarted = invoice_store.InvoiceStore(root)
+    record = restarted.lookup(first + 1)
+    assert record["kind"] == invoice_store.RESTOCK
+    assert record["path"] == os.path.join(root, "2026", "01", "02", "INV-00000002.txt")
+    assert record["total"] == 2500
+    assert restarted.lookup(first)["phone"] == "9800000001"
+    assert restarted.read_invoice(first + 1) == "Invoice two\n"
+    assert restarted.lookup(99) is None
+    assert restarted.read_invoice(99) is None
+
+
+def test_torn_index_line_is_ignored(tmp_path):
+    root = str(tmp_path / "invoices")
+    active = invoice_store.InvoiceStore(root)
+    active.save(active.allocate(), invoice_store.SELL, "Invoice one\n", billing_info(1000))
+    with open(active.index_file, "a") as index_file:
+        index_file.write("2,S,2026/10/18/INV-00000002.txt,,10")
+
+    restarted = invoice_store.InvoiceStore(root)
+    assert restarted.lookup(1) is not None
+    assert restarted.lookup(2) is None
+
+
+def test_archived_invoices_are_read_back(tmp_path):
+    root = str(tmp_path / "invoices")
+    active = invoice_store.InvoiceStore(root, archive=True, segment_size=600)
+    texts = {}
+    for _ in range(20):
+        invoice_no = active.allocate()
+        texts[invoice_no] = "Invoice " + str(invoice_no) + "\n" + ("Serum x 3\n"*invoice_no)
+        location = active.save(invoice_no, invoice_store.SELL, texts[invoice_no], billing_info(invoice_no*100))
+        assert "@" in location
+
+    #Small segments fill up quickly, so the invoices are spread over several files
+    segments = os.listdir(active.segment_dir)
+    assert len(segments) > 1
+    assert not os.path.exists(os.path.join(root, "2026"))
+
+    restarted = invoice_store.InvoiceStore(root, archive=True, segment_size=600)
+    for invoice_no in texts:
+        assert restarted.read_invoice(invoice_no) == texts[invoice_no]
+    assert restarted.lookup(7)["total"] == 700
+
+    #New invoices go on in the last segment instead of starting over at the first
+    invoice_no = restarted.allocate()
+    location = restarted.save(invoice_no, invoice_store.SELL, "Late invoice\n", billing_info(100))
+    assert max(segments) in location
+    assert invoice_store.InvoiceStore(root).read_invoice(invoice_no) == "Late invoice\n"
+
+
+def test_damaged_segment_record_is_reported(tmp_path):
+    root = str(tmp_path / "invoices")
+    active = invoice_store.InvoiceStore(root, archive=True)
+    active.save(active.allocate(), invoice_store.SELL, "Invoice one\n", billing_info(1000))
+    active.save(active.allocate(), invoice_store.SELL, "Invoice two\n", billing_info(2000))
+
+    #Pointing invoice 2 at the record of invoice 1
+    with open(active.index_file, "a") as index_file:
+        index_file.write("2,S,segments/seg-000001.dat@0,,2000,2260\n")
+    with pytest.raises(ValueError):
+        invoice_store.InvoiceStore(root, archive=True).read_invoice(2)
@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+import journal
+import read
+import store
+import write
+
+
+#Class for the crash simulated in the middle of a compaction
+class Crash(Exception):
+    pass
+
+
+#Function to build a small inventory
+def small_inventory():
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+    d.append(3, "Sunscreen", "Nivea", 30, 700, "Germany")
+    return d
+
+
+#Function to write an inventory and open an empty journal next to it
+def new_journal(tmp_path, d):
+    inventory_file = str(tmp_path / "inventory.txt")
+    write.update_inventory_file(d, inventory_file)
+    return journal.InventoryJournal(str(tmp_path / "inventory.journal"), 1000, inventory_file,
+                                    str(tmp_path / "inventory.txt.compact"))
+
+
+#Function to sell and restock a few products, journaling every change
+def make_changes(active, d):
+    d.add_qty(1, -4)
+    assert active.record_sale(d, {1: [4, 0, 4]})
+    d.append(4, "Toner", "Dove", 0, 250, "India")
+    d.add_qty(4, 6)
+    d.add_qty(2, 5)
+    assert active.record_restock(d, [[4, 6, "Supplier"], [2, 5, "Supplier"]])
+
+
+#Function to read the inventory back and replay the journal as the program does at startup
+def restart(active):
+    d = read.read_inventory(active.inventory_file)
+    active.replay(d)
+    return d
+
+
+#Function to get the quantity of every product
+def quantities(d):
+    return {prod_id: d.qty(prod_id) for prod_id in d.keys()}
+
+
+EXPECTED = {1: 6, 2: 25, 3: 30, 4: 6}
+
+
+def test_replay_applies_the_journal(tmp_path):
+    active = new_journal(tmp_path, small_inventory())
+    d = restart(active)
+    make_changes(active, d)
+
+    restarted = restart(active)
+    assert quantities(restarted) == EXPECTED
+    assert restarted.name(4) == "Toner"
+    assert active.max_id == 4
+
+
+def test_replay_ignores_a_torn_last_line(tmp_path):
+    active = new_journal(tmp_path, small_inventory())
+    make_changes(active, restart(active))
+    with open(active.path, "a") as journal_file:
+        journal_file.write("Q,3,-1")
+
+    assert quantities(restart(active)) == EXPECTED
+
+
+def test_crash_before_the_marker_keeps_the_old_snapshot(tmp_path, monkeypatch):
+    active = new_journal(tmp_path, small_inventory())
+    d = restart(active)
+    make_changes(active, d)
+
+    def append(lines):
+        raise Crash()
+    monkeypatch.setattr(active, "append", append)
+    with pytest.raises(Crash):
+        active.compact(d)
+    monkeypatch.undo()
+
+    assert os.path.exists(active.temp_file)
+    assert quantities(restart(active)) == EXPECTED
+
+
+def test_crash_before_the_rename_replays_every_record(tmp_path, monkeypatch):
+    active = new_journal(tmp_path, small_inventory())
+    d = restart(active)
+    make_changes(active, d)
+
+    def replace(source, target):
+        raise Crash()
+    monkeypatch.setattr(journal.os, "replace", replace)
+    with pytest.raises(Crash):
+        active.compact(d)
+    monkeypatch.undo()
+
+    #The marker is journaled but the new snapshot was never put in place
+    assert active.contains("C")
+    assert os.path.exists(active.temp_file)
+    assert quantities(restart(active)) == EXPECTED
+
+
+def test_crash_before_the_journal_is_emptied_skips_compacted_records(tmp_path, monkeypatch):
+    active = new_journal(tmp_path, small_inventory())
+    d = restart(active)
+    make_changes(active, d)
+
+    def sync_directory(file_name):
+        raise Crash()
+    monkeypatch.setattr(journal, "sync_directory", sync_directory)
+    with pytest.raises(Crash):
+        active.compact(d)
+    monkeypatch.undo()
+
+    assert not os.path.exists(active.temp_file)
+    assert active.contains("Q,1,-4")
+    d = restart(active)
+    assert quantities(d) == EXPECTED
+
+    #Records written after the restart are applied on top of the new snapshot
+    d.add_qty(3, -2)
+    assert active.record_sale(d, {3: [2, 0, 2]})
+    assert quantities(restart(active)) == {1: 6, 2: 25, 3: 28, 4: 6}
+
+
+def test_compaction_empties_the_journal(tmp_path):
+    active = new_journal(tmp_path, small_inventory())
+    d = restart(active)
+    make_changes(active, d)
+
+    assert active.compact(d)
+    assert os.path.getsize(active.path) == 0
+    assert not os.path.exists(active.temp_file)
+    assert active.replay(read.read_inventory(active.inventory_file)) == 0
+    assert quantities(restart(active)) == EXPECTED
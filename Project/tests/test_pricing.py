@@ -0,0 +1,117 @@
+import datetime
+import random
+
+import pytest
+
+import operations
+import pricing
+import promotions
+import store
+
+BRANDS = ["Garnier", "Cetaphil", "Aqualogica", "Nivea", "Dove"]
+
+#Rules covering every kind and scope, with one promotion that has not started yet
+RULES = """bundle,all,*,,,3:1
+percent,brand,Garnier,2026-01-01,2026-12-31,10
+tiered,brand,Nivea,,,5:5;10:15;20:25
+percent,sku,7,,,33
+bundle,sku,7,,,2:1
+tiered,sku,11,,,2:1;4:99
+bundle,brand,Dove,2027-01-01,,5:5
+"""
+
+
+#Function to build a random inventory
+def random_inventory(generator, size):
+    d = store.InventoryStore()
+    for prod_id in range(1, size + 1):
+        d.append(prod_id, "Product " + str(prod_id), generator.choice(BRANDS), generator.randint(0, 500),
+                 generator.randint(1, 5000), "Nepal")
+    return d
+
+
+#Function to build random carts with the promotions applied
+def random_carts(generator, d, count):
+    carts = []
+    for _ in range(count):
+        cart_dict = {}
+        for _ in range(generator.randint(0, 8)):
+            prod_id = generator.randint(1, len(d))
+            cart_dict[prod_id] = operations.apply_offer(d, prod_id, generator.randint(1, 30))
+        carts.append(cart_dict)
+    return carts
+
+
+@pytest.fixture
+def rules(tmp_path, monkeypatch):
+    path = tmp_path / "promotions.txt"
+    path.write_text(RULES)
+    active = promotions.Promotions(str(path), clock=lambda: datetime.date(2026, 10, 18))
+    active.load()
+    monkeypatch.setattr(promotions, "active", active)
+    return active
+
+
+#Function to price carts one by one as the interactive checkout does
+def expected_costs(d, carts):
+    costs = []
+    for cart_dict in carts:
+        costs.append([amount.paisa for amount in operations.calculate_total(d, cart_dict, "sell")])
+    return costs
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_pricing_matches_calculate_total(rules, seed):
+    if pricing.numpy is None:
+        pytest.skip("NumPy is not installed")
+    generator = random.Random(seed)
+    d = random_inventory(generator, 200)
+    carts = random_carts(generator, d, 300)
+
+    costs = [[amount.paisa for amount in costs_list] for costs_list in pricing.price_carts(d, carts)]
+    assert costs == expected_costs(d, carts)
+
+
+def test_vectorized_line_amounts_match_offers(rules):
+    if pricing.numpy is None:
+        pytest.skip("NumPy is not installed")
+    generator = random.Random(42)
+    d = random_inventory(generator, 50)
+    carts = random_carts(generator, d, 100)
+
+    priced = pricing.price_lines(d, carts)
+    expected_amounts = []
+    expected_free = []
+    expected_percents = []
+    for cart_dict in carts:
+        for key in cart_dict:
+            offer = rules.offer(d, key)
+            expected_amounts.append(offer.amount(cart_dict[key][0], d.price(key)*2))
+            expected_free.append(cart_dict[key][1])
+            expected_percents.append(offer.percent(cart_dict[key][0]))
+    assert priced["amount"].tolist() == expected_amounts
+    assert priced["free_qty"].tolist() == expected_free
+    assert priced["percent"].tolist() == expected_percents
+
+
+def test_pricing_without_numpy_matches_calculate_total(rules, monkeypatch):
+    monkeypatch.setattr(pricing, "numpy", None)
+    generator = random.Random(7)
+    d = random_inventory(generator, 100)
+    carts = random_carts(generator, d, 100)
+
+    costs = [[amount.paisa for amount in costs_list] for costs_list in pricing.price_carts(d, carts)]
+    assert costs == expected_costs(d, carts)
+
+
+def test_promotions_reach_the_prices(rules):
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 100, 1000, "France")
+    d.append(7, "Cleanser", "Cetaphil", 100, 333, "Switzerland")
+    carts = [{1: operations.apply_offer(d, 1, 3), 7: operations.apply_offer(d, 7, 3)}]
+
+    assert carts[0] == {1: [3, 1, 4], 7: [3, 1, 4]}
+    #3 at Rs 2000 less 10%, and 3 at Rs 666 less 33% rounded to the paisa
+    total = 540000 + (199800 - (199800*33 + 50)//100)
+    assert pricing.price_carts(d, carts)[0][0].paisa == total
+    assert operations.calculate_total(d, carts[0], "sell")[0].paisa == total
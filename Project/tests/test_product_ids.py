@@ -0,0 +1,84 @@
+import pytest
+
+import read
+import store
+import write
+
+
+#Function to build a small inventory with gaps in its IDs
+def small_inventory():
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+    d.append(5, "Sunscreen", "Nivea", 30, 700, "Germany")
+    d.append(9, "Toner", "Dove", 40, 250, "India")
+    return d
+
+
+#Function to get every product by ID
+def products(d):
+    return {prod_id: (d.name(prod_id), d.qty(prod_id)) for prod_id in d.keys()}
+
+
+#Function to read a text inventory both ways the program does
+def read_both(file_name):
+    return [read.read_inventory(file_name), read.map_inventory(file_name)]
+
+
+def test_ids_survive_a_reload(tmp_path):
+    file_name = str(tmp_path / "inventory.txt")
+    d = small_inventory()
+    write.update_inventory_file(d, file_name)
+
+    for loaded in read_both(file_name):
+        assert products(loaded) == products(d)
+        assert loaded.new_id() == 10
+
+
+def test_ids_stay_after_a_line_is_deleted(tmp_path):
+    file_name = tmp_path / "inventory.txt"
+    write.update_inventory_file(small_inventory(), str(file_name))
+    lines = file_name.read_text().splitlines(True)
+    del lines[1]
+    file_name.write_text("".join(lines))
+
+    for loaded in read_both(str(file_name)):
+        assert sorted(loaded.keys()) == [1, 5, 9]
+        assert loaded.name(5) == "Sunscreen"
+        assert loaded.name(9) == "Toner"
+        #The new product does not take the place of the deleted one
+        prod_id = loaded.new_id()
+        loaded.append(prod_id, "Lotion", "Nivea", 1, 100, "Germany")
+        assert prod_id == 10
+
+    d = read.read_inventory(str(file_name))
+    d.append(d.new_id(), "Lotion", "Nivea", 1, 100, "Germany")
+    write.update_inventory_file(d, str(file_name))
+    assert products(read.read_inventory(str(file_name)))[10] == ("Lotion", 1)
+
+
+def test_ids_stay_when_lines_are_reordered(tmp_path):
+    file_name = tmp_path / "inventory.txt"
+    d = small_inventory()
+    write.update_inventory_file(d, str(file_name))
+    lines = file_name.read_text().splitlines(True)
+    file_name.write_text("".join(reversed(lines)) + "\n")
+
+    for loaded in read_both(str(file_name)):
+        assert products(loaded) == products(d)
+
+
+def test_lines_without_ids_are_numbered_by_line(tmp_path):
+    file_name = tmp_path / "inventory.txt"
+    file_name.write_text("Serum,Garnier,10,500,France\nCleanser,Cetaphil,20,300,Switzerland\n")
+
+    for loaded in read_both(str(file_name)):
+        assert products(loaded) == {1: ("Serum", 10), 2: ("Cleanser", 20)}
+        assert loaded.new_id() == 3
+
+
+def test_repeated_id_is_rejected(tmp_path):
+    file_name = tmp_path / "inventory.txt"
+    file_name.write_text("4,Serum,Garnier,10,500,France\n4,Cleanser,Cetaphil,20,300,Switzerland\n")
+    with pytest.raises(ValueError):
+        read.read_inventory(str(file_name))
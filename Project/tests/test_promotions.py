@@ -0,0 +1,136 @@
+import datetime
+
+import pytest
+
+import promotions
+import store
+
+
+#Class for a day the tests move by hand
+class Calendar:
+    def __init__(self, day):
+        self.day = day
+
+    def __call__(self):
+        return self.day
+
+
+#Function to build a small inventory
+def small_inventory():
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+    d.append(3, "Sunscreen", "Nivea", 30, 700, "Germany")
+    d.append(4, "Micellar Water", "Garnier", 40, 250, "France")
+    return d
+
+
+#Function to load rules from a file
+def load_rules(tmp_path, text, day=datetime.date(2026, 10, 18)):
+    path = tmp_path / "promotions.txt"
+    path.write_text(text)
+    active = promotions.Promotions(str(path), clock=Calendar(day))
+    active.load()
+    return active
+
+
+def test_rules_are_compiled():
+    rule = promotions.Rule("bundle, sku, 7, 2026-01-01, , 3:1")
+    assert (rule.kind, rule.scope, rule.target, rule.buy, rule.free) == ("bundle", "sku", 7, 3, 1)
+    assert rule.start == datetime.date(2026, 1, 1) and rule.end is None
+    assert rule.runs_on(datetime.date(2026, 1, 1))
+    assert not rule.runs_on(datetime.date(2025, 12, 31))
+
+    assert promotions.Rule("percent,brand,L'Oréal Paris,,,15").percents == [15]
+    assert promotions.Rule("tiered,all,*,,,2:5;4:10;5:20").percents == [0, 0, 5, 5, 10, 20]
+
+
+@pytest.mark.parametrize("line", [
+    "bundle,all,*,,,3",
+    "bundle,all,*,,,0:1",
+    "bundle,all,*,,,3:0",
+    "percent,all,*,,,0",
+    "percent,all,*,,,100",
+    "tiered,all,*,,,5:5;5:10",
+    "tiered,all,*,,,10:5;2:10",
+    "tiered,all,*,,," + str(promotions.MAX_TIER_QTY + 1) + ":5",
+    "discount,all,*,,,10",
+    "percent,shelf,*,,,10",
+    "percent,sku,serum,,,10",
+    "percent,all,*,2026-13-01,,10",
+    "percent,all,*,,10",
+])
+def test_invalid_rules_are_rejected(line):
+    with pytest.raises(ValueError):
+        promotions.Rule(line)
+
+
+def test_load_names_the_bad_line(tmp_path):
+    with pytest.raises(ValueError) as error:
+        load_rules(tmp_path, "# rules\nbundle,all,*,,,3:1\n\npercent,all,*,,,200\n")
+    assert "line 4" in str(error.value)
+
+
+def test_offer_terms():
+    offer = promotions.Offer(promotions.Rule("bundle,all,*,,,3:1"), promotions.Rule("tiered,all,*,,,5:5;10:15"))
+    assert offer.apply(7) == [7, 2, 9]
+    assert [offer.percent(qty) for qty in (1, 4, 5, 9, 10, 500)] == [0, 0, 5, 5, 15, 15]
+    #10 at Rs 333 less 15%, rounded to the nearest paisa
+    assert offer.amount(10, 333) == 333000 - (333000*15 + 50)//100
+    assert promotions.Offer().apply(7) == [7, 0, 7]
+    assert promotions.Offer().amount(3, 100) == 30000
+
+
+@pytest.mark.parametrize("terms", ["3:1", "2:1", "1:1", "5:2", "4:5"])
+def test_max_base_qty_is_the_largest_quantity_in_stock(terms):
+    offer = promotions.Offer(promotions.Rule("bundle,all,*,,," + terms))
+    for available_qty in range(-2, 60):
+        expected = 0
+        for sell_qty in range(available_qty + 1):
+            if offer.apply(sell_qty)[2] <= available_qty:
+                expected = sell_qty
+        assert offer.max_base_qty(available_qty) == expected
+    assert promotions.Offer().max_base_qty(7) == 7
+    assert promotions.Offer().max_base_qty(-1) == 0
+
+
+def test_most_specific_scope_wins(tmp_path):
+    d = small_inventory()
+    active = load_rules(tmp_path, """bundle,all,*,,,3:1
+percent,all,*,,,5
+percent,brand,  GARNIER ,,,10
+bundle,sku,4,,,2:1
+percent,sku,2,,,20
+percent,sku,2,,,25
+""")
+    offers = {prod_id: active.offer(d, prod_id) for prod_id in range(1, 5)}
+    assert [(offer.buy, offer.free, offer.percents) for offer in offers.values()] == [
+        (3, 1, [10]), (3, 1, [25]), (3, 1, [5]), (2, 1, [10])]
+    #The offer of a product is compiled once per day
+    assert active.offer(d, 1) is offers[1]
+    assert active.offers_for(d, [2, 3]) == {2: offers[2], 3: offers[3]}
+
+
+def test_promotions_start_and_end_on_their_own(tmp_path):
+    d = small_inventory()
+    active = load_rules(tmp_path, """bundle,all,*,,2026-10-18,3:1
+percent,brand,Nivea,2026-10-19,2026-10-20,30
+""")
+    assert active.offer(d, 3).buy == 3
+    assert active.offer(d, 3).percents == [0]
+
+    active.clock.day = datetime.date(2026, 10, 19)
+    assert active.offer(d, 3).buy == 0
+    assert active.offer(d, 3).percents == [30]
+
+    active.clock.day = datetime.date(2026, 10, 21)
+    assert active.offer(d, 3).percents == [0]
+
+
+def test_default_rules_without_a_file(tmp_path):
+    active = promotions.Promotions(str(tmp_path / "missing.txt"))
+    assert active.load() == 1
+    offer = active.offer(small_inventory(), 2)
+    assert offer.apply(6) == [6, 2, 8]
+    assert offer.max_base_qty(8) == 6
+    assert offer.max_base_qty(7) == 5
@@ -0,0 +1,141 @@
+import random
+import threading
+
+import reservations
+import store
+
+
+#Class for a clock the tests move by hand
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+#Function to build an inventory whose holds use a hand moved clock
+def small_inventory(clock=None):
+    d = store.InventoryStore()
+    if clock is not None:
+        d.holds = reservations.ReservationLedger(ttl=60, clock=clock)
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+    return d
+
+
+def test_holds_change_the_available_stock():
+    d = small_inventory(Clock())
+    cart_id = d.holds.open_cart()
+    assert d.reserve(1, 4, cart_id)
+    assert d.reserve(1, 3)
+    assert not d.reserve(1, 4)
+    assert d.qty(1) == 10
+    assert d.available(1) == 3
+    assert d.holds.cart_holds(cart_id) == {1: 4}
+
+    d.release(1, 1, cart_id)
+    assert d.available(1) == 4
+    assert d.holds.release_cart(cart_id) == {1: 3}
+    assert d.available(1) == 7
+    assert not d.reserve(1, 0)
+
+
+def test_expired_holds_are_swept():
+    clock = Clock()
+    d = small_inventory(clock)
+    first = d.holds.open_cart()
+    second = d.holds.open_cart()
+    assert d.reserve(1, 6, first)
+    assert d.reserve(2, 5, first)
+    clock.now = 30
+    assert d.reserve(1, 4, second)
+
+    #Touching the first cart keeps it alive past the expiry of its holds
+    clock.now = 50
+    d.holds.touch(first)
+    clock.now = 100
+    assert d.holds.sweep() == [(second, 1, 4)]
+    assert d.available(1) == 4
+
+    clock.now = 111
+    assert sorted(d.holds.sweep()) == [(first, 1, 6), (first, 2, 5)]
+    assert d.available(1) == 10
+    assert d.holds.held == {}
+    assert d.holds.carts == {}
+
+
+def test_hold_sweeps_when_short():
+    clock = Clock()
+    d = small_inventory(clock)
+    stale = d.holds.open_cart()
+    assert d.reserve(1, 8, stale)
+    assert not d.reserve(1, 5)
+    clock.now = 61
+    assert d.reserve(1, 5)
+    assert d.holds.cart_qty(stale, 1) == 0
+
+
+def test_commit_takes_the_stock_on_hand():
+    clock = Clock()
+    d = small_inventory(clock)
+    cart_id = d.holds.open_cart()
+    assert d.reserve(1, 3, cart_id)
+    assert d.commit_cart({1: [3, 1, 4]}, cart_id)
+    assert d.qty(1) == 6
+    assert d.available(1) == 6
+    assert d.holds.cart_holds(cart_id) == {}
+
+
+def test_commit_after_expiry():
+    clock = Clock()
+    d = small_inventory(clock)
+    slow = d.holds.open_cart()
+    assert d.reserve(1, 6, slow)
+    clock.now = 61
+    d.holds.sweep()
+
+    #The stock is still there, so the slow cart can be sold
+    assert d.commit_cart({1: [2, 0, 2]}, slow)
+    assert d.qty(1) == 8
+
+    #Once another cart holds it, the sale is refused and nothing changes
+    assert d.reserve(1, 5)
+    assert not d.commit_cart({1: [4, 0, 4]}, slow)
+    assert d.qty(1) == 8
+    assert d.available(1) == 3
+
+
+def test_concurrent_reserve_and_commit_never_oversell():
+    d = small_inventory()
+    sold = []
+    sold_lock = threading.Lock()
+
+    #Function to play one till
+    def till(seed):
+        generator = random.Random(seed)
+        for _ in range(300):
+            cart_id = d.holds.open_cart()
+            cart = {}
+            for prod_id in (1, 2):
+                qty = generator.randint(1, 3)
+                if d.reserve(prod_id, qty, cart_id):
+                    cart[prod_id] = [qty, 0, qty + generator.randint(0, 1)]
+            if generator.random() < 0.3:
+                d.release_cart(cart_id)
+            elif cart and d.commit_cart(cart, cart_id):
+                with sold_lock:
+                    sold.append(cart)
+            d.release_cart(cart_id)
+
+    threads = [threading.Thread(target=till, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for prod_id, stock in ((1, 10), (2, 20)):
+        total_sold = sum(cart[prod_id][2] for cart in sold if prod_id in cart)
+        assert d.qty(prod_id) == stock - total_sold
+        assert d.qty(prod_id) >= 0
+        assert d.holds.held_qty(prod_id) == 0
@@ -0,0 +1,123 @@
+import datetime
+import os
+import random
+
+import pytest
+
+import sales_ledger
+
+
+#Function to build random ledger records
+def random_records(generator, count):
+    records = []
+    for _ in range(count):
+        day = datetime.date(2026, 10, generator.randint(1, 18))
+        kind = generator.choice([sales_ledger.SALE, sales_ledger.SALE, sales_ledger.RESTOCK])
+        units = generator.randint(1, 9)
+        records.append([kind, day.isoformat() + " 10:15:00", "98000000" + str(generator.randint(10, 14)),
+                        str(generator.randint(1, 6)), str(units), str(units//4), str(units*generator.randint(100, 900))])
+    return records
+
+
+#Function to open a ledger in a folder
+def open_ledger(folder):
+    return sales_ledger.SalesLedger(str(folder / "sales.ledger"), str(folder / "sales.rollup"))
+
+
+#Function to build the ledger of some records in a new folder
+def ledger_of(folder, records):
+    folder.mkdir()
+    ledger = open_ledger(folder)
+    ledger.append(records)
+    return ledger
+
+
+#Function to get every rollup as plain lists
+def rollups(ledger):
+    ledger.totals("day", "")
+    return {name: {key: list(totals) for key, totals in ledger._rollups[name].items()}
+            for name in sales_ledger.ROLLUPS}
+
+
+#Function to add up records the slow way
+def expected_totals(records, kind, prod_id, start, end):
+    result = [0, 0, 0, 0]
+    for record in records:
+        day = datetime.date.fromisoformat(record[1][:10])
+        if record[0] == kind and record[3] == str(prod_id) and start <= day <= end:
+            for field in range(3):
+                result[field] += int(record[4 + field])
+            result[3] += 1
+    return result
+
+
+def test_rollups_match_the_records(tmp_path):
+    records = random_records(random.Random(1), 400)
+    ledger = open_ledger(tmp_path)
+    ledger.append(records[:150])
+    #Loading on the first query, then keeping up with every append
+    ledger.totals("day", "")
+    ledger.append(records[150:])
+
+    start = datetime.date(2026, 10, 3)
+    end = datetime.date(2026, 10, 12)
+    for prod_id in range(1, 7):
+        for kind in (sales_ledger.SALE, sales_ledger.RESTOCK):
+            assert ledger.product_totals(prod_id, start, end, kind) == expected_totals(records, kind, prod_id,
+                                                                                        start, end)
+    assert ledger.product_totals(3) == expected_totals(records, sales_ledger.SALE, 3, datetime.date.min,
+                                                       datetime.date.max)
+    with pytest.raises(ValueError):
+        ledger.product_totals(3, start)
+    assert rollups(open_ledger(tmp_path)) == rollups(ledger)
+
+
+def test_checkpoint_recovery(tmp_path):
+    records = random_records(random.Random(2), 300)
+    ledger = open_ledger(tmp_path)
+    ledger.append(records[:200])
+    assert ledger.checkpoint()
+    ledger.append(records[200:])
+
+    #A restart loads the checkpoint and only reads the records written after it
+    restarted = open_ledger(tmp_path)
+    assert rollups(restarted) == rollups(ledger)
+    assert restarted._offset == os.path.getsize(ledger.path)
+
+    #Without the checkpoint the whole ledger is read, with the same result
+    os.remove(ledger.rollup_path)
+    assert rollups(open_ledger(tmp_path)) == rollups(ledger)
+
+
+def test_torn_last_record_is_read_once_finished(tmp_path):
+    records = random_records(random.Random(3), 20)
+    ledger = open_ledger(tmp_path)
+    ledger.append(records[:19])
+    line = ",".join(records[19]) + "\n"
+    with open(ledger.path, "a") as ledger_file:
+        ledger_file.write(line[:10])
+
+    restarted = open_ledger(tmp_path)
+    assert rollups(restarted) == rollups(ledger_of(tmp_path / "torn", records[:19]))
+    assert restarted.checkpoint()
+
+    with open(ledger.path, "a") as ledger_file:
+        ledger_file.write(line[10:])
+    assert rollups(open_ledger(tmp_path)) == rollups(ledger_of(tmp_path / "finished", records))
+
+
+def test_stale_or_damaged_checkpoint_is_ignored(tmp_path):
+    records = random_records(random.Random(4), 50)
+    ledger = open_ledger(tmp_path)
+    ledger.append(records)
+    assert ledger.checkpoint()
+
+    #The ledger was replaced by a shorter one, the checkpoint covers more than it holds
+    os.remove(ledger.path)
+    open_ledger(tmp_path).append(records[:5])
+    expected = rollups(ledger_of(tmp_path / "replaced", records[:5]))
+    assert rollups(open_ledger(tmp_path)) == expected
+
+    with open(ledger.rollup_path, "w") as rollup_file:
+        rollup_file.write("{\"offset\": 3")
+    assert rollups(open_ledger(tmp_path)) == expected
@@ -0,0 +1,157 @@
+import json
+import random
+import socket
+import threading
+
+import pytest
+
+import journal
+import service
+import store
+
+STOCK = 50
+
+
+#Function to build a small inventory
+def small_inventory():
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", STOCK, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", STOCK, 300, "Switzerland")
+    d.append(65, "Sunscreen", "Nivea", STOCK, 700, "Germany")
+    return d
+
+
+@pytest.fixture
+def inventory_service(tmp_path):
+    inventory_journal = journal.InventoryJournal(str(tmp_path / "inventory.journal"))
+    return service.InventoryService(small_inventory(), inventory_journal)
+
+
+@pytest.fixture
+def server(inventory_service):
+    server = service.ServiceServer(inventory_service, ("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_checkouts_never_oversell(inventory_service):
+    d = inventory_service.d
+    sold = []
+    sold_lock = threading.Lock()
+
+    #Function to play one till, holding stock and selling it
+    def till(seed):
+        generator = random.Random(seed)
+        for _ in range(40):
+            cart_id = d.holds.open_cart()
+            cart = {}
+            for prod_id in generator.sample([1, 2, 65], 2):
+                qty = generator.randint(1, 4)
+                if inventory_service.reserve(prod_id, qty, cart_id)[0]:
+                    cart[prod_id] = [qty, 0, qty]
+            #Every other sale takes one more than it held, which only works while no other cart holds it
+            if seed % 2 and cart:
+                prod_id = next(iter(cart))
+                cart[prod_id][2] += 1
+            try:
+                if cart and inventory_service.commit(journal.sale_lines(cart), cart_id):
+                    with sold_lock:
+                        sold.append(cart)
+            except service.ServiceError:
+                pass
+            inventory_service.release_cart(cart_id)
+
+    threads = [threading.Thread(target=till, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for prod_id in (1, 2, 65):
+        total_sold = sum(cart[prod_id][2] for cart in sold if prod_id in cart)
+        assert total_sold <= STOCK
+        assert d.qty(prod_id) == STOCK - total_sold
+        assert d.holds.held_qty(prod_id) == 0
+
+    #The journal holds exactly the committed sales
+    restarted = small_inventory()
+    inventory_service.journal.replay(restarted)
+    assert [restarted.qty(prod_id) for prod_id in (1, 2, 65)] == [d.qty(prod_id) for prod_id in (1, 2, 65)]
+
+
+def test_commit_cannot_take_stock_held_by_another_cart(inventory_service):
+    d = inventory_service.d
+    holder = d.holds.open_cart()
+    seller = d.holds.open_cart()
+    assert inventory_service.reserve(1, STOCK - 5, holder) == (True, 5)
+    assert inventory_service.reserve(1, 6, seller) == (False, 5)
+
+    with pytest.raises(service.ServiceError):
+        inventory_service.commit(["Q,1,-6"], seller)
+    assert d.qty(1) == STOCK
+    assert inventory_service.commit(["Q,1,-5"], seller)
+    assert d.qty(1) == STOCK - 5
+    assert inventory_service.commit(["Q,1,-" + str(STOCK - 5)], holder)
+    assert d.qty(1) == 0
+
+
+def test_commit_is_all_or_nothing(inventory_service):
+    d = inventory_service.d
+    with pytest.raises(service.ServiceError):
+        inventory_service.commit(["Q,1,-1", "Q,2,-" + str(STOCK + 1)])
+    with pytest.raises(service.ServiceError):
+        inventory_service.commit(["Q,1,-1", "Q,9,-1"])
+    with pytest.raises(service.ServiceError):
+        inventory_service.commit(["Q,1,-1", "X,1"])
+    assert d.qty(1) == STOCK
+    assert d.qty(2) == STOCK
+
+
+def test_restock_adds_products(inventory_service):
+    prod_id = inventory_service.new_id()
+    assert prod_id == 66
+    assert inventory_service.commit(["N,66,Toner,Dove,250,India", "Q,66,7"])
+    assert inventory_service.product(66) == [66, "Toner", "Dove", 7, 250, "India"]
+    assert inventory_service.new_id() == 67
+
+
+def test_invalid_requests_are_answered(server):
+    connection = socket.create_connection(server.server_address)
+    connection_file = connection.makefile("rwb")
+    responses = []
+    for line in (b"not json\n", b"[1, 2]\n", b"\"qty\"\n", b"{\"op\": \"qty\"}\n", b"{\"op\": \"fly\"}\n",
+                 b"{\"op\": \"reserve\", \"id\": 1, \"qty\": \"x\"}\n", b"{\"op\": \"qty\", \"id\": 1}\n"):
+        connection_file.write(line)
+        connection_file.flush()
+        responses.append(json.loads(connection_file.readline()))
+    connection_file.close()
+    connection.close()
+
+    assert [response["ok"] for response in responses] == [False]*6 + [True]
+    assert responses[0]["error"] == "Invalid request."
+    assert responses[1]["error"] == "Invalid request."
+    assert responses[-1]["qty"] == STOCK
+
+
+def test_tills_share_the_stock(server, inventory_service):
+    clients = [service.ServiceClient(server.server_address) for _ in range(2)]
+    tills = [service.RemoteInventory.connect(client) for client in clients]
+
+    assert tills[0].reserve(1, STOCK - 10)
+    assert tills[1].available(1) == 10
+    assert not tills[1].reserve(1, 11)
+    assert tills[1].reserve(1, 10)
+    assert tills[1].commit_cart({1: [10, 0, 10]})
+    assert tills[0].qty(1) == STOCK - 10
+    assert tills[0].available(1) == 0
+
+    #A till that disconnects gives back what it held
+    clients[0].close()
+    for _ in range(100):
+        if inventory_service.available(1) == STOCK - 10:
+            break
+        threading.Event().wait(0.01)
+    assert tills[1].available(1) == STOCK - 10
+    clients[1].close()
@@ -0,0 +1,99 @@
+import random
+from array import array
+
+import pytest
+
+import read
+import snapshot
+import store
+import write
+
+BRANDS = ["Garnier", "Cetaphil", "Aqualogica", "Nivea", "Dove"]
+ORIGINS = ["Nepal", "India", "Côte d'Ivoire", "日本"]
+
+
+#Function to build a random inventory
+def random_inventory(generator, size):
+    d = store.InventoryStore()
+    for prod_id in range(1, size + 1):
+        d.append(prod_id*3, "Product " + str(generator.randint(1, size)), generator.choice(BRANDS),
+                 generator.randint(0, 500), generator.randint(1, 5000), generator.choice(ORIGINS))
+    return d
+
+
+#Function to get every product as a tuple
+def rows(d):
+    return [(prod_id, d.name(prod_id), d.brand(prod_id), d.qty(prod_id), d.price(prod_id), d.origin(prod_id))
+            for prod_id in d.keys()]
+
+
+@pytest.mark.parametrize("size", [0, 1, 500])
+def test_snapshot_round_trip(tmp_path, size):
+    d = random_inventory(random.Random(size), size)
+    file_name = str(tmp_path / "inventory.bin")
+    snapshot.save_snapshot(d, file_name)
+
+    loaded = snapshot.load_snapshot(file_name)
+    assert rows(loaded) == rows(d)
+    assert loaded.next_id == d.next_id
+
+
+def test_loaded_snapshot_can_change(tmp_path):
+    d = random_inventory(random.Random(1), 10)
+    file_name = str(tmp_path / "inventory.bin")
+    snapshot.save_snapshot(d, file_name)
+
+    loaded = snapshot.load_snapshot(file_name)
+    loaded.add_qty(3, 7)
+    loaded.append(loaded.next_id, "Toner", "Dove", 4, 250, "India")
+    snapshot.save_snapshot(loaded, file_name)
+    assert rows(snapshot.load_snapshot(file_name)) == rows(loaded)
+
+
+def test_binary_and_text_conversions(tmp_path):
+    d = random_inventory(random.Random(2), 50)
+    text_file = str(tmp_path / "inventory.txt")
+    binary_file = str(tmp_path / "inventory.bin")
+    write.update_inventory_file(d, text_file)
+
+    assert snapshot.text_to_binary(text_file, binary_file) == 50
+    assert rows(read.read_inventory(binary_file)) == rows(d)
+    text_file = str(tmp_path / "converted.txt")
+    assert snapshot.binary_to_text(binary_file, text_file) == 50
+    assert rows(read.read_inventory(text_file)) == rows(d)
+
+
+def test_snapshot_from_the_other_byte_order(tmp_path):
+    d = random_inventory(random.Random(3), 20)
+    file_name = str(tmp_path / "inventory.bin")
+    snapshot.save_snapshot(d, file_name)
+
+    #Rewriting the file as a machine of the other byte order would have saved it
+    with open(file_name, "rb") as snapshot_file:
+        data = snapshot_file.read()
+    magic, byte_order, count, string_count = snapshot.SNAPSHOT_HEADER.unpack_from(data)
+    other_order = b"big " if byte_order == b"litt" else b"litt"
+    swapped = bytearray(snapshot.SNAPSHOT_HEADER.pack(magic, other_order, count, string_count))
+    position = snapshot.SNAPSHOT_HEADER.size
+    for typecode in "qqqiii":
+        column = array(typecode)
+        end = position + count*column.itemsize
+        column.frombytes(data[position:end])
+        column.byteswap()
+        swapped += column.tobytes()
+        position = end
+    swapped += data[position:]
+    with open(file_name, "wb") as snapshot_file:
+        snapshot_file.write(swapped)
+
+    assert rows(snapshot.load_snapshot(file_name)) == rows(d)
+
+
+def test_load_rejects_other_files(tmp_path):
+    file_name = tmp_path / "inventory.bin"
+    file_name.write_bytes(b"1,Serum,Garnier,10,500,France\n")
+    with pytest.raises(ValueError):
+        snapshot.load_snapshot(str(file_name))
+    file_name.write_bytes(b"")
+    with pytest.raises(ValueError):
+        snapshot.load_snapshot(str(file_name))
@@ -0,0 +1,102 @@
+import read
+import sales_ledger
+import storage
+import store
+import write
+
+
+#Function to build a small inventory
+def small_inventory():
+    d = store.InventoryStore()
+    d.append(1, "Serum", "Garnier", 10, 500, "France")
+    d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+    d.append(7, "Sunscreen", "Nivea", 30, 700, "Côte d'Ivoire")
+    return d
+
+
+#Function to get every product as a tuple
+def rows(d):
+    return [(prod_id, d.name(prod_id), d.brand(prod_id), d.qty(prod_id), d.price(prod_id), d.origin(prod_id))
+            for prod_id in sorted(d.keys())]
+
+
+def test_backend_is_picked_by_name(tmp_path):
+    assert type(storage.backend_for(str(tmp_path / "inventory.txt"))) is storage.TextBackend
+    assert type(storage.backend_for(str(tmp_path / "inventory.bin"))) is storage.SnapshotBackend
+    backend = storage.backend_for(str(tmp_path / "inventory.db"))
+    assert type(backend) is storage.SqliteBackend
+    assert storage.backend_for(str(tmp_path / "inventory.db")) is backend
+
+
+def test_database_round_trip(tmp_path):
+    file_name = str(tmp_path / "inventory.db")
+    d = small_inventory()
+    write.update_inventory_file(d, file_name)
+    assert rows(read.read_inventory(file_name)) == rows(d)
+
+    #Saving again replaces every row
+    d.add_qty(1, -3)
+    d.append(8, "Toner", "Dove", 4, 250, "India")
+    write.update_inventory_file(d, file_name)
+    loaded = read.read_inventory(file_name)
+    assert rows(loaded) == rows(d)
+    assert loaded.new_id() == 9
+
+
+def test_database_journal_updates_rows(tmp_path):
+    file_name = str(tmp_path / "inventory.db")
+    backend = storage.backend_for(file_name)
+    d = small_inventory()
+    backend.save(d, file_name)
+    inventory_journal = backend.journal(file_name)
+    inventory_journal.replay(d)
+
+    d.add_qty(2, -5)
+    assert inventory_journal.record_sale(d, {2: [4, 1, 5]})
+    d.append(8, "Toner", "Dove", 0, 250, "India")
+    d.add_qty(8, 6)
+    assert inventory_journal.record_restock(d, [[8, 6, "Supplier"]])
+    assert rows(read.read_inventory(file_name)) == rows(d)
+
+    #A bad record leaves every row as it was
+    assert not inventory_journal.record_sale(d, {1: [1, 0, 1], "x": [1, 0, 1]})
+    assert rows(read.read_inventory(file_name)) == rows(d)
+
+    assert inventory_journal.append(["T,42"])
+    assert inventory_journal.contains("T,42")
+    assert not inventory_journal.contains("T,43")
+    assert inventory_journal.compact(d)
+
+
+def test_database_sales_ledger_matches_the_file_ledger(tmp_path):
+    records = [["S", "2026-10-17 09:00:00", "9800000001", "1", "4", "1", "150000"],
+               ["S", "2026-10-18 10:00:00", "9800000001", "2", "2", "0", "120000"],
+               ["R", "2026-10-18 11:00:00", "Supplier", "1", "20", "0", "1000000"],
+               ["S", "2026-10-18 12:00:00", "9800000002", "1", "1", "0", "100000"]]
+    database_ledger = storage.backend_for(str(tmp_path / "inventory.db")).sales_ledger()
+    file_ledger = sales_ledger.SalesLedger(str(tmp_path / "sales.ledger"), str(tmp_path / "sales.rollup"))
+    database_ledger.append(records[:2])
+    file_ledger.append(records[:2])
+    assert database_ledger.totals("day", "S|2026-10-18") == [2, 0, 120000, 1]
+    database_ledger.append(records[2:])
+    file_ledger.append(records[2:])
+
+    #A fresh ledger on the same database builds the rollups with queries
+    reopened = storage.DatabaseSalesLedger(storage.backend_for(str(tmp_path / "inventory.db")))
+    file_ledger.totals("day", "")
+    for ledger in (database_ledger, reopened):
+        for name in sales_ledger.ROLLUPS:
+            for key in file_ledger._rollups[name]:
+                assert ledger.totals(name, key) == file_ledger.totals(name, key)
+        assert ledger.top_products() == file_ledger.top_products()
+
+
+def test_convert_between_backends(tmp_path):
+    d = small_inventory()
+    text_file = str(tmp_path / "inventory.txt")
+    write.update_inventory_file(d, text_file)
+
+    assert storage.convert(text_file, str(tmp_path / "inventory.sqlite")) == 3
+    assert storage.convert(str(tmp_path / "inventory.sqlite"), str(tmp_path / "inventory.bin")) == 3
+    assert storage.convert(str(tmp_path / "inventory.bin"), str(tmp_path / "copy.txt")) == 3
+    assert rows(read.read_inventory(str(tmp_path / "copy.txt"))) == rows(d)
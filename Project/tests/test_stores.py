@@ -0,0 +1,135 @@
+import pytest
+
+import stores
+import store
+import write
+
+
+#Function to write the inventories of two stores and open a router over them
+def open_router(tmp_path, write_inventories=True):
+    shards = []
+    for code in ("a", "b"):
+        folder = tmp_path / code
+        if write_inventories:
+            folder.mkdir()
+            d = store.InventoryStore()
+            if code == "a":
+                d.append(1, "Serum", "Garnier", 10, 500, "France")
+                d.append(2, "Cleanser", "Cetaphil", 20, 300, "Switzerland")
+            else:
+                d.append(1, "Serum", "Garnier", 0, 500, "France")
+            write.update_inventory_file(d, str(folder / "inventory.txt"))
+        shards.append(stores.StoreShard(code, str(folder / "inventory.txt"), "Store " + code, "Kathmandu"))
+    return stores.StoreRouter(shards, str(tmp_path / "transfers.log"))
+
+
+#Function to restart the program on the same files
+def restart(tmp_path):
+    router = open_router(tmp_path, write_inventories=False)
+    finished = router.recover()
+    return router, finished
+
+
+#Function to get the stock of every product in both stores
+def stock(router):
+    result = {}
+    for code in ("a", "b"):
+        d = router.shard(code).open()
+        result[code] = {prod_id: d.qty(prod_id) for prod_id in d.keys()}
+    return result
+
+
+#Function to read the transfer log
+def log_lines(tmp_path):
+    return (tmp_path / "transfers.log").read_text().splitlines()
+
+
+def test_transfer_moves_stock(tmp_path):
+    router = open_router(tmp_path)
+    moved, message = router.transfer("a", "b", 1, 4)
+    assert moved, message
+    moved, message = router.transfer("a", "b", 2, 5)
+    assert moved, message
+    assert stock(router) == {"a": {1: 6, 2: 15}, "b": {1: 4, 2: 5}}
+    assert router.shard("b").open().name(2) == "Cleanser"
+
+    assert not router.transfer("a", "b", 1, 7)[0]
+    assert not router.transfer("a", "a", 1, 1)[0]
+    assert not router.transfer("a", "b", 9, 1)[0]
+    assert not router.transfer("a", "b", 1, 0)[0]
+
+    restarted, finished = restart(tmp_path)
+    assert finished == 0
+    assert stock(restarted) == stock(router)
+    assert restarted.shard("a").open().available(1) == 6
+
+
+def test_prepared_transfer_is_aborted(tmp_path):
+    router = open_router(tmp_path)
+    #The program stopped after logging the prepare record
+    router._log(["P", "1", "a", "b", "1", "1", "4", "Serum", "Garnier", "500", "France"])
+    router._log(["P", "2", "a", "b", "2", "2", "3", "Cleanser", "Cetaphil", "300", "Switzerland"])
+
+    restarted, finished = restart(tmp_path)
+    assert finished == 0
+    assert stock(restarted) == {"a": {1: 10, 2: 20}, "b": {1: 0}}
+    assert log_lines(tmp_path)[-2:] == ["A,1", "A,2"]
+
+    #The aborted transfers are not aborted again and their numbers are not reused
+    restarted, finished = restart(tmp_path)
+    assert len(log_lines(tmp_path)) == 4
+    assert restarted.transfer("a", "b", 1, 1)[0]
+    assert log_lines(tmp_path)[4] == "P,3,a,b,1,1,1,Serum,Garnier,500,France"
+
+
+def test_committed_transfer_is_finished(tmp_path, monkeypatch):
+    router = open_router(tmp_path)
+    router.shard("a").open()
+
+    #The program stopped after logging the commit record, before either store journaled the transfer
+    def apply(record, done=(), cart_id=None):
+        raise OSError("disk full")
+    monkeypatch.setattr(router, "_apply", apply)
+    moved, message = router.transfer("a", "b", 2, 5)
+    assert moved
+    assert "next start" in message
+    assert log_lines(tmp_path)[-1] == "C,1"
+
+    restarted, finished = restart(tmp_path)
+    assert finished == 1
+    assert stock(restarted) == {"a": {1: 10, 2: 15}, "b": {1: 0, 2: 5}}
+    assert sorted(log_lines(tmp_path)[-2:]) == ["D,1,a", "D,1,b"]
+
+    restarted, finished = restart(tmp_path)
+    assert finished == 0
+    assert stock(restarted) == {"a": {1: 10, 2: 15}, "b": {1: 0, 2: 5}}
+
+
+def test_transfer_journaled_before_its_done_record_is_not_applied_twice(tmp_path):
+    router = open_router(tmp_path)
+    assert router.transfer("a", "b", 1, 4)[0]
+    #The stores journaled the transfer but the 'D' records were lost
+    lines = [line for line in log_lines(tmp_path) if not line.startswith("D,")]
+    (tmp_path / "transfers.log").write_text("\n".join(lines) + "\n")
+
+    restarted, finished = restart(tmp_path)
+    assert finished == 1
+    assert stock(restarted) == {"a": {1: 6, 2: 20}, "b": {1: 4}}
+    restarted, finished = restart(tmp_path)
+    assert finished == 0
+
+
+def test_store_list(tmp_path):
+    stores_file = tmp_path / "stores.txt"
+    stores_file.write_text("# code,inventory,name,address\na,a/inventory.txt,Store A,Samakhushi, Kathmandu\n\n"
+                           "b,b/inventory.txt,Store B,Lalitpur\n")
+    shards = stores.read_stores(str(stores_file))
+    assert [shard.code for shard in shards] == ["a", "b"]
+    assert shards[0].address == "Samakhushi, Kathmandu"
+
+    stores_file.write_text("a,a/inventory.txt,Store A,Kathmandu\nb,a/inventory.txt,Store B,Lalitpur\n")
+    with pytest.raises(ValueError):
+        stores.read_stores(str(stores_file))
+    stores_file.write_text("a,a/inventory.txt\n")
+    with pytest.raises(ValueError):
+        stores.read_stores(str(stores_file))
@@ -0,0 +1,168 @@
+import operations
+import search
+
+#Number of products shown on one page of the inventory
+PAGE_SIZE = 20
+
+#Rendered rows kept before the cache is emptied and filled again
+CACHE_LIMIT = 10000
+
+#Commands for moving between pages
+NEXT_PAGE = ("n", "next")
+PREVIOUS_PAGE = ("p", "prev", "previous")
+
+
+#Class for a paged view of the inventory
+class InventoryView:
+    """
+    Paged view of the inventory that only renders the products on screen.
+
+    Every row is formatted once and cached together with the available quantity and price it was rendered with.
+    When a page is shown again only the rows whose quantity or price changed since then are formatted
+    again, so showing a page costs the page size and not the size of the inventory. The view can be
+    narrowed to the products matching a search query (see search.find).
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'type' (str): "sell" shows the selling price (200% of the cost price), "stock" the cost price.
+    'page_size' (int): Number of products on one page.
+    """
+
+    def __init__(self, d, type, page_size=PAGE_SIZE):
+        self.d = d
+        self.type = type
+        self.page_size = page_size
+        self.page_no = 0
+        self.matches = None
+        self.query = ""
+        self._cache = {}
+
+    #Function to count the products in the view
+    def product_count(self):
+        if self.matches is not None:
+            return len(self.matches)
+        return len(self.d)
+
+    #Function to count the pages of the view
+    def page_count(self):
+        return max((self.product_count() + self.page_size - 1)//self.page_size, 1)
+
+    #Function to render one row, reusing the cached text while the product is unchanged
+    def _render(self, prod_id):
+        d = self.d
+        qty = d.available(prod_id)
+        price = d.price(prod_id)
+        cached = self._cache.get(prod_id)
+        if cached is not None and cached[0] == qty and cached[1] == price:
+            return cached[2]
+
+        if self.type == "sell":
+            shown_price = price*2
+        else:
+            shown_price = price
+        text = (operations.prod_pad(prod_id, 8) + operations.prod_pad(d.name(prod_id), 20)
+                + operations.prod_pad(d.brand(prod_id), 16) + operations.prod_pad(qty, 11)
+                + operations.prod_pad(shown_price, 9) + d.origin(prod_id) + "\n")
+
+        if len(self._cache) >= CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[prod_id] = (qty, price, text)
+        return text
+
+    #Function to get the IDs on the current page
+    def page_ids(self):
+        self.page_no = min(self.page_no, self.page_count() - 1)
+        start = self.page_no*self.page_size
+        if self.matches is not None:
+            return self.matches[start:start+self.page_size]
+        return self.d.page(start, self.page_size)
+
+    #Function to render the current page
+    def render(self):
+        """
+        Render the current page of the inventory as one string, as a table with one product per line.
+
+        Returns:
+        str: The page text.
+        """
+        parts = ["\n\n " + " "*32 + " Inventory\n\n", "-"*80 + "\n",
+                 "ID" + " "*6 + "Name" + " "*16 + "Brand" + " "*8 + "Quantity" + " "*5 + "Price" + " "*5
+                 + "Origin" + " "*5 + "\n", "-"*80 + "\n"]
+        for prod_id in self.page_ids():
+            parts.append(self._render(prod_id))
+        parts.append("-"*80 + "\n")
+
+        footer = "Page " + str(self.page_no + 1) + " of " + str(self.page_count())
+        if self.matches is not None:
+            footer += " (" + str(len(self.matches)) + " products matching '" + self.query + "')"
+        parts.append(footer + ". Type n or p to change the page, /<words> to filter.\n\n")
+        return "".join(parts)
+
+    #Function to print the current page
+    def show(self):
+        """
+        Print the current page of the inventory.
+
+        Returns:
+        boolean: Always returns `True` after displaying the page.
+        """
+        print(self.render())
+        return True
+
+    #Function to move to another page
+    def turn(self, command):
+        """
+        Move to the next or previous page if 'command' asks for it.
+
+        Parameters:
+        'command' (str): The user's input.
+
+        Returns:
+        boolean: True if the input was a page command, False otherwise.
+        """
+        command = command.strip().lower()
+        if command in NEXT_PAGE:
+            self.page_no = min(self.page_no + 1, self.page_count() - 1)
+        elif command in PREVIOUS_PAGE:
+            self.page_no = max(self.page_no - 1, 0)
+        else:
+            return False
+        return True
+
+    #Function to narrow the view to the products matching a query
+    def filter(self, query):
+        """
+        Show only the products matching 'query' (see search.find). An empty query shows the whole
+        inventory again.
+
+        Parameters:
+        'query' (str): Words of the name, brand or origin.
+
+        Returns:
+        None
+        """
+        self.query = query.strip()
+        if self.query:
+            self.matches = search.find(self.d, self.query)
+        else:
+            self.matches = None
+        self.page_no = 0
+
+    #Function to handle the page and filter commands typed at a prompt
+    def command(self, text):
+        """
+        Handle 'n' / 'p' (next and previous page) and '/<words>' (show only matching products, '/' alone
+        shows everything again), printing the new page.
+
+        Parameters:
+        'text' (str): The user's input.
+
+        Returns:
+        boolean: True if the input was a view command, False if it should be handled by the caller.
+        """
+        if text.strip().startswith("/"):
+            self.filter(text.strip()[1:])
+        elif not self.turn(text):
+            return False
+        self.show()
+        return True
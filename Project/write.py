@@ -1,19 +1,86 @@
+import collections
+import concurrent.futures
+import itertools
+import os
+
+import customers
+import invoice
+import invoice_store
+import metrics
+import promotions
+import storage
+import store
+
+#Number of invoices rendered and written by one worker task in generate_invoices
+INVOICE_CHUNK = 256
+
+#Number of chunks waiting per worker, so a long batch is never held in memory all at once
+CHUNKS_PER_WORKER = 2
+
+#Function to write every product of the inventory to a file
+def write_inventory_lines(d, file_name):
+    """
+        Write all products of the inventory to 'file_name' and flush them to disk.
+
+        Parameters:
+        d (InventoryStore): The inventory store with Product IDs as keys.
+        file_name (str): The file to write, it is created or overwritten.
+
+        Returns:
+        None
+        """
+    inventory_file = open(file_name,"w")
+    for key in d:
+        inventory_file.write(d.line(key))
+    inventory_file.flush()
+    os.fsync(inventory_file.fileno())
+    if metrics.enabled:
+        metrics.add_bytes("inventory.write", inventory_file.tell())
+    inventory_file.close()
+
+
+#Function to write the inventory in the format matching its file name
+def write_inventory_data(d, temp_name, file_name):
+    """
+        Write all products of the inventory to 'temp_name' using the storage backend of 'file_name'.
+
+        Inventory files ending in '.bin' are written as binary columnar snapshots, '.db' files as SQLite databases
+        and any other name as text lines (see storage.backend_for).
+
+        Parameters:
+        d (InventoryStore): The inventory store with Product IDs as keys.
+        temp_name (str): The file to write to.
+        file_name (str): The inventory file 'temp_name' will replace, used to pick the format.
+
+        Returns:
+        None
+        """
+    storage.backend_for(file_name).write(d, temp_name)
+
+
 #Function to update the inventory file
-def update_inventory_file(d):
+def update_inventory_file(d, file_name="inventory.txt"):
     """
         Update the inventory text file with the current inventory data.
 
-        This function writes the updated inventory data from the dictionary to 'inventory.txt'.
-        Each product's information is written as a comma-separated line.
+        This function hands the inventory to the storage backend of 'file_name' (see storage.backend_for).
+        For text files each product's information is written as a comma-separated line starting with its product
+        ID, so the IDs stay the same when the file is read back however its lines are ordered.
+        The lines are written and fsynced to a temporary file which then replaces 'inventory.txt', so a crash
+        never leaves a half written inventory and a store that is still memory-mapped over the old file
+        (see read.map_inventory) keeps reading valid data. An SQLite database is updated in place in a single
+        transaction instead.
 
         Parameters:
-        d (dict): A dictionary containing inventory information with Product IDs as keys.
-            Each entry (value) is a list containing:
+        d (InventoryStore): The inventory store with Product IDs as keys, written as the first field of each line.
+            Each entry (value) is a product row containing:
                 - Name (str): The name of the product.
                 - Brand (str): The brand of the product.
                 - Quantity (str): The available quantity of the product.
                 - Price (str): The price of the product.
                 - Origin (str): The origin of the product.
+        file_name (str): The inventory file, 'inventory.txt' by default. Names ending in '.bin' are saved as
+            binary columnar snapshots and names ending in '.db' as SQLite databases.
 
         Returns:
         boolean: 
@@ -22,14 +89,7 @@ def update_inventory_file(d):
         """
     
     try:
-        #Opening the inventory in read mode
-        update_inventory = open("inventory.txt","w")
-
-        #Rewriting the contents
-        for product in d.values():
-            line = ",".join(product) + "\n"
-            update_inventory.write(line)
-        update_inventory.close()
+        storage.backend_for(file_name).save(d, file_name)
         return True
     
     except:
@@ -37,15 +97,17 @@ def update_inventory_file(d):
     
 
 #Function to generate invoice file for selling items
-def generate_sell_invoice(d, cart_dict, billing_info, prod_pad):
+def generate_sell_invoice(d, cart_dict, billing_info):
     """
     Generate and save a customer invoice text file after a successful sale.
 
     The invoice includes store details, billing date, customer info, product details, and cost breakdown.
+    It gets a new invoice number (stored in billing_info['invoice_no']) and is saved in the invoice store
+    under a folder for its date, and the visit is added to the customer's history in the customer directory.
 
     Parameters:
-    d (dict): A dictionary containing inventory information with Product IDs as keys.
-    Each entry (value) is a list containing:
+    d (InventoryStore): The inventory store with Product IDs as keys.
+    Each entry (value) is a product row containing:
         - Name (str): The name of the product.
         - Brand (str): The brand of the product.
         - Quantity (str): The available quantity.
@@ -62,67 +124,37 @@ def generate_sell_invoice(d, cart_dict, billing_info, prod_pad):
         - 'time' (str): Timestamp of the transaction.
         - 'name' (str): Customer's name.
         - 'phone' (str): Customer's phone number.
-        - 'total' (float): Total cost before VAT.
-        - 'vat' (float): Value-added tax amount.
-        - 'grand_total' (float): Final payable amount.
-
-    prod_pad (function): A helper function to format string fields for uniform column width in the invoice.
+        - 'total' (Money): Total cost before VAT.
+        - 'vat' (Money): Value-added tax amount.
+        - 'grand_total' (Money): Final payable amount.
 
     Returns:
     str: A confirmation message stating that the invoice file has been created.
     """
 
-    #Creating new invoice file and opening in write mode
-    invoice_name = str(billing_info["time"]).replace(":","")+".txt"
-    invoice_file = open(invoice_name,"w")
-
-    #Writing the header and formatting to the invoice file
-    invoice_file.write("\n"*2 + "-" * 80 + "\n")
-    invoice_file.write(" " * 32 + "CUSTOMER INVOICE\n")
-    invoice_file.write("-" * 80  + "\n")
-    invoice_file.write("WeCare Store\n")
-    invoice_file.write("Samakushi, Kathmandu, Nepal\n\n")
-    invoice_file.write("Date: " + str(billing_info["time"]) + "\n")
-    invoice_file.write("Name: " + billing_info["name"] + "\n")
-    invoice_file.write("Phone no.: " + str(billing_info["phone"]) + "\n")
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.write("Name"+" "*15 + "Brand"+" "*10 + "Price"+" "*5 + "Quantity"+" "*5 + "Free"+" "*5 + "Total"+" "*5 + "\n")
-    invoice_file.write("-" * 80 + "\n")
-
-    #iterating through all the items in cart
-    for key in cart_dict:
-
-        #Calling the function prod_pad to ensure equal spacing in each row
-        #writing the product details to the file
-        invoice_file.write(prod_pad(d[key][0], 19))
-        invoice_file.write(prod_pad(d[key][1], 15))
-        invoice_file.write(prod_pad(int(d[key][3])*2, 12))
-        invoice_file.write(prod_pad(cart_dict[key][2], 12))
-        invoice_file.write(prod_pad(cart_dict[key][1], 9))
-        invoice_file.write(prod_pad(cart_dict[key][0]*int(d[key][3])*2, 16))
-        invoice_file.write("\n")
-
-    #Writing total cost
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.write("Total: " + str(billing_info["total"]) + "\n")
-    invoice_file.write("VAT: " + str(billing_info["vat"]) + "\n")
-    invoice_file.write("Grand Total: " + str(billing_info["grand_total"]) + "\n")
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.close()
-
-    return "Invoice file has been created."
+    #Numbering the invoice, rendering it and saving it to the invoice store at once
+    invoice_no = invoice_store.active.allocate()
+    billing_info["invoice_no"] = invoice_store.format_number(invoice_no)
+    invoice.stamp_store(billing_info)
+    text = invoice.render_sell_invoice(d, cart_dict, billing_info)
+    invoice_store.active.save(invoice_no, invoice_store.SELL, text, billing_info, billing_info["phone"])
+    customers.active.remember(billing_info["phone"], billing_info["name"], invoice_no)
+
+    return "Invoice " + billing_info["invoice_no"] + " has been created."
 
 
 #Function to generate invoice file for restocking items
-def generate_stock_invoice(d, stock_list, restock_info, prod_pad):
+def generate_stock_invoice(d, stock_list, restock_info):
     """
         Generate and save a restock invoice text file after inventory is updated with new stock.
 
         The invoice includes store details, restock date, item details, supplier information, and total cost.
+        It gets a new invoice number (stored in restock_info['invoice_no']) and is saved in the invoice store
+        under a folder for its date.
 
         Parameters:
-        d (dict): A dictionary containing inventory information with Product IDs as keys.
-        Each entry (value) is a list containing:
+        d (InventoryStore): The inventory store with Product IDs as keys.
+        Each entry (value) is a product row containing:
             - Name (str): The name of the product.
             - Brand (str): The brand of the product.
             - Quantity (str): The available quantity.
@@ -136,50 +168,169 @@ def generate_stock_invoice(d, stock_list, restock_info, prod_pad):
 
         restock_info (dict): A dictionary containing restocking summary with the following keys:
             - 'time' (str): Timestamp of the restocking event.
-            - 'total' (float): Total cost before VAT.
-            - 'vat' (float): Value-added tax amount.
-            - 'grand_total' (float): Final payable amount.
-
-        prod_pad (function): A helper function to format string fields for uniform column width in the invoice.
+            - 'total' (Money): Total cost before VAT.
+            - 'vat' (Money): Value-added tax amount.
+            - 'grand_total' (Money): Final payable amount.
 
-        Returns:
+            Returns:
         str: A confirmation message stating that the invoice file has been created.
         """
-    #Generating restock invoice file
-    invoice_name = str(restock_info["time"]).replace(":","")+".txt"
-    invoice_file = open(invoice_name,"w")
-
-    #Formatting and printing header for the table
-    invoice_file.write("\n"*2 + "-" * 80 + "\n")
-    invoice_file.write(" " * 32 + "RESTOCK INVOICE\n")
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.write("WeCare Store" + "\n")
-    invoice_file.write("Samakushi, Kathmandu, Nepal\n")
-    invoice_file.write("Date: " + str(restock_info["time"]) + "\n\n")
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.write("Name"+" "*12 + "Brand"+" "*10 + "Price"+" "*5 + "Quantity"+" "*5 + "Supplier"+" "*5 + "Total"+" "*5 + "\n")
-    invoice_file.write("-" * 80 + "\n")
-
-    #Iterating through all restocked products
-    for item in stock_list:
-        
-        #Writing product details to the file
-        invoice_file.write(prod_pad(d[item[0]][0], 16))
-        invoice_file.write(prod_pad(d[item[0]][1], 15))
-        invoice_file.write(prod_pad(int(d[item[0]][3]), 12))
-        invoice_file.write(prod_pad(item[1], 12))
-        invoice_file.write(prod_pad(item[2], 13))
-        invoice_file.write(prod_pad(int(item[1])*int(d[item[0]][3]), 16))
-        invoice_file.write("\n")
-
-    #Writing total cost/footer
-    invoice_file.write("-" * 80 + "\n")
-    invoice_file.write("Total: " + str(restock_info["total"]) + "\n")
-    invoice_file.write("VAT: " + str(restock_info["vat"]) + "\n")
-    invoice_file.write("Grand Total: " + str(restock_info["grand_total"]) + "\n")
-    invoice_file.write("-" * 80 + "\n")
-
-    invoice_file.close()
+    #Numbering the invoice, rendering it and saving it to the invoice store at once
+    invoice_no = invoice_store.active.allocate()
+    restock_info["invoice_no"] = invoice_store.format_number(invoice_no)
+    invoice.stamp_store(restock_info)
+    text = invoice.render_stock_invoice(d, stock_list, restock_info)
+    invoice_store.active.save(invoice_no, invoice_store.RESTOCK, text, restock_info)
 
     #Informing user
-    return "Invoice file created."
\ No newline at end of file
+    return "Invoice " + restock_info["invoice_no"] + " created."
+
+
+#Function to render and write one chunk of invoices in a worker process
+def render_invoice_chunk(kind, root, archive, products, jobs, offers=None):
+    """
+    Render a chunk of invoices and write them to their files, see generate_invoices.
+
+    Parameters:
+    'kind' (str): invoice_store.SELL or invoice_store.RESTOCK.
+    'root' (str): The folder of the invoice store.
+    'archive' (bool): If True, nothing is written and the texts are returned for the segment files.
+    'products' (list): (product ID, name, brand, price) of every product on the invoices.
+    'jobs' (list): (collection, info, relative path) of every invoice, info already holding its 'invoice_no'.
+    'offers' (dict): The promotions.Offer of every product on sell invoices, worked out by the caller.
+
+    Returns:
+    list: The rendered texts in archive mode, otherwise an empty list.
+    """
+    #A small inventory holding only what the invoices print
+    d = store.InventoryStore()
+    for prod_id, name, brand, price in products:
+        d.append(prod_id, name, brand, 0, price, "")
+
+    texts = []
+    folders = set()
+    if offers is not None:
+        offers = promotions.FixedOffers(offers)
+    for collection, info, relative_path in jobs:
+        if kind == invoice_store.SELL:
+            text = invoice.render_sell_invoice(d, collection, info, offers)
+        else:
+            text = invoice.render_stock_invoice(d, collection, info)
+        if archive:
+            texts.append(text)
+            continue
+        path = os.path.join(root, relative_path)
+        folder = os.path.dirname(path)
+        if folder not in folders:
+            os.makedirs(folder, exist_ok=True)
+            folders.add(folder)
+        invoice.write_invoice(path, text)
+    return texts
+
+
+#Function to generate many invoices on every core
+def generate_invoices(d, kind, records, workers=None, chunk_size=INVOICE_CHUNK):
+    """
+    Generate the invoices of many finished sales or restocks, rendering and writing them in parallel.
+
+    Invoice numbers are taken from the invoice store in the order of 'records' before any work is handed out,
+    and the index is appended chunk by chunk in that same order, so the numbers, files and index are the same
+    whatever the number of workers. Chunks of 'chunk_size' invoices are rendered and written by a
+    ProcessPoolExecutor, each chunk carrying only the products it prints, and for sell invoices their
+    promotion offers, instead of the whole inventory.
+    A batch that fits in one chunk, or a single worker, is handled in this process without starting a pool.
+    In archive mode the workers only render and the segment files are appended here, in order.
+
+    Parameters:
+    'd' (InventoryStore): The inventory.
+    'kind' (str): invoice_store.SELL for (cart_dict, billing_info) records or invoice_store.RESTOCK for
+        (stock_list, restock_info) records.
+    'records' (iterable): The finished sales or restocks. Each info gets its 'invoice_no' like
+        generate_sell_invoice and generate_stock_invoice.
+    'workers' (int): Number of processes, the number of cores by default.
+    'chunk_size' (int): Number of invoices per worker task.
+
+    Returns:
+    int: The number of invoices generated.
+    """
+    active = invoice_store.active
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = None
+    pending = collections.deque()
+    count = 0
+
+    def finish(chunk, texts):
+        index = []
+        visits = []
+        for position in range(len(chunk)):
+            invoice_no, collection, info, relative_path = chunk[position]
+            phone = info["phone"] if kind == invoice_store.SELL else ""
+            if active.archive:
+                active.save(invoice_no, kind, texts[position], info, phone)
+            else:
+                index.append(invoice_store.index_record(invoice_no, kind, relative_path, info, phone))
+            if phone:
+                visits.append((phone, info["name"], invoice_no))
+        active.add_to_index(index)
+        customers.active.remember_all(visits)
+
+    try:
+        records = iter(records)
+        while True:
+            chunk = []
+            products = {}
+            for collection, info in records:
+                chunk.append((collection, info))
+                if kind == invoice_store.SELL:
+                    prod_ids = collection
+                else:
+                    prod_ids = [item[0] for item in collection]
+                for prod_id in prod_ids:
+                    if prod_id not in products:
+                        products[prod_id] = (prod_id, d.name(prod_id), d.brand(prod_id), d.price(prod_id))
+                if len(chunk) == chunk_size:
+                    break
+            if not chunk:
+                break
+
+            #Numbering the whole chunk with one update of the counter file
+            first_no = active.allocate(len(chunk))
+            for position in range(len(chunk)):
+                collection, info = chunk[position]
+                invoice_no = first_no + position
+                info["invoice_no"] = invoice_store.format_number(invoice_no)
+                invoice.stamp_store(info)
+                chunk[position] = (invoice_no, collection, info, active.path_for(invoice_no, info["time"]))
+            count += len(chunk)
+            offers = None
+            if kind == invoice_store.SELL:
+                offers = promotions.active.offers_for(d, products)
+            args = (kind, active.root, active.archive, list(products.values()),
+                    [(collection, info, relative_path) for invoice_no, collection, info, relative_path in chunk],
+                    offers)
+
+            #Starting the pool only once a record of a second chunk has been read, putting that record back
+            if executor is None and workers > 1 and len(chunk) == chunk_size:
+                following = next(records, None)
+                if following is not None:
+                    records = itertools.chain([following], records)
+                    try:
+                        executor = concurrent.futures.ProcessPoolExecutor(workers)
+                    except (OSError, NotImplementedError, ImportError):
+                        workers = 1
+            if executor is None:
+                finish(chunk, render_invoice_chunk(*args))
+                continue
+            pending.append((chunk, executor.submit(render_invoice_chunk, *args)))
+            if len(pending) >= workers*CHUNKS_PER_WORKER:
+                chunk, future = pending.popleft()
+                finish(chunk, future.result())
+
+        while pending:
+            chunk, future = pending.popleft()
+            finish(chunk, future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return count